@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: extractiekosten per pagina vóór en na de gecompileerde
+extractieplannen (rentbird_scraper/plans.py).
+
+"voor" is de oude ConfigSpider-logica: per response de config-dicts lezen,
+furnishedKeywords opnieuw lowercasen, regexes per aanroep opzoeken en de
+paginatekst twee keer opbouwen. "na" is `ExtractionPlan.extract_detail` /
+`listing_urls`. Beide draaien op dezelfde parser backend.
+
+Een regressiecheck, geen bewijs van winst: op deze synthetische pagina's
+ligt de verhouding rond 1x (bs4 detail soms iets trager). Een uitspraak over
+snelheid vraagt echte opnames (benchmarks/run.py capture).
+
+Gebruik (vanuit scraper/):
+  python benchmarks/bench_extraction_plan.py --source huurwoningen --iterations 300
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from urllib.parse import urljoin, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rentbird_scraper.plans import load_plan  # noqa: E402
+from rentbird_scraper.utils.html import BACKENDS, parse_page  # noqa: E402
+from rentbird_scraper.utils.normalize import parse_price, parse_size, parse_rooms  # noqa: E402
+
+
+def sample_list_page(n: int = 30) -> str:
+    cards = ''.join(
+        f'<li class="listing"><a href="/huren/utrecht/{1500000 + i}/straat-{i}">Woning {i}</a>'
+        f'<span>€ {1000 + i} per maand</span></li>'
+        for i in range(n)
+    )
+    nav = ''.join(f'<a href="/info/{i}">Info {i}</a>' for i in range(40))
+    return f'<html><body><nav>{nav}</nav><ul>{cards}</ul><a rel="next" href="?page=2">Volgende</a></body></html>'
+
+
+def sample_detail_page() -> str:
+    features = ''.join(f'<li>Kenmerk {i}</li>' for i in range(40))
+    images = ''.join(f'<img src="https://cdn.example.nl/img/{i}.jpg">' for i in range(20))
+    filler = ''.join(f'<p>Omschrijving alinea {i} met wat tekst over de woning en de buurt.</p>' for i in range(60))
+    return (
+        '<html><head><title>Appartement te huur</title><script>var cfg = {"a": 1};</script></head><body>'
+        '<h1>Appartement Oudegracht 12</h1><div class="price">€ 1.450 per maand</div>'
+        f'<ul>{features}<li>72 m²</li><li>3 kamers</li><li>Gemeubileerd</li></ul>'
+        f'{images}<p>Aangeboden sinds 12-09-2026</p>{filler}</body></html>'
+    )
+
+
+def legacy_listing_urls(cfg, page, base_url):
+    sel = cfg['list']
+    seen = set()
+    href_re = re.compile(cfg['hrefPattern']) if cfg.get('hrefPattern') else None
+    anchors = list(page.select(sel['itemLink']))
+    if len(anchors) < 3:
+        anchors.extend(page.select('a'))
+    out = []
+    for a in anchors:
+        href = a.get('href')
+        if not href:
+            continue
+        full = urljoin(base_url, href)
+        if full in seen:
+            continue
+        if href_re:
+            allow = bool(href_re.search(urlparse(full).path))
+        else:
+            p = urlparse(full).path
+            allow = ((('-te-huur' in p) or ('/huren/' in p))
+                     and all(seg not in p for seg in ['/makelaars', '/info', '/registreren', '/over']))
+        if not allow:
+            continue
+        seen.add(full)
+        out.append(full)
+    return out
+
+
+def legacy_extract_detail(cfg, page, url, city):
+    det = cfg['detail']
+    title_el = page.select_one(det.get('title', 'h1'))
+    title = title_el.get_text(strip=True) if title_el else 'Woning'
+    price_text = page.first_text_containing('€') if det.get('priceText') else None
+    size_text = rooms_text = None
+    for li in page.select(det.get('sizeText', 'li')):
+        txt = li.get_text(' ', strip=True)
+        if 'm²' in txt and not size_text:
+            size_text = txt
+        if 'kamer' in txt and not rooms_text:
+            rooms_text = txt
+    furnished = None
+    furn_keys = [k.lower() for k in det.get('furnishedKeywords', [])]
+    if furn_keys:
+        page_text = page._full_text().lower()
+        if any(k in page_text for k in furn_keys):
+            furnished = 'gemeubileerd' in page_text
+    images = []
+    for img in page.select(det.get('images', 'img')):
+        src = img.get('src') or img.get('data-src')
+        if src and src.startswith('http'):
+            images.append(src)
+    offered_since = None
+    m = re.search(r"Aangeboden\s+sinds\s+(\d{2}-\d{2}-\d{4})", page._full_text(), re.IGNORECASE)
+    if m:
+        d, mth, y = m.group(1).split('-')
+        offered_since = f"{y}-{mth}-{d}T00:00:00Z"
+    segs = [s for s in urlparse(url).path.split('/') if s]
+    source_id = None
+    for s in segs:
+        if re.fullmatch(r'[a-f0-9]{8}', s):
+            source_id = s
+            break
+    if not source_id:
+        m = re.search(r'-(\d{5,})$', urlparse(url).path)
+        if m:
+            source_id = m.group(1)
+    if not source_id and segs:
+        source_id = segs[-1]
+    return {
+        'sourceId': source_id, 'title': title, 'city': city,
+        'price': parse_price(price_text), 'size': parse_size(size_text), 'rooms': parse_rooms(rooms_text),
+        'furnished': furnished, 'images': images[:12], 'offeredSince': offered_since,
+    }
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', default='huurwoningen')
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    args = parser.parse_args()
+
+    plan = load_plan(args.source)
+    cfg = dict(plan.config)
+    list_html = sample_list_page().encode('utf-8')
+    detail_html = sample_detail_page().encode('utf-8')
+    base_url = 'https://www.huurwoningen.nl/in/utrecht/'
+    detail_url = 'https://www.huurwoningen.nl/huren/utrecht/1532948/oudegracht-1532948'
+
+    print(f"source={args.source} iterations={args.iterations} (µs per pagina, excl. HTML parse)")
+    print(f"{'backend':8} {'stap':7} {'voor':>10} {'na':>10} {'voor/na':>7}")
+    for backend in [b.strip() for b in args.backends.split(',') if b.strip()]:
+        list_page = parse_page(list_html, 'utf-8', backend)
+        before = timed(lambda: legacy_listing_urls(cfg, list_page, base_url), args.iterations)
+        after = timed(lambda: list(plan.listing_urls(list_page, lambda h: urljoin(base_url, h))), args.iterations)
+        print(f"{backend:8} {'list':7} {before:10.1f} {after:10.1f} {before / after:6.2f}x")
+
+        detail_page = parse_page(detail_html, 'utf-8', backend)
+
+        def run_after():
+            detail_page._text = None  # cache per response, niet tussen iteraties
+            plan.extract_detail(detail_page, detail_url, 'Utrecht')
+
+        before = timed(lambda: legacy_extract_detail(cfg, detail_page, detail_url, 'Utrecht'), args.iterations)
+        after = timed(run_after, args.iterations)
+        print(f"{backend:8} {'detail':7} {before:10.1f} {after:10.1f} {before / after:6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Vergelijkt twee item bestanden (JSON lines, `run_sources.py --items`), bv.
+twee replays van hetzelfde archief met verschillende code versies.
+
+Items worden gematcht op (source, sourceId); tijdstempels en andere velden
+die per run verschillen worden genegeerd. Exit code 1 bij verschillen.
+
+  python benchmarks/diff_items.py before.jsonl after.jsonl
+  python benchmarks/diff_items.py before.jsonl after.jsonl --ignore images --limit 50
+"""
+import argparse
+import json
+import sys
+
+VOLATILE = ('scrapedAt', 'lastCheckedAt', 'lastProbedAt', 'createdAt', 'updatedAt', 'contentHash', 'canonicalId')
+
+
+def load(path: str) -> dict:
+    items = {}
+    with open(path, 'r', encoding='utf8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            items[(item.get('source'), str(item.get('sourceId')))] = item
+    return items
+
+
+def diff(before: dict, after: dict, ignore=()):
+    """Yield (key, veld, oud, nieuw); veld None = item ontbreekt aan één kant."""
+    skip = set(VOLATILE) | set(ignore)
+    for key in sorted(set(before) | set(after), key=str):
+        a, b = before.get(key), after.get(key)
+        if a is None or b is None:
+            yield key, None, a is not None, b is not None
+            continue
+        for field in sorted((set(a) | set(b)) - skip):
+            if a.get(field) != b.get(field):
+                yield key, field, a.get(field), b.get(field)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Diff item output van twee runs')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--ignore', default='', help='Extra velden om te negeren (kommagescheiden)')
+    parser.add_argument('--limit', type=int, default=200, help='Maximaal aantal regels output')
+    args = parser.parse_args()
+
+    before, after = load(args.before), load(args.after)
+    ignore = [f.strip() for f in args.ignore.split(',') if f.strip()]
+    changes = list(diff(before, after, ignore))
+    for key, field, old, new in changes[:args.limit]:
+        label = f"{key[0]}/{key[1]}"
+        if field is None:
+            print(f"{label}: {'alleen in ' + args.before if old else 'alleen in ' + args.after}")
+        else:
+            print(f"{label}.{field}: {json.dumps(old, ensure_ascii=False)} -> {json.dumps(new, ensure_ascii=False)}")
+    if len(changes) > args.limit:
+        print(f"... en nog {len(changes) - args.limit}")
+    items = len(set(before) | set(after))
+    print(f"{len(before)} / {len(after)} items, {len({c[0] for c in changes})} van {items} verschillend")
+    return 1 if changes else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Offline parser benchmark over de HTML fixtures in benchmarks/fixtures/<source>/.
+
+Per source, spider (ConfigSpider of de custom spider, voor pararius ook
+ParariusSpider) en parser backend: pages/sec, latency per pagina (p50/p95/p99)
+en piekgeheugen (tracemalloc). Daarnaast de functies uit utils/normalize.py.
+De uitkomst van elke fixture wordt vergeleken met benchmarks/golden/<source>.json
+(price, size, rooms, sourceId, title); een afwijking geeft exit code 1.
+
+Gebruik (vanuit scraper/):
+  python benchmarks/run.py                       # alles, alle backends
+  python benchmarks/run.py --sources kamernet --backends lxml --iterations 200
+  python benchmarks/run.py --update-golden       # na een bewuste wijziging in de extractie
+  python benchmarks/run.py capture --source kamernet --city Utrecht --url https://kamernet.nl/huren/...
+  python benchmarks/run.py capture --source kamernet --city Utrecht --url ... --archive .archive/kamernet
+  python benchmarks/run.py capture --source kamernet --city Utrecht --archive .archive/kamernet --all --limit 5
+
+Fixtures met `"synthetic": true` in index.json zijn met de hand geschreven
+pagina's; vervang ze door echte opnames (capture) zodra die er zijn. capture
+saneert de pagina standaard (zie `sanitize`); `--raw` slaat hem ongewijzigd op.
+"""
+import argparse
+import gc
+import gzip
+import importlib
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+import urllib.request
+import zlib
+from urllib.parse import urljoin
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from scrapy.http import HtmlResponse, Request  # noqa: E402
+
+from rentbird_scraper.utils import normalize  # noqa: E402
+from rentbird_scraper.utils.html import BACKENDS  # noqa: E402
+
+FIXTURES = os.path.join(HERE, 'fixtures')
+GOLDEN = os.path.join(HERE, 'golden')
+GOLDEN_FIELDS = ('sourceId', 'price', 'size', 'rooms', 'title')
+
+
+def fixture_sources():
+    return sorted(d for d in os.listdir(FIXTURES) if os.path.isfile(os.path.join(FIXTURES, d, 'index.json')))
+
+
+def load_fixtures(source):
+    with open(os.path.join(FIXTURES, source, 'index.json'), 'r') as f:
+        index = json.load(f)
+    out = []
+    for entry in index:
+        with open(os.path.join(FIXTURES, source, entry['file']), 'rb') as f:
+            out.append(dict(entry, body=f.read()))
+    return out
+
+
+def spiders_for(source, backend):
+    """(label, spider) paren: zoals run_sources.py ze kiest, plus de losse ParariusSpider."""
+    try:
+        mod = importlib.import_module(f"rentbird_scraper.sources.{source}.spider")
+        cls = getattr(mod, 'Spider', None) or getattr(mod, f"{source.capitalize()}Spider")
+        spiders = [(source, cls(parser=backend))]
+    except ModuleNotFoundError:
+        from rentbird_scraper.spiders.config_spider import ConfigSpider
+        spiders = [('config', ConfigSpider(source=source, cities='Amsterdam', parser=backend))]
+    if source == 'pararius':
+        from rentbird_scraper.spiders.pararius import ParariusSpider
+        spiders.append(('pararius-spider', ParariusSpider(cities='Amsterdam', parser=backend)))
+    return spiders
+
+
+def make_response(fixture):
+    request = Request(fixture['url'], meta={'city': fixture.get('city')})
+    return HtmlResponse(fixture['url'], body=fixture['body'], encoding='utf-8', request=request)
+
+
+def run_detail(spider, response):
+    return [i for i in spider.parse_detail(response) if isinstance(i, dict)]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def measure(fn, inputs, iterations):
+    """Latencies (sec) per aanroep en piekgeheugen (bytes) van één ronde."""
+    for x in inputs:  # warm-up (imports, gecachte XPath/regexes)
+        fn(x)
+    gc.collect()
+    tracemalloc.start()
+    for x in inputs:
+        fn(x)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    latencies = []
+    for _ in range(iterations):
+        for x in inputs:
+            start = time.perf_counter()
+            fn(x)
+            latencies.append(time.perf_counter() - start)
+    return latencies, peak
+
+
+def report(label, latencies, peak):
+    total = sum(latencies)
+    rate = len(latencies) / total if total else 0.0
+    print(f"{label:42} {rate:9.1f} {percentile(latencies, 50) * 1e3:8.3f} {percentile(latencies, 95) * 1e3:8.3f}"
+          f" {percentile(latencies, 99) * 1e3:8.3f} {peak / 1024:9.1f}")
+
+
+def golden_key(label, fixture):
+    return f"{label}:{fixture['file']}"
+
+
+def check_golden(source, results, update):
+    path = os.path.join(GOLDEN, f"{source}.json")
+    if update:
+        os.makedirs(GOLDEN, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False, sort_keys=True)
+            f.write('\n')
+        return []
+    try:
+        with open(path, 'r') as f:
+            golden = json.load(f)
+    except OSError:
+        return [f"{source}: geen golden output (draai met --update-golden)"]
+    problems = []
+    for key, expected in golden.items():
+        got = results.get(key)
+        if got is None:
+            problems.append(f"{key}: geen resultaat")
+            continue
+        for field in GOLDEN_FIELDS:
+            if got.get(field) != expected.get(field):
+                problems.append(f"{key}: {field} {expected.get(field)!r} -> {got.get(field)!r}")
+    return problems
+
+
+def bench(args):
+    sources = [s.strip() for s in args.sources.split(',')] if args.sources else fixture_sources()
+    backends = [b.strip() for b in args.backends.split(',') if b.strip()]
+    print(f"{'parser':42} {'pages/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'peak KiB':>9}")
+    problems = []
+    texts = []
+    synthetic = []
+    for source in sources:
+        fixtures = load_fixtures(source)
+        synthetic.extend(f"{source}/{f['file']}" for f in fixtures if f.get('synthetic'))
+        responses = [make_response(f) for f in fixtures]
+        results = {}
+        for backend in backends:
+            for label, spider in spiders_for(source, backend):
+                outputs = [run_detail(spider, r) for r in responses]
+                for fixture, items in zip(fixtures, outputs):
+                    item = items[0] if items else {}
+                    key = golden_key(label, fixture)
+                    fields = {f: item.get(f) for f in GOLDEN_FIELDS}
+                    if backend == backends[0]:
+                        results[key] = fields
+                    elif results.get(key) != fields:
+                        # Alle backends moeten hetzelfde opleveren
+                        problems.append(f"{key}: {backend} wijkt af van {backends[0]}: {fields} vs {results.get(key)}")
+                latencies, peak = measure(lambda r: run_detail(spider, r), responses, args.iterations)
+                report(f"{source}/{label}/{backend}", latencies, peak)
+        problems.extend(check_golden(source, results, args.update_golden and backends == list(BACKENDS)))
+        texts.extend(f['body'].decode('utf-8', errors='replace') for f in fixtures)
+
+    # normalize.py los, op tekstfragmenten uit de fixtures
+    snippets = []
+    for text in texts:
+        for marker in ('€', 'm²', 'kamer'):
+            i = text.find(marker)
+            if i >= 0:
+                snippets.append(text[max(0, i - 40):i + 40])
+    for name in ('parse_price', 'parse_size', 'parse_rooms'):
+        fn = getattr(normalize, name)
+        latencies, peak = measure(fn, snippets, args.iterations * 10)
+        report(f"normalize.{name}", latencies, peak)
+
+    if args.update_golden and backends != list(BACKENDS):
+        print("⚠️  golden output alleen bijwerken met alle backends (laat --backends weg)")
+    if synthetic:
+        print(f"⚠️  {len(synthetic)} synthetische fixtures (geen echte opname): {', '.join(synthetic)}")
+    if problems:
+        print("\nGolden output wijkt af:")
+        for p in problems:
+            print(f"  - {p}")
+        return 1
+    print("\nGolden output: OK" if not args.update_golden else "\nGolden output bijgewerkt")
+    return 0
+
+
+def decode_body(headers, body):
+    """Body uit het archief decoderen (daar staat hij nog zoals hij binnenkwam)."""
+    for name, values in headers:
+        if name.lower() != 'content-encoding':
+            continue
+        for encoding in reversed([e.strip().lower() for v in values for e in v.split(',') if e.strip()]):
+            if encoding in ('gzip', 'x-gzip'):
+                body = gzip.decompress(body)
+            elif encoding == 'deflate':
+                try:
+                    body = zlib.decompress(body)
+                except zlib.error:
+                    body = zlib.decompress(body, -zlib.MAX_WBITS)
+            elif encoding == 'br':
+                import brotli
+                body = brotli.decompress(body)
+            elif encoding != 'identity':
+                raise SystemExit(f"onbekende Content-Encoding in het archief: {encoding}")
+    return body
+
+
+def from_archive(path, url):
+    """(uiteindelijke URL, body) uit een `run_sources.py --record` archief; redirects worden gevolgd."""
+    from rentbird_scraper.utils.archive import ResponseArchive, request_key
+    archive = ResponseArchive(path)
+    try:
+        for _ in range(5):
+            recorded = archive.get(request_key('GET', url))
+            if recorded is None:
+                raise SystemExit(f"niet in het archief: {url}")
+            location = next((v[0] for k, v in recorded.headers if k.lower() == 'location' and v), None)
+            if 300 <= recorded.status < 400 and location:
+                url = urljoin(url, location)
+                continue
+            if recorded.status != 200:
+                raise SystemExit(f"status {recorded.status} in het archief: {url}")
+            return url, decode_body(recorded.headers, recorded.body)
+        raise SystemExit(f"te veel redirects in het archief: {url}")
+    finally:
+        archive.close()
+
+
+# Scripts die de extractie gebruikt (structuredData) blijven staan, de rest (tracking, ads, state) gaat eruit
+KEEP_SCRIPT_RE = re.compile(r"""type=["']application/ld\+json["']|id=["']__NEXT_DATA__["']""", re.I)
+SCRIPT_RE = re.compile(r"<script\b([^>]*)>.*?</script\s*>", re.S | re.I)
+DROP_RES = (
+    re.compile(r"<!--.*?-->", re.S),
+    re.compile(r"<(iframe|noscript)\b.*?</\1\s*>", re.S | re.I),
+    re.compile(r"""<input\b[^>]*type=["']hidden["'][^>]*>""", re.I),
+    re.compile(r"""<meta\b[^>]*name=["'](?:csrf-token|csrf-param)["'][^>]*>""", re.I),
+)
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+PHONE_RE = re.compile(r"(?<![\d/])(?:\+31|0031|0)[\s-]?(?:\(0\))?[1-9](?:[\s-]?\d){8}(?!\d)")
+
+
+def sanitize(body: bytes) -> bytes:
+    """
+    Pagina veilig om te committen: scripts behalve JSON-LD/__NEXT_DATA__, comments,
+    iframes en hidden inputs (tokens) eruit; e-mailadressen en telefoonnummers vervangen.
+    Namen van verhuurders/makelaars herkent dit niet: controleer de fixture voor het committen.
+    """
+    text = body.decode('utf-8', errors='replace')
+    text = SCRIPT_RE.sub(lambda m: m.group(0) if KEEP_SCRIPT_RE.search(m.group(1)) else '', text)
+    for pattern in DROP_RES:
+        text = pattern.sub('', text)
+    text = EMAIL_RE.sub('verhuur@example.nl', text)
+    text = PHONE_RE.sub('020-0000000', text)
+    return text.encode('utf-8')
+
+
+def save_fixture(source, name, url, city, body, sanitized):
+    directory = os.path.join(FIXTURES, source)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name), 'wb') as f:
+        f.write(body)
+    index_path = os.path.join(directory, 'index.json')
+    try:
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+    except OSError:
+        index = []
+    entry = {'file': name, 'url': url, 'city': city}
+    if sanitized:
+        entry['sanitized'] = True
+    index = [e for e in index if e['file'] != name] + [entry]
+    with open(index_path, 'w') as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+    print(f"opgeslagen: {os.path.join(directory, name)} ({len(body)} bytes)")
+
+
+def fixture_name(url):
+    return url.rstrip('/').split('/')[-1][:80] + '.html'
+
+
+def archived_detail_urls(source, path, limit):
+    """Detail-URL's van `source` (hrefPattern / standaardfilter) met een 200 in het archief."""
+    from urllib.parse import urlparse
+    from rentbird_scraper.plans import load_plan
+    from rentbird_scraper.utils.archive import ResponseArchive
+    plan = load_plan(source)
+    archive = ResponseArchive(path)
+    try:
+        urls = [url for _, url, status in archive.entries()
+                if status == 200 and plan.allows_path(urlparse(url).path)]
+    finally:
+        archive.close()
+    return urls[:limit] if limit else urls
+
+
+def capture(args):
+    """Pagina opslaan als fixture: uit een opgenomen archief (--archive) of live (met netwerk)."""
+    if args.all:
+        if not args.archive:
+            raise SystemExit("--all werkt alleen met --archive")
+        urls = archived_detail_urls(args.source, args.archive, args.limit)
+        if not urls:
+            raise SystemExit(f"geen detailpagina's van {args.source} in {args.archive}")
+    elif args.url:
+        urls = [args.url]
+    else:
+        raise SystemExit("geef --url of --all")
+    for url in urls:
+        if args.archive:
+            url, body = from_archive(args.archive, url)
+        else:
+            req = urllib.request.Request(url, headers={'User-Agent': os.getenv('SCRAPER_UA', 'Mozilla/5.0'),
+                                                       'Accept-Language': 'nl-NL,nl;q=0.8'})
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                body = resp.read()
+        if not args.raw:
+            body = sanitize(body)
+        name = args.name if args.name and len(urls) == 1 else fixture_name(url)
+        save_fixture(args.source, name, url, args.city, body, not args.raw)
+    print("draai daarna --update-golden en controleer de nieuwe waarden met de hand")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sources', default=None, help="kommagescheiden (standaard: alle fixtures)")
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--update-golden', action='store_true')
+    sub = parser.add_subparsers(dest='command')
+    cap = sub.add_parser('capture', help="detailpagina (live of uit een archief) als fixture opslaan")
+    cap.add_argument('--source', required=True)
+    cap.add_argument('--url', default=None)
+    cap.add_argument('--city', default=None)
+    cap.add_argument('--name', default=None)
+    cap.add_argument('--archive', default=None, help="archief van run_sources.py --record in plaats van live ophalen")
+    cap.add_argument('--all', action='store_true', help="alle detailpagina's van de source uit het archief")
+    cap.add_argument('--limit', type=int, default=0, help="met --all: maximaal N pagina's")
+    cap.add_argument('--raw', action='store_true', help="niet saneren (niet committen)")
+    args = parser.parse_args()
+    if args.command == 'capture':
+        return capture(args)
+    return bench(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+NL: Bouwt de dedup velden (`canonicalId`, `dedup`) van alle beschikbare listings opnieuw op uit de
+properties collectie, met dezelfde signatures en regels als de DedupPipeline (rentbird_scraper/utils/dedup.py).
+Eerst worden alle listings in de index opgenomen, daarna krijgt elk document de uiteindelijke canonical van
+zijn groep (de kleinste key). Alleen documenten waarvan de velden veranderen worden geschreven.
+Gebruik:
+  python build_dedup.py
+  python build_dedup.py --cities amsterdam,utrecht --dry-run
+"""
+import argparse
+import os
+import sys
+from collections import Counter
+
+from pymongo import UpdateOne
+
+from rentbird_scraper.utils.availability import city_key
+from rentbird_scraper.utils.dedup import DEDUP_FIELDS, DedupIndex, listing_key
+from rentbird_scraper.utils.mongo import get_client, get_database, properties_collection_name
+
+
+PROJECTION = {"source": 1, "sourceId": 1, "title": 1, "address": 1, "price": 1, "size": 1, "rooms": 1,
+              "images": 1, "description": 1, **{f: 1 for f in DEDUP_FIELDS}}
+
+
+def rebuild(props, cities=None, batch_size: int = 1000, dry_run: bool = False) -> Counter:
+    counts = Counter()
+    index = DedupIndex()
+    assigned = []
+    cursor = props.find({"isStillAvailable": {"$ne": False}}, PROJECTION, batch_size=5000,
+                        allow_disk_use=True).sort([("createdAt", 1), ("_id", 1)])
+    for doc in cursor:
+        if not doc.get("source") or not doc.get("sourceId"):
+            continue
+        if cities and city_key((doc.get("address") or {}).get("city")) not in cities:
+            continue
+        old = {f: doc.pop(f, None) for f in DEDUP_FIELDS}
+        counts['listings'] += 1
+        if index.assign(doc) is not None:
+            counts['duplicates'] += 1
+        # Samengevoegde groepen worden hieronder in één keer rechtgezet
+        index.relabelled = []
+        new = {f: doc[f] for f in DEDUP_FIELDS if f in doc}
+        assigned.append((doc["_id"], listing_key(doc["source"], doc["sourceId"]), old, new))
+    # Groepen kunnen later nog samengevoegd zijn: de canonical pas na alle listings vastleggen
+    ops = []
+    for _id, key, old, new in assigned:
+        dedup = new.get("dedup")
+        if dedup:
+            new["canonicalId"] = index.canonical(dedup["city"], key) or new["canonicalId"]
+        if new == {f: v for f, v in old.items() if v is not None}:
+            continue
+        counts['updated'] += 1
+        update = {"$set": new}
+        stale = {f: "" for f, v in old.items() if v is not None and f not in new}
+        if stale:
+            update["$unset"] = stale
+        ops.append(UpdateOne({"_id": _id}, update))
+        if len(ops) >= batch_size:
+            if not dry_run:
+                props.bulk_write(ops, ordered=False)
+            ops = []
+    if ops and not dry_run:
+        props.bulk_write(ops, ordered=False)
+    counts['cities'] = len(index.cities)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cities', type=str, default=None, help="kommagescheiden (standaard: alle)")
+    parser.add_argument('--batch', type=int, default=int(os.getenv('SCRAPER_BULK_SIZE', '1000')),
+                        help="updates per bulk_write")
+    parser.add_argument('--dry-run', action='store_true', help="alleen tellen, niets schrijven")
+    args = parser.parse_args()
+
+    cities = {city_key(c) for c in args.cities.split(',') if c.strip()} if args.cities else None
+    client = get_client()
+    try:
+        props = get_database(client).get_collection(properties_collection_name())
+        if not args.dry_run:
+            props.create_index("dedup.city")
+        counts = rebuild(props, cities, max(1, args.batch), args.dry_run)
+    finally:
+        client.close()
+    print("[build_dedup] " + " ".join(f"{k}={v}" for k, v in sorted(counts.items())))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+NL: Laadt item bestanden van de file sink (SCRAPER_SINK=file, zie rentbird_scraper/utils/sink.py)
+in de properties collectie, met dezelfde upsert op (source, sourceId), contentHash en clamps als
+de MongoPipeline, inclusief de change events naar de outbox. Geladen bestanden gaan naar `<source>/loaded/` (of worden verwijderd met --delete).
+Items waarvan de write mislukte gaan eerst naar een retry bestand naast het origineel (`<pid>r` in de naam),
+dat de volgende run opnieuw geladen wordt.
+Gebruik:
+  python load_sink.py
+  python load_sink.py --sources pararius --dir /data/sink --batch 2000
+  python load_sink.py --dry-run
+"""
+import argparse
+import datetime as dt
+import os
+import sys
+from collections import Counter
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from rentbird_scraper.pipelines import build_upsert, clamp_item, fetch_existing
+from rentbird_scraper.utils.mongo import get_client, get_database, properties_collection_name
+from rentbird_scraper.utils.outbox import listing_event, open_outbox
+from rentbird_scraper.utils.sink import iter_file, sink_dir, sink_files, write_retry
+
+
+def write_batch(props, batch: dict, counts: Counter, dry_run: bool, outbox=None, retry=None):
+    """Eén bulk_write; items met een write error gaan (zoals ze in het bestand stonden) in `retry` (per key)."""
+    if not batch:
+        return
+    items = list(batch.values())
+    existing = fetch_existing(props, [i for i in items if not i.get('_touch')]) if props is not None else {}
+    ops = []
+    events = []
+    kinds = []
+    checked = []
+    for item in items:
+        now = item.pop('_checkedAt', None) or dt.datetime.utcnow()
+        checked.append(now)
+        q = {"source": item["source"], "sourceId": item["sourceId"]}
+        if item.pop('_touch', False):
+            ops.append(UpdateOne(q, {"$set": {"lastCheckedAt": now}}))
+            events.append(None)
+            kinds.append('touched')
+            continue
+        item.setdefault("scrapedAt", now)
+        item.setdefault("isStillAvailable", True)
+        clamp_item(item)
+        doc = existing.get((item["source"], item["sourceId"]))
+        op, kind = build_upsert(item, doc, now)
+        ops.append(op)
+        events.append(listing_event(item, doc) if outbox is not None else None)
+        kinds.append(kind)
+    batch.clear()
+    if dry_run or props is None:
+        counts.update(kinds)
+        return
+    failed = set()
+    try:
+        upserted = set(props.bulk_write(ops, ordered=False).upserted_ids or {})
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors') or []
+        counts['write_errors'] += len(errors)
+        failed = {err.get('index') for err in errors}
+        upserted = {u.get('index') for u in e.details.get('upserted', [])}
+        for err in errors[:5]:
+            print(f"[load_sink] write mislukt: {err.get('errmsg')}", file=sys.stderr)
+    if retry is not None:
+        for i, item in enumerate(items):
+            key = (item['source'], item['sourceId'])
+            if i in failed:
+                touched = {'_touch': True} if kinds[i] == 'touched' else {}
+                retry[key] = dict(item, _checkedAt=checked[i], **touched)
+            else:
+                # Een latere versie is wel geschreven: de oudere niet meer opnieuw proberen
+                retry.pop(key, None)
+    for i, kind in enumerate(kinds):
+        if kind == 'new' and i not in upserted and i not in failed:
+            # Intussen door een ander proces ingevoegd (zie pipelines.settle_new)
+            kinds[i], events[i] = 'changed', None
+    counts.update(kinds)
+    if outbox is not None:
+        counts['events'] += outbox.append(e for i, e in enumerate(events) if e and i not in failed)
+
+
+def load_file(props, path: str, batch_size: int, dry_run: bool, outbox=None):
+    """(counts, pad van het retry bestand of None)."""
+    counts = Counter()
+    batch = {}
+    retry = {}
+    for item in iter_file(path):
+        if not item.get('source') or not item.get('sourceId'):
+            counts['invalid'] += 1
+            continue
+        key = (item['source'], item['sourceId'])
+        if key in batch:
+            # Latere versie van dezelfde listing: eerst de eerdere schrijven (volgorde blijft)
+            write_batch(props, batch, counts, dry_run, outbox, retry)
+        batch[key] = item
+        if len(batch) >= batch_size:
+            write_batch(props, batch, counts, dry_run, outbox, retry)
+    write_batch(props, batch, counts, dry_run, outbox, retry)
+    if not retry:
+        return counts, None
+    counts['retry'] += len(retry)
+    return counts, write_retry(path, list(retry.values()))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dir', default=None, help="sink map (standaard SCRAPER_SINK_DIR of .state/sink)")
+    parser.add_argument('--sources', type=str, default=None, help="kommagescheiden (standaard: alle)")
+    parser.add_argument('--batch', type=int, default=int(os.getenv('SCRAPER_BULK_SIZE', '1000')),
+                        help="items per bulk_write")
+    parser.add_argument('--dry-run', action='store_true', help="alleen lezen en tellen, niets schrijven of verplaatsen")
+    parser.add_argument('--delete', action='store_true', help="geladen bestanden verwijderen i.p.v. naar loaded/")
+    args = parser.parse_args()
+
+    directory = args.dir or sink_dir()
+    sources = [s.strip() for s in args.sources.split(',') if s.strip()] if args.sources else None
+    files = sink_files(directory, sources)
+    if not files:
+        print(f"[load_sink] geen bestanden in {directory}")
+        return 0
+
+    client = None
+    props = None
+    outbox = None
+    if not (args.dry_run and not os.getenv('MONGODB_URI')):
+        client = get_client()
+        db = get_database(client)
+        props = db.get_collection(properties_collection_name())
+        outbox = None if args.dry_run else open_outbox(db)
+
+    total = Counter()
+    try:
+        for path in files:
+            counts, retry_path = load_file(props, path, max(1, args.batch), args.dry_run, outbox)
+            total.update(counts)
+            print(f"[load_sink] {os.path.relpath(path, directory)}: " + " ".join(f"{k}={v}" for k, v in sorted(counts.items())))
+            if retry_path is not None:
+                print(f"[load_sink] mislukte writes opnieuw in {os.path.relpath(retry_path, directory)}", file=sys.stderr)
+            if args.dry_run or retry_path == path:
+                # Retry bestand is overschreven met wat opnieuw mislukte
+                continue
+            if args.delete:
+                os.remove(path)
+            else:
+                done = os.path.join(os.path.dirname(path), 'loaded')
+                os.makedirs(done, exist_ok=True)
+                os.replace(path, os.path.join(done, os.path.basename(path)))
+    finally:
+        if client is not None:
+            client.close()
+    print(f"[load_sink] {len(files)} bestand(en): " + " ".join(f"{k}={v}" for k, v in sorted(total.items())))
+    return 1 if total.get('write_errors') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
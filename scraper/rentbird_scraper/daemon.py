@@ -0,0 +1,244 @@
+"""
+Langlopende scraper (`run_daemon.py`): één proces met één reactor en één
+Mongo pool, en per source crawl cycles op een eigen interval.
+
+- interval per source: `daemon.everyMinutes` in config/sources/<naam>.json,
+  anders `--every` (SCRAPER_DAEMON_EVERY_MINUTES, 5)
+- nooit twee cycles van dezelfde source tegelijk: binnen het proces via de
+  schedule, tussen processen via een file lock (`<state>/<source>.cycle.lock`).
+  Loopt een cycle over zijn interval heen, dan start de volgende direct na
+  afloop (één keer, niet ingehaald)
+- config/sources/*.json wordt elke tick op mtime gecontroleerd; een gewijzigd
+  bestand geldt vanaf de volgende cycle, met ongeldige JSON wacht de source
+- status per source (duur van de cycles, laatste succes, fouten) in
+  `<state>/daemon.json` en als Prometheus textfile `<METRICS_DIR>/daemon.prom`
+
+Warm tussen cycles: imports, de geparste extractieplannen, de Mongo pool
+(utils/mongo.py `share_client`), de known-listing index (alleen wijzigingen,
+utils/known_index.py `keep_between_runs`), de vraag per stad en Scrapy's
+DNS cache. De HTTP connection pool hoort bij de Crawler en gaat per cycle dicht.
+
+Alle sources delen de reactor: Mongo round trips (index en vraag laden, outbox,
+bulk writes, sweep) draaien in worker threads, zodat een trage source de
+downloads van de andere niet ophoudt.
+"""
+import fcntl
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from rentbird_scraper.extensions import _write_atomic
+from rentbird_scraper.plans import CONFIG_DIR, config_path
+from rentbird_scraper.utils.metrics import Histogram, _iso, _labels, _num
+from rentbird_scraper.utils.state import state_dir
+
+
+# Seconden per cycle (een volledige crawl van alle steden duurt uren)
+CYCLE_BUCKETS = (5, 10, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 14400)
+
+
+def default_every_minutes() -> float:
+    return float(os.getenv('SCRAPER_DAEMON_EVERY_MINUTES', '5'))
+
+
+def source_names() -> List[str]:
+    """Alle sources met een config (`--sources all`); namen met `_` zijn voorbeelden."""
+    try:
+        names = os.listdir(os.path.join(CONFIG_DIR, 'sources'))
+    except OSError:
+        return []
+    return sorted(n[:-5] for n in names if n.endswith('.json') and not n.startswith('_'))
+
+
+def read_config(source: str) -> dict:
+    with open(config_path(source), 'r') as f:
+        cfg = json.load(f)
+    if not isinstance(cfg, dict):
+        raise ValueError('config is geen JSON object')
+    return cfg
+
+
+def every_seconds(cfg: dict, default_minutes: float) -> float:
+    minutes = (cfg.get('daemon') or {}).get('everyMinutes', default_minutes)
+    return max(0.1, float(minutes)) * 60
+
+
+class ConfigWatcher:
+    """mtime per configbestand; `changed` geeft de sources waarvan het bestand sinds de vorige check veranderd is."""
+
+    def __init__(self):
+        self.mtimes: Dict[str, Optional[int]] = {}
+
+    def changed(self, sources) -> List[str]:
+        out = []
+        for source in sources:
+            try:
+                mtime = os.stat(config_path(source)).st_mtime_ns
+            except OSError:
+                mtime = None
+            if source not in self.mtimes or self.mtimes[source] != mtime:
+                out.append(source)
+            self.mtimes[source] = mtime
+        return out
+
+    def forget(self, source: str):
+        self.mtimes.pop(source, None)
+
+
+class CycleLock:
+    """Exclusieve, niet-blokkerende file lock per source (ook tegen een tweede daemon op dezelfde state dir)."""
+
+    def __init__(self, source: str, directory: Optional[str] = None):
+        self.path = os.path.join(directory or state_dir(), f"{source}.cycle.lock")
+        self.file = None
+
+    def acquire(self) -> bool:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path, 'w')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self.file = f
+        return True
+
+    def release(self):
+        if self.file is None:
+            return
+        try:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        finally:
+            self.file.close()
+            self.file = None
+
+
+class SourceSchedule:
+    def __init__(self, source: str, every: float):
+        self.source = source
+        self.every = every
+        self.next_at = 0.0
+        self.running = False
+        self.overdue = False
+        self.config_error: Optional[str] = None
+        self.cycles = 0
+        self.failures = 0
+        self.overlaps = 0
+        self.lock_busy = 0
+        self.last_started: Optional[float] = None
+        self.last_finished: Optional[float] = None
+        self.last_success: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_reason: Optional[str] = None
+        self.last_items: Optional[int] = None
+        self.durations = Histogram(CYCLE_BUCKETS)
+
+    def due(self, now: float) -> bool:
+        return now >= self.next_at
+
+    def start(self, now: float):
+        self.running = True
+        self.overdue = False
+        self.last_started = now
+        # Interval telt vanaf de start, zodat de cadans niet met de duur van de crawl meeschuift
+        self.next_at = now + self.every
+
+    def finish(self, now: float, ok: bool, reason: Optional[str], items: int = 0):
+        self.running = False
+        self.cycles += 1
+        self.last_finished = now
+        self.last_reason = reason
+        self.last_items = items
+        if self.last_started is not None:
+            self.last_duration = now - self.last_started
+            self.durations.observe(self.last_duration)
+        if ok:
+            self.last_success = now
+        else:
+            self.failures += 1
+
+    def status(self) -> dict:
+        def iso(ts):
+            return _iso(ts) if ts is not None else None
+        return {
+            'everySeconds': self.every,
+            'running': self.running,
+            'nextAt': iso(self.next_at) if self.next_at else None,
+            'cycles': self.cycles,
+            'failures': self.failures,
+            'overlaps': self.overlaps,
+            'lockBusy': self.lock_busy,
+            'configError': self.config_error,
+            'lastStartedAt': iso(self.last_started),
+            'lastFinishedAt': iso(self.last_finished),
+            'lastSuccessAt': iso(self.last_success),
+            'lastDurationSeconds': round(self.last_duration, 3) if self.last_duration is not None else None,
+            'lastFinishReason': self.last_reason,
+            'lastItems': self.last_items,
+            'duration': self.durations.summary(),
+        }
+
+
+class DaemonStatus:
+    """Schrijft `<state>/daemon.json` en `<METRICS_DIR>/daemon.prom` (atomisch, zie extensions.py)."""
+
+    def __init__(self, schedules: Dict[str, SourceSchedule], metrics_directory: str):
+        self.schedules = schedules
+        self.started_at = time.time()
+        self.path = os.path.join(state_dir(), 'daemon.json')
+        self.prom_path = os.path.join(metrics_directory, 'daemon.prom')
+
+    def summary(self) -> dict:
+        return {
+            'pid': os.getpid(),
+            'startedAt': _iso(self.started_at),
+            'updatedAt': _iso(time.time()),
+            'sources': {s: sched.status() for s, sched in sorted(self.schedules.items())},
+        }
+
+    def prometheus(self) -> str:
+        out: List[str] = []
+
+        def metric(name, kind, help_text):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+
+        def sample(name, value, **labels):
+            out.append(f"{name}{_labels(labels)} {_num(value)}")
+
+        schedules = sorted(self.schedules.items())
+        metric('scraper_daemon_start_timestamp_seconds', 'gauge', 'Start van het daemon proces (unix tijd)')
+        sample('scraper_daemon_start_timestamp_seconds', round(self.started_at, 3))
+        metric('scraper_daemon_cycle_running', 'gauge', '1 als er nu een cycle van de source loopt')
+        for source, s in schedules:
+            sample('scraper_daemon_cycle_running', int(s.running), source=source)
+        metric('scraper_daemon_cycles_total', 'counter', 'Afgeronde cycles per source en uitkomst')
+        for source, s in schedules:
+            sample('scraper_daemon_cycles_total', s.cycles - s.failures, source=source, result='success')
+            sample('scraper_daemon_cycles_total', s.failures, source=source, result='failure')
+        metric('scraper_daemon_overlaps_total', 'counter', 'Cycles die nog liepen toen de volgende aan de beurt was')
+        for source, s in schedules:
+            sample('scraper_daemon_overlaps_total', s.overlaps, source=source)
+        metric('scraper_daemon_last_success_timestamp_seconds', 'gauge', 'Einde van de laatste geslaagde cycle')
+        for source, s in schedules:
+            if s.last_success is not None:
+                sample('scraper_daemon_last_success_timestamp_seconds', round(s.last_success, 3), source=source)
+        metric('scraper_daemon_config_error', 'gauge', '1 als de source config niet te laden is (source wacht)')
+        for source, s in schedules:
+            sample('scraper_daemon_config_error', int(s.config_error is not None), source=source)
+        metric('scraper_daemon_cycle_seconds', 'histogram', 'Duur van een crawl cycle')
+        for source, s in schedules:
+            h = s.durations
+            for bound, total in zip(h.bounds + (None,), h.cumulative()):
+                sample('scraper_daemon_cycle_seconds_bucket', total, source=source,
+                       le='+Inf' if bound is None else _num(bound))
+            sample('scraper_daemon_cycle_seconds_sum', h.sum, source=source)
+            sample('scraper_daemon_cycle_seconds_count', h.count, source=source)
+        return '\n'.join(out) + '\n'
+
+    def write(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        os.makedirs(os.path.dirname(self.prom_path), exist_ok=True)
+        _write_atomic(self.path, json.dumps(self.summary(), indent=2, sort_keys=True))
+        _write_atomic(self.prom_path, self.prometheus())
@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet import task
+
+from rentbird_scraper.utils.memprofile import MemoryProfiler
+from rentbird_scraper.utils.metrics import RunMetrics
+from rentbird_scraper.utils.state import state_dir
+
+
+logger = logging.getLogger(__name__)
+
+
+def metrics_dir() -> str:
+    return os.path.join(state_dir(), 'metrics')
+
+
+def clear_outputs(directory: str, source: str, shards_only: bool = True):
+    """Oude (shard) bestanden van een source opruimen, anders blijft Prometheus ze lezen."""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if not name.endswith(('.prom', '.json')):
+            continue
+        if name.startswith(f"{source}.shard-") or (not shards_only and name in (f"{source}.prom", f"{source}.json")):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+class CrawlMetrics:
+    """
+    Metingen per stage voor elke source (utils/metrics.py): download latency
+    per domein, parse tijd per callback (ParseTimingMiddleware), items per
+    stad, Mongo batch grootte en duur (MongoPipeline), wat er onderweg
+    wegvalt en de discovery latency per listing (run-start tot opgeslagen). Bij het sluiten van de spider komen er twee bestanden in
+    METRICS_DIR (standaard scraper/.state/metrics):
+
+    - `<source>.prom`: Prometheus text format voor de textfile collector
+    - `<source>.json`: samenvatting van de run, ook per stad
+
+    Met --workers krijgt elke shard eigen bestanden (`<source>.shard-<n>.*`).
+    """
+
+    # Scrapy/eigen stats -> reden in `dropped`
+    DROP_STATS = {
+        'duplicate_listing': 'frontier/dropped_duplicate',
+        'duplicate_request': 'dupefilter/filtered',
+        'offsite': 'offsite/filtered',
+        'budget_request': 'budget/dropped_request',
+        'budget_item': 'budget/dropped_item',
+        'retry_exhausted': 'retry/max_reached',
+        'write_error': 'mongo/write_errors',
+    }
+    WRITE_KINDS = ('new', 'changed', 'unchanged', 'touched')
+
+    def __init__(self, crawler, directory: str, shard=None):
+        self.crawler = crawler
+        self.directory = directory
+        self.shard = shard
+        self.metrics = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('METRICS_ENABLED', True):
+            raise NotConfigured
+        shard = settings.get('METRICS_SHARD')
+        ext = cls(crawler, settings.get('METRICS_DIR') or metrics_dir(), int(shard) if shard is not None else None)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.response_downloaded, signal=signals.response_downloaded)
+        crawler.signals.connect(ext.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(ext.item_dropped, signal=signals.item_dropped)
+        return ext
+
+    @staticmethod
+    def _source(spider) -> str:
+        return getattr(spider, 'source', None) or spider.name
+
+    @staticmethod
+    def _city(item, response):
+        # Bij items uit een errback is `response` een Failure
+        meta = getattr(response, 'meta', None) or {}
+        city = meta.get('city')
+        if not city and isinstance(item, dict):
+            city = (item.get('address') or {}).get('city')
+        return city
+
+    def spider_opened(self, spider):
+        self.metrics = RunMetrics(self._source(spider), self.shard)
+        # Gedeeld met ParseTimingMiddleware en MongoPipeline (zoals spider.budget)
+        spider.metrics = self.metrics
+
+    def response_downloaded(self, response, request, spider):
+        latency = request.meta.get('download_latency')
+        if self.metrics is not None and latency is not None:
+            self.metrics.observe_download(urlparse_cached(request).hostname or '-', latency)
+
+    def item_scraped(self, item, response, spider):
+        if self.metrics is not None:
+            touch = isinstance(item, dict) and bool(item.get('_touch'))
+            self.metrics.observe_item(self._city(item, response), touch=touch)
+
+    def item_dropped(self, item, response, exception, spider):
+        if self.metrics is not None:
+            self.metrics.observe_drop(f"pipeline_{type(exception).__name__}", self._city(item, response))
+
+    def spider_closed(self, spider, reason):
+        metrics = self.metrics
+        if metrics is None:
+            return
+        stats = self.crawler.stats
+        for name, key in self.DROP_STATS.items():
+            value = stats.get_value(key)
+            if value:
+                metrics.observe_drop(name, count=int(value))
+        writes = {k: stats.get_value(f'mongo/{k}') for k in self.WRITE_KINDS if stats.get_value(f'mongo/{k}') is not None}
+
+        name = metrics.source if self.shard is None else f"{metrics.source}.shard-{self.shard}"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if self.shard is None:
+                clear_outputs(self.directory, metrics.source)
+            summary = metrics.summary(reason, writes)
+            _write_atomic(os.path.join(self.directory, f"{name}.json"), json.dumps(summary, indent=2, sort_keys=True))
+            _write_atomic(os.path.join(self.directory, f"{name}.prom"), metrics.prometheus(reason, writes))
+        except OSError as e:
+            logger.warning(f"[{metrics.source}] metrics niet geschreven: {e}")
+            return
+        logger.info(
+            f"[{metrics.source}] metrics: {summary['items']} items in {summary['elapsedSeconds']}s "
+            f"({summary['itemsPerSecond']}/s), {summary['pipeline']['batches']} batches -> {self.directory}"
+        )
+        new = summary['discoveryLatency'].get('new')
+        if new:
+            stats.set_value('latency/new_p50', new['p50'])
+            stats.set_value('latency/new_p95', new['p95'])
+            logger.info(f"[{metrics.source}] discovery latency nieuwe listings: {new['count']} stuks, "
+                        f"p50 {new['p50']:.0f}s, p95 {new['p95']:.0f}s na run-start")
+
+
+class MemoryProfile:
+    """
+    Opt-in geheugenprofiel (SCRAPER_MEMPROFILE=1, utils/memprofile.py):
+    tracemalloc per callback via ParseTimingMiddleware (`spider.memprofile`)
+    en RSS elke MEMPROFILE_INTERVAL seconden. Bij het sluiten gaat de top
+    allocatie-plekken per callback naar het log en naar
+    `<METRICS_DIR>/<source>.memory.json`.
+
+    tracemalloc maakt elke allocatie duurder; niet standaard aanzetten.
+    """
+
+    def __init__(self, crawler, directory: str, shard=None):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.directory = directory
+        self.shard = shard
+        self.interval = settings.getfloat('MEMPROFILE_INTERVAL', 5.0)
+        self.profiler = MemoryProfiler(
+            every=settings.getint('MEMPROFILE_EVERY', 100),
+            frames=settings.getint('MEMPROFILE_FRAMES', 1),
+            top=settings.getint('MEMPROFILE_TOP', 10),
+        )
+        self.loop = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('MEMPROFILE_ENABLED', False):
+            raise NotConfigured
+        shard = settings.get('METRICS_SHARD')
+        ext = cls(crawler, settings.get('METRICS_DIR') or metrics_dir(), int(shard) if shard is not None else None)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        self.profiler.start()
+        spider.memprofile = self.profiler
+        self.loop = task.LoopingCall(self.profiler.sample_rss)
+        self.loop.start(max(0.5, self.interval), now=False)
+
+    def spider_closed(self, spider, reason):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        self.profiler.sample_rss()
+        report = self.profiler.report()
+        self.profiler.stop()
+        spider.memprofile = None
+        source = CrawlMetrics._source(spider)
+        stats = self.crawler.stats
+        stats.set_value('memory/rss_max_mb', round(report['rss']['maxBytes'] / 1048576, 1))
+        stats.set_value('memory/traced_peak_mb', round(report['traced']['peakBytes'] / 1048576, 1))
+        for name, cb in report['callbacks'].items():
+            sites = ', '.join(f"{s['site']} ({s['bytes'] // 1024} KB)" for s in cb['topSites'][:5]) or '-'
+            logger.info(f"[{source}] geheugen {name}: {cb['responses']} responses, "
+                        f"{cb['retainedPerResponse']} B/response vastgehouden, top: {sites}")
+        name = source if self.shard is None else f"{source}.shard-{self.shard}"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            _write_atomic(os.path.join(self.directory, f"{name}.memory.json"),
+                          json.dumps(dict(report, source=source, shard=self.shard, finishReason=reason), indent=2))
+        except OSError as e:
+            logger.warning(f"[{source}] geheugenprofiel niet geschreven: {e}")
+
+
+def _write_atomic(path: str, text: str):
+    # Textfile collector mag nooit een half bestand zien
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
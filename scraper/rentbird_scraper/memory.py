@@ -0,0 +1,107 @@
+"""
+Geheugen-begrensde modus voor lange runs over alle steden
+(`run_sources.py --memory-bounded`, of SCRAPER_MEMORY_MODE=1).
+
+- `SCRAPER_SLOT_MAX_ACTIVE_SIZE`: zoveel bytes aan responses mogen tegelijk
+  in de spider callbacks en pipelines zitten; daarboven haalt de engine geen
+  nieuwe requests meer uit de scheduler (`SCRAPER_MEMORY_RESPONSE_MB`, 4)
+- `DOWNLOAD_MAXSIZE`: grotere responses worden afgebroken
+  (`SCRAPER_MEMORY_MAX_RESPONSE_MB`, 16)
+- `CONCURRENT_ITEMS`: minder items tegelijk in de pipelines (25)
+- `SpillingScheduler`: boven `SCRAPER_MEMORY_QUEUE` (5000) requests in de
+  geheugen-queue gaan nieuwe requests naar een disk queue in
+  `<state>/spill/`, die na de run weer verdwijnt
+
+Elke source heeft een eigen Crawler en dus een eigen scheduler, zodat de
+limieten per source gelden.
+"""
+import os
+import shutil
+import tempfile
+
+from scrapy.core.scheduler import Scheduler
+from scrapy.settings import Settings
+
+from rentbird_scraper.utils.state import state_dir
+
+
+SCHEDULER = 'rentbird_scraper.memory.SpillingScheduler'
+
+
+def memory_bounded() -> bool:
+    return os.getenv('SCRAPER_MEMORY_MODE', '0') == '1'
+
+
+def memory_settings(settings: Settings) -> Settings:
+    """Na source_settings toepassen; expliciete Scrapy settings (cmdline) gaan voor."""
+    mb = 1024 * 1024
+    for name, value in (
+        ('SCRAPER_SLOT_MAX_ACTIVE_SIZE', int(float(os.getenv('SCRAPER_MEMORY_RESPONSE_MB', '4')) * mb)),
+        ('DOWNLOAD_MAXSIZE', int(float(os.getenv('SCRAPER_MEMORY_MAX_RESPONSE_MB', '16')) * mb)),
+        ('CONCURRENT_ITEMS', 25),
+        ('SCHEDULER', SCHEDULER),
+        ('SCHEDULER_SPILL_AFTER', int(os.getenv('SCRAPER_MEMORY_QUEUE', '5000'))),
+    ):
+        settings.set(name, value, priority='spider')
+    return settings
+
+
+class SpillingScheduler(Scheduler):
+    """
+    Scheduler die requests in het geheugen houdt tot `SCHEDULER_SPILL_AFTER`
+    en daarboven naar een (tijdelijke) disk queue schrijft. Bij het ophalen
+    wint de queue met de hoogste priority bovenaan (bij gelijke priority het
+    geheugen), zodat een gespilde detail request niet achter lagere
+    lijstpagina's in het geheugen blijft hangen.
+    Met een JOBDIR gedraagt hij zich als de gewone Scheduler (alles op schijf,
+    hervatbaar).
+    """
+
+    spill_after = 5000
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        scheduler = super().from_crawler(crawler)
+        scheduler.spill_after = max(0, crawler.settings.getint('SCHEDULER_SPILL_AFTER', cls.spill_after))
+        scheduler.spill_dir = None
+        return scheduler
+
+    def open(self, spider):
+        if self.dqdir is None:
+            root = os.path.join(state_dir(), 'spill')
+            os.makedirs(root, exist_ok=True)
+            self.spill_dir = tempfile.mkdtemp(prefix=f"{getattr(spider, 'source', None) or spider.name}-", dir=root)
+            self.dqdir = self.spill_dir
+        return super().open(spider)
+
+    def close(self, reason):
+        if self.spill_dir is None:
+            return super().close(reason)
+        # Tijdelijke queue: niets bewaren voor een volgende run
+        if self.dqs is not None:
+            self.dqs.close()
+            self.dqs = None
+        result = self.df.close(reason)
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+        return result
+
+    def next_request(self):
+        # ScrapyPriorityQueue: curprio = -priority van de eerstvolgende request (lager = eerder)
+        disk = getattr(self.dqs, 'curprio', None) if self.spill_dir is not None and self.dqs else None
+        memory = getattr(self.mqs, 'curprio', None)
+        if disk is None or (memory is not None and memory <= disk):
+            return super().next_request()
+        request = self._dqpop()
+        if request is not None:
+            self.stats.inc_value('scheduler/dequeued/disk', spider=self.spider)
+            self.stats.inc_value('scheduler/dequeued', spider=self.spider)
+        return request
+
+    def _dqpush(self, request) -> bool:
+        if self.spill_dir is not None and len(self.mqs) < self.spill_after:
+            # Onder de drempel: geheugen (geen pickle/IO)
+            return False
+        pushed = super()._dqpush(request)
+        if pushed and self.spill_dir is not None:
+            self.stats.inc_value('scheduler/spilled', spider=self.spider)
+        return pushed
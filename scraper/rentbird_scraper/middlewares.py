@@ -0,0 +1,464 @@
+import logging
+import queue
+import threading
+import time
+
+from scrapy import Request, signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+
+
+logger = logging.getLogger(__name__)
+
+
+class BackoffMiddleware:
+    """
+    Backoff per source bij 429/503 en netwerkfouten.
+
+    Elke fout verdubbelt de delay van het download slot (Retry-After wordt
+    gerespecteerd, plafond BACKOFF_MAX_DELAY) en kost één punt van het
+    budget van deze crawler. Is het budget op, dan stopt alleen deze source
+    (reden `backoff_budget_exhausted`); andere sources in dezelfde run
+    draaien door. AutoThrottle brengt de delay daarna weer omlaag zodra de
+    site normaal antwoordt. De retry zelf blijft bij Scrapy's RetryMiddleware.
+    """
+
+    def __init__(self, crawler, budget: int, max_delay: float, http_codes):
+        self.crawler = crawler
+        self.budget = budget
+        self.max_delay = max_delay
+        self.http_codes = set(http_codes)
+        self.spent = 0
+        self.stopping = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('BACKOFF_ENABLED', True):
+            raise NotConfigured
+        mw = cls(
+            crawler,
+            budget=settings.getint('BACKOFF_BUDGET', 0),
+            max_delay=settings.getfloat('BACKOFF_MAX_DELAY', 60.0),
+            http_codes=[int(c) for c in settings.getlist('BACKOFF_HTTP_CODES', [429, 503])],
+        )
+        crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
+        return mw
+
+    def process_response(self, request, response, spider):
+        if response.status in self.http_codes:
+            self._backoff(request, spider, f"http_{response.status}", self._retry_after(response))
+        return response
+
+    def process_exception(self, request, exception, spider):
+        # robots.txt, dupefilter e.d. zijn geen fouten van de site
+        if isinstance(exception, IgnoreRequest):
+            return None
+        self._backoff(request, spider, type(exception).__name__, None)
+        return None
+
+    def _backoff(self, request, spider, reason: str, retry_after):
+        stats = self.crawler.stats
+        stats.inc_value(f'backoff/{reason}')
+        slot = self._slot(request, spider)
+        if slot is not None:
+            floor = self.crawler.settings.getfloat('DOWNLOAD_DELAY')
+            delay = max(slot.delay * 2, floor, 1.0, retry_after or 0)
+            slot.delay = min(delay, self.max_delay)
+            stats.max_value('backoff/max_delay', slot.delay)
+
+        self.spent += 1
+        stats.set_value('backoff/spent', self.spent)
+        if self.budget and self.spent >= self.budget and not self.stopping:
+            self.stopping = True
+            logger.warning(f"[{getattr(spider, 'source', spider.name)}] backoff budget ({self.budget}) op, source stopt")
+            self.crawler.engine.close_spider(spider, 'backoff_budget_exhausted')
+
+    def _slot(self, request, spider):
+        engine = getattr(self.crawler, 'engine', None)
+        if engine is None:
+            return None
+        downloader = engine.downloader
+        if hasattr(downloader, 'get_slot_key'):  # Scrapy >= 2.12
+            key = downloader.get_slot_key(request)
+        else:
+            key = downloader._get_slot_key(request, spider)
+        return downloader.slots.get(key)
+
+    @staticmethod
+    def _retry_after(response):
+        value = response.headers.get(b'Retry-After')
+        if not value:
+            return None
+        try:
+            return float(value.decode('latin-1').strip())
+        except ValueError:
+            # HTTP-date variant negeren we; de verdubbeling doet dan het werk
+            return None
+
+    def spider_closed(self, spider, reason):
+        if self.spent:
+            logger.info(f"[{getattr(spider, 'source', spider.name)}] backoff: {self.spent} fouten, reden stop: {reason}")
+
+
+class BudgetMiddleware:
+    """
+    Houdt `spider.budget` (utils/budget.py) bij; staat zowel als downloader- als
+    spider middleware in settings.py.
+
+    - downloader: wachtende requests zonder reservering (lijstpagina's) vallen
+      weg zodra het budget voor hun stad of het totaal op is
+    - spider: een item van een gereserveerde detail request zet de
+      reservering om in een geleverd item; levert de callback niets op (of
+      faalt hij), dan komt de reservering vrij. Items zonder reservering
+      (bijv. seed URLs) tellen ook mee; boven het budget vallen ze weg.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    @staticmethod
+    def _budget(spider):
+        budget = getattr(spider, 'budget', None)
+        return budget if budget is not None and budget.limited else None
+
+    # downloader middleware
+    def process_request(self, request, spider):
+        budget = self._budget(spider)
+        if budget is None or request.meta.get('budget_reserved'):
+            return None
+        if budget.exhausted(request.meta.get('city')):
+            self.stats.inc_value('budget/dropped_request')
+            raise IgnoreRequest('item budget bereikt')
+        return None
+
+    # spider middleware
+    def process_spider_output(self, response, result, spider):
+        budget = self._budget(spider)
+        for out in result:
+            if budget is None or isinstance(out, Request):
+                yield out
+            elif self._accept(response, out, budget):
+                yield out
+        self._finish(response, budget)
+
+    async def process_spider_output_async(self, response, result, spider):
+        budget = self._budget(spider)
+        async for out in result:
+            if budget is None or isinstance(out, Request):
+                yield out
+            elif self._accept(response, out, budget):
+                yield out
+        self._finish(response, budget)
+
+    def process_spider_exception(self, response, exception, spider):
+        self._finish(response, self._budget(spider))
+        return None
+
+    def _accept(self, response, item, budget) -> bool:
+        meta = response.meta
+        if meta.get('budget_reserved'):
+            meta['budget_reserved'] = False
+            budget.release(meta.get('city'))
+        if isinstance(item, dict) and item.get('_touch'):
+            # 304 op een bekende listing: geen nieuw item, telt niet mee
+            return True
+        # Stad van het item als de request er geen had (bijv. rebogroep haalt die uit de detailpagina)
+        city = meta.get('city')
+        if not city and isinstance(item, dict):
+            city = (item.get('address') or {}).get('city')
+        if budget.commit(city):
+            return True
+        self.stats.inc_value('budget/dropped_item')
+        return False
+
+    def _finish(self, response, budget):
+        meta = response.meta
+        if budget is not None and meta.get('budget_reserved'):
+            meta['budget_reserved'] = False
+            budget.release(meta.get('city'))
+            self.stats.inc_value('budget/released')
+
+
+class RevalidationMiddleware:
+    """
+    Conditional requests (If-None-Match / If-Modified-Since) op basis van de
+    lokale validator store (utils/validators.py).
+
+    Alleen requests met `meta['revalidate']`:
+    - `'body'` (lijstpagina's): body wordt bewaard; een 304 wordt vervangen door
+      de opgeslagen body en normaal geparst
+    - `True` (detailpagina's): alleen validators; de 304 gaat naar de callback,
+      die een touch item oplevert (pipeline zet dan alleen `lastCheckedAt`)
+    Stats per source: `revalidate/requests`, `revalidate/not_modified`,
+    `revalidate/bytes_saved` en `revalidate/304_ratio`. De store schrijft in
+    een eigen thread; hier alleen korte reads.
+    """
+
+    def __init__(self, crawler, store):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.store = store
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('REVALIDATE_ENABLED'):
+            raise NotConfigured
+        from rentbird_scraper.utils.validators import ValidatorStore
+        store = ValidatorStore(settings.get('REVALIDATE_DB') or None, settings.getint('REVALIDATE_MAX_ENTRIES', 50000))
+        mw = cls(crawler, store)
+        crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
+        return mw
+
+    @staticmethod
+    def _key(request) -> str:
+        from rentbird_scraper.utils.frontier import canonical_url
+        return canonical_url(request.url)
+
+    def process_request(self, request, spider):
+        mode = request.meta.get('revalidate')
+        if not mode or request.method != 'GET':
+            return None
+        cached = self.store.get(self._key(request))
+        if cached is None or (mode == 'body' and cached.body is None):
+            return None
+        if not (cached.etag or cached.last_modified):
+            return None
+        if cached.etag and b'If-None-Match' not in request.headers:
+            request.headers[b'If-None-Match'] = cached.etag
+        if cached.last_modified and b'If-Modified-Since' not in request.headers:
+            request.headers[b'If-Modified-Since'] = cached.last_modified
+        request.meta['revalidate_length'] = cached.length
+        if mode != 'body':
+            # De 304 moet bij de callback aankomen (HttpErrorMiddleware laat alleen 2xx door)
+            codes = list(request.meta.get('handle_httpstatus_list', []))
+            if 304 not in codes:
+                request.meta['handle_httpstatus_list'] = codes + [304]
+        self.stats.inc_value('revalidate/requests')
+        return None
+
+    def process_response(self, request, response, spider):
+        mode = request.meta.get('revalidate')
+        if not mode or request.method != 'GET':
+            return response
+        key = self._key(request)
+        if response.status == 304:
+            self.stats.inc_value('revalidate/not_modified')
+            self.stats.inc_value('revalidate/bytes_saved', int(request.meta.get('revalidate_length') or 0))
+            if mode == 'body':
+                cached = self.store.get(key)
+                if cached is not None and cached.body is not None:
+                    return response.replace(status=200, body=cached.body, flags=response.flags + ['revalidated'])
+                # Body intussen verdwenen: zonder validators opnieuw ophalen
+                self.store.delete(key)
+                retry = request.replace(dont_filter=True)
+                retry.headers.pop(b'If-None-Match', None)
+                retry.headers.pop(b'If-Modified-Since', None)
+                return retry
+            return response
+        if response.status == 200:
+            etag = response.headers.get(b'ETag')
+            last_modified = response.headers.get(b'Last-Modified')
+            if etag or last_modified:
+                self.store.put(
+                    key,
+                    etag.decode('latin-1') if etag else None,
+                    last_modified.decode('latin-1') if last_modified else None,
+                    len(response.body),
+                    response.body if mode == 'body' else None,
+                )
+        return response
+
+    def spider_closed(self, spider, reason):
+        sent = self.stats.get_value('revalidate/requests', 0)
+        if sent:
+            hits = self.stats.get_value('revalidate/not_modified', 0)
+            self.stats.set_value('revalidate/304_ratio', round(hits / sent, 3))
+        self.store.close()
+        # Store op slot (read overgeslagen) of write queue vol (write overgeslagen)
+        if self.store.busy:
+            self.stats.set_value('revalidate/store_busy', self.store.busy)
+        if self.store.dropped:
+            self.stats.set_value('revalidate/store_dropped', self.store.dropped)
+
+
+class ParseTimingMiddleware:
+    """
+    Meet de tijd die de spider callback per response kost (som van de tijd in
+    elke `next()` op de output) voor `spider.metrics` (extensions.CrawlMetrics).
+    Staat in settings.py het dichtst bij de spider, zodat andere middlewares
+    niet meetellen. Bij async callbacks (parse pool) is het wandkloktijd,
+    inclusief wachten op de worker.
+
+    Met SCRAPER_MEMPROFILE=1 (`spider.memprofile`, extensions.MemoryProfile)
+    ook het netto geheugen per callback en, voor gesamplede responses, een
+    tracemalloc snapshot vóór en na de callback (utils/memprofile.py).
+    """
+
+    @staticmethod
+    def _callback(response, spider) -> str:
+        request = getattr(response, 'request', None)
+        callback = getattr(request, 'callback', None) or spider.parse
+        return getattr(callback, '__name__', 'parse')
+
+    @staticmethod
+    def _observe(response, spider, seconds: float, name: str = None):
+        metrics = getattr(spider, 'metrics', None)
+        if metrics is None:
+            return
+        name = name or ParseTimingMiddleware._callback(response, spider)
+        metrics.observe_parse(name, response.meta.get('city'), seconds)
+
+    def process_spider_output(self, response, result, spider):
+        profiler = getattr(spider, 'memprofile', None)
+        if profiler is not None:
+            yield from self._profiled(response, result, spider, profiler)
+            return
+        spent = 0.0
+        it = iter(result)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    out = next(it)
+                except StopIteration:
+                    break
+                finally:
+                    spent += time.perf_counter() - start
+                yield out
+        finally:
+            self._observe(response, spider, spent)
+
+    def _profiled(self, response, result, spider, profiler):
+        name = self._callback(response, spider)
+        spent = 0.0
+        retained = 0
+        if profiler.should_sample(name):
+            # Callback in één keer leeglezen tussen twee snapshots
+            before = profiler.snapshot()
+            traced = profiler.traced()
+            start = time.perf_counter()
+            try:
+                outputs = list(result)
+            finally:
+                spent = time.perf_counter() - start
+                profiler.observe(name, profiler.traced() - traced)
+                profiler.record(name, before)
+                self._observe(response, spider, spent, name)
+            yield from outputs
+            return
+        it = iter(result)
+        try:
+            while True:
+                start = time.perf_counter()
+                traced = profiler.traced()
+                try:
+                    out = next(it)
+                except StopIteration:
+                    break
+                finally:
+                    spent += time.perf_counter() - start
+                    retained += profiler.traced() - traced
+                yield out
+        finally:
+            profiler.observe(name, retained)
+            self._observe(response, spider, spent, name)
+
+    async def process_spider_output_async(self, response, result, spider):
+        profiler = getattr(spider, 'memprofile', None)
+        name = self._callback(response, spider)
+        before = profiler.snapshot() if profiler is not None and profiler.should_sample(name) else None
+        spent = 0.0
+        retained = 0
+        it = result.__aiter__()
+        try:
+            while True:
+                start = time.perf_counter()
+                traced = profiler.traced() if profiler is not None else 0
+                try:
+                    out = await it.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    spent += time.perf_counter() - start
+                    if profiler is not None:
+                        retained += profiler.traced() - traced
+                if before is not None:
+                    # Sample afronden vóór de output verder de pipeline in gaat
+                    profiler.record(name, before)
+                    before = None
+                yield out
+        finally:
+            if profiler is not None:
+                profiler.observe(name, retained)
+                profiler.record(name, before)
+            self._observe(response, spider, spent, name)
+
+
+class ArchiveRecorderMiddleware:
+    """
+    `--record`: elke response zoals hij van het netwerk komt (vóór redirects,
+    retries en decompressie) in het archief (utils/archive.py, replay.py).
+    Alleen actief als ARCHIVE_RECORD_DIR gezet is.
+
+    Comprimeren, blob files en sqlite gebeuren in één writer thread met een
+    eigen verbinding; de reactor zet alleen de response in een queue. Is die
+    vol (schijf trager dan het netwerk), dan wacht de reactor: een opname
+    laat geen responses vallen. Bij spider_closed wordt de queue leeggeschreven.
+    """
+
+    QUEUE_SIZE = 500
+
+    def __init__(self, crawler, path):
+        self.stats = crawler.stats
+        self.path = path
+        self._queue = queue.Queue(self.QUEUE_SIZE)
+        self._writer = threading.Thread(target=self._run, name='archive-writer', daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get('ARCHIVE_RECORD_DIR')
+        if not path:
+            raise NotConfigured
+        mw = cls(crawler, path)
+        crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
+        return mw
+
+    def process_response(self, request, response, spider):
+        from rentbird_scraper.utils.archive import request_key
+        headers = [(k.decode('latin-1'), [v.decode('latin-1') for v in vs]) for k, vs in response.headers.items()]
+        self._queue.put((request_key(request.method, request.url, request.body), response.url,
+                         response.status, headers, response.body))
+        return response
+
+    def _run(self):
+        # Writer thread: sqlite verbindingen horen bij de thread die ze opent
+        from rentbird_scraper.utils.archive import ResponseArchive
+        archive = ResponseArchive(self.path)
+        try:
+            while True:
+                entry = self._queue.get()
+                if entry is None:
+                    break
+                try:
+                    written = archive.put(*entry)
+                except Exception as e:
+                    logger.warning("[archive] %s niet opgenomen: %s", entry[1], e)
+                    self.stats.inc_value('archive/errors')
+                    continue
+                self.stats.inc_value('archive/recorded')
+                if written:
+                    self.stats.inc_value('archive/blobs_new')
+                    self.stats.inc_value('archive/bytes_written', written)
+        finally:
+            archive.close()
+
+    def spider_closed(self, spider, reason):
+        from twisted.internet import threads
+        self._queue.put(None)
+        return threads.deferToThread(self._writer.join)
@@ -1,71 +1,487 @@
 import os
 import datetime as dt
-from typing import Any, Dict
-from pymongo import MongoClient, UpdateOne
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from pymongo import UpdateOne
+from twisted.internet import defer, threads
+from twisted.python.failure import Failure
+from rentbird_scraper.utils.availability import city_key
+from rentbird_scraper.utils.bulk import BulkWriter
+from rentbird_scraper.utils.dedup import DEDUP_FIELDS, DedupIndex, listing_key
+from rentbird_scraper.utils.fingerprint import CONTENT_FIELDS, changed_fields, content_hash
+from rentbird_scraper.utils.mongo import get_client, get_database, properties_collection_name
+from rentbird_scraper.utils.outbox import delisted_event, listing_event, open_outbox
+from rentbird_scraper.utils.sink import SinkWriter
 
 
 class MongoPipeline:
     """
     Schrijft woningen naar MongoDB, upsert op (source, sourceId),
     zet beschikbaarheidsvelden en timestamps.
+
+    Writes worden gebufferd en in batches (bulk_write, ordered=False) vanuit
+    een worker thread weggeschreven; zie `BulkWriter`. Instelbaar via
+    SCRAPER_BULK_SIZE, SCRAPER_BULK_INTERVAL (sec) en SCRAPER_BULK_MAX_PENDING.
+
+    Per item wordt een `contentHash` opgeslagen; ongewijzigde advertenties
+    krijgen alleen een nieuwe `lastCheckedAt` (geen `scrapedAt`, dus de matcher
+    wordt niet opnieuw wakker), gewijzigde alleen de afwijkende velden.
+    Wijzigingen in de match-velden gaan na de write als event naar de outbox
+    (utils/outbox.py).
     """
 
     def open_spider(self, spider):
-        uri = os.getenv("MONGODB_URI")
-        if not uri:
-            raise RuntimeError("MONGODB_URI ontbreekt voor scraper")
-        self.client = MongoClient(uri)
-        db_name = os.getenv("MONGODB_DB")
-        if db_name:
-            self.db = self.client.get_database(db_name)
-        else:
-            # Try default database from URI; fallback to 'fyxed' if none
-            try:
-                self.db = self.client.get_default_database()
-            except Exception:
-                self.db = self.client.get_database('fyxed')
-        # Allow overriding target collection (for per-source staging)
-        coll_name = os.getenv("SCRAPER_COLLECTION", "properties")
-        self.props = self.db.get_collection(coll_name)
+        self.client = get_client()
+        self.db = get_database(self.client)
+        self.props = self.db.get_collection(properties_collection_name())
         self.verbose = os.getenv("SCRAPER_PIPELINE_LOG", "0") == "1"
+        self.spider = spider
+        self.stats = spider.crawler.stats if getattr(spider, 'crawler', None) else None
+        self.counts: Dict[str, int] = {}
+        # Outbox aanmaken (list_collection_names, create_index) niet op de reactor; Scrapy wacht erop
+        return threads.deferToThread(open_outbox, self.db).addCallback(self._start_writer)
+
+    def _start_writer(self, outbox):
+        self.outbox = outbox
+        self.writer = BulkWriter(
+            self.props,
+            batch_size=int(os.getenv("SCRAPER_BULK_SIZE", "500")),
+            flush_interval=float(os.getenv("SCRAPER_BULK_INTERVAL", "2.0")),
+            max_pending=int(os.getenv("SCRAPER_BULK_MAX_PENDING", "2")),
+            on_result=self._on_written,
+            on_error=self._on_write_error,
+            prepare=self._prepare,
+            on_batch=self._on_batch,
+            after_write=self._emit_events if self.outbox is not None else None,
+        )
+        self.writer.start()
 
     def close_spider(self, spider):
-        try:
-            if hasattr(self, 'client') and self.client:
-                self.client.close()
-        except Exception:
-            pass
+        d = self.writer.close() if hasattr(self, 'writer') else None
+
+        def _close_client(_):
+            if getattr(self, 'counts', None) is not None:
+                spider.logger.info(
+                    f"[MongoPipeline] nieuw={self.counts.get('new', 0)} "
+                    f"gewijzigd={self.counts.get('changed', 0)} "
+                    f"ongewijzigd={self.counts.get('unchanged', 0)} "
+                    f"304={self.counts.get('touched', 0)}"
+                )
+            try:
+                if hasattr(self, 'client') and self.client:
+                    self.client.close()
+            except Exception:
+                pass
+
+        if d is None:
+            return _close_client(None)
+        d.addBoth(_close_client)
+        return d
+
+    def _on_written(self, entries, upserted):
+        settle_new(entries, upserted)
+        metrics = getattr(self.spider, 'metrics', None)
+        for entry in entries:
+            if entry is None or entry.kind is None:
+                continue
+            if self.stats is not None:
+                self.stats.inc_value(f"mongo/{entry.kind}")
+            if metrics is not None:
+                # Discovery latency: tijd sinds run-start tot de listing in Mongo staat
+                metrics.observe_stored(entry.kind, (entry.item.get('address') or {}).get('city'))
+            self.counts[entry.kind] = self.counts.get(entry.kind, 0) + 1
+            if self.verbose:
+                item = entry.item
+                print(f"[MongoPipeline] {entry.kind} {item.get('source')}:{item.get('sourceId')} €{item.get('price')} {item.get('address',{}).get('city')}")
+
+    def _on_batch(self, size, seconds):
+        metrics = getattr(self.spider, 'metrics', None)
+        if metrics is not None:
+            metrics.observe_batch(size, seconds)
+
+    def _on_write_error(self, entry, err):
+        if self.stats is not None:
+            self.stats.inc_value("mongo/write_errors")
+        item = entry.item if entry else None
+        if entry is not None:
+            entry.kind = None
+        ref = f"{item.get('source')}:{item.get('sourceId')}" if item else '?'
+        self.spider.logger.error(f"[MongoPipeline] write mislukt voor {ref}: {err.get('errmsg')}")
+
+    def _prepare(self, entries):
+        # Draait in de BulkWriter thread: één find per source voor de hele batch
+        existing = fetch_existing(self.props, [e.item for e in entries if e.op is None])
+        ops = []
+        for e in entries:
+            if e.op is not None:
+                ops.append(e.op)
+                continue
+            doc = existing.get((e.item["source"], e.item["sourceId"]))
+            op, e.kind = build_upsert(e.item, doc, e.now)
+            e.event = listing_event(e.item, doc) if self.outbox is not None else None
+            ops.append(op)
+        return ops
+
+    def _emit_events(self, entries, failed, upserted):
+        # BulkWriter thread, na de bulk_write: alleen events voor gelukte writes
+        settle_new(entries, upserted)
+        n = self.outbox.append(e.event for i, e in enumerate(entries) if i not in failed and e.event)
+        if n and self.stats is not None:
+            self.stats.inc_value("outbox/events", n)
 
     def process_item(self, item: Dict[str, Any], spider):
         now = dt.datetime.utcnow()
+        if item.get("_touch"):
+            # 304 op de detailpagina: inhoud ongewijzigd, alleen lastCheckedAt
+            q = {"source": item["source"], "sourceId": item["sourceId"]}
+            entry = _Pending(item, now, UpdateOne(q, {"$set": {"lastCheckedAt": now}}), "touched")
+            wait = self.writer.add(("touch", item["source"], item["sourceId"]), None, entry)
+            return wait.addCallback(lambda _: item) if wait is not None else item
+
         item.setdefault("scrapedAt", now)
         item.setdefault("isStillAvailable", True)
+        clamp_item(item)
+
+        entry = _Pending(item, now)
+        wait = self.writer.add((item["source"], item["sourceId"]), None, entry)
+        if wait is not None:
+            # Backpressure: te veel lopende flushes, item pas vrijgeven als er ruimte is
+            return wait.addCallback(lambda _: item)
+        return item
+
+
+class DedupPipeline:
+    """
+    Dubbele listings over sources heen (utils/dedup.py): zet `canonicalId` en
+    `dedup` op het item vóór de MongoPipeline. De LSH index wordt per stad
+    bij het eerste item van die stad uit Mongo geladen (in een worker thread;
+    items van die stad wachten daarop). Uit met SCRAPER_DEDUP=0.
+
+    Verandert de canonical van een groep, dan krijgen de andere leden die in
+    Mongo via een losse bulk write (worker thread); recente items die nog in de
+    buffer van de MongoPipeline staan worden direct aangepast.
+    """
+
+    # Items die nog niet weggeschreven kunnen zijn (ruim boven bulk size × max pending)
+    RECENT = 5000
+
+    def open_spider(self, spider):
+        self.spider = spider
+        self.stats = spider.crawler.stats if getattr(spider, 'crawler', None) else None
+        self.index = DedupIndex()
+        self.client = get_client()
+        self.props = get_database(self.client).get_collection(properties_collection_name())
+        self._loading: Dict[str, list] = {}
+        self._indexed = False
+        self._recent: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Relabel writes na elkaar, zodat de laatste canonical wint
+        self._relabels = defer.succeed(None)
+
+    def close_spider(self, spider):
+        spider.logger.info(f"[DedupPipeline] {len(self.index.cities)} steden, {len(self.index)} listings in de index")
+
+        def _close_client(_):
+            try:
+                self.client.close()
+            except Exception:
+                pass
+
+        done = defer.Deferred()
+        self._relabels.addBoth(lambda _: done.callback(None))
+        return done.addBoth(_close_client)
+
+    def _load(self, city: str) -> int:
+        # Worker thread
+        if not self._indexed:
+            self.props.create_index("dedup.city")
+            self._indexed = True
+        return self.index.load(self.props, city)
+
+    def _loaded(self, result, city: str):
+        if isinstance(result, Failure):
+            self.spider.logger.warning(f"[DedupPipeline] index voor {city} niet geladen: {result.getErrorMessage()}")
+            self.index.mark_loaded(city)
+        elif self.stats is not None:
+            self.stats.inc_value("dedup/cities_loaded")
+            self.stats.inc_value("dedup/loaded", result)
+        for waiter in self._loading.pop(city, []):
+            waiter.callback(None)
+
+    def _assign(self, item):
+        duplicate = self.index.assign(item)
+        if duplicate is not None and self.stats is not None:
+            self.stats.inc_value("dedup/duplicates")
+        key = listing_key(item["source"], item["sourceId"])
+        self._recent[key] = item
+        self._recent.move_to_end(key)
+        if len(self._recent) > self.RECENT:
+            self._recent.popitem(last=False)
+        if self.index.relabelled:
+            self._relabel(self.index.relabelled)
+            self.index.relabelled = []
+        return item
+
+    def _relabel(self, pairs):
+        ops = []
+        for key, canonical in pairs:
+            recent = self._recent.get(key)
+            if recent is not None:
+                recent["canonicalId"] = canonical
+            source, source_id = key.split(":", 1)
+            ops.append(UpdateOne({"source": source, "sourceId": source_id}, {"$set": {"canonicalId": canonical}}))
+        if self.stats is not None:
+            self.stats.inc_value("dedup/relabelled", len(ops))
+        self._relabels.addCallback(lambda _: threads.deferToThread(self.props.bulk_write, ops, ordered=False))
+        self._relabels.addErrback(lambda f: self.spider.logger.warning(
+            f"[DedupPipeline] canonicalId van {len(ops)} listings niet bijgewerkt: {f.getErrorMessage()}"))
+
+    def process_item(self, item: Dict[str, Any], spider):
+        if item.get("_touch"):
+            return item
+        city = city_key((item.get("address") or {}).get("city"))
+        if self.index.loaded(city):
+            return self._assign(item)
+        waiters = self._loading.get(city)
+        if waiters is None:
+            waiters = self._loading[city] = []
+            threads.deferToThread(self._load, city).addBoth(self._loaded, city)
+        waiter = defer.Deferred()
+        waiters.append(waiter)
+        return waiter.addCallback(lambda _: self._assign(item))
+
+
+class FileSinkPipeline:
+    """
+    `SCRAPER_SINK=file`: items naar geroteerde, gecomprimeerde bestanden
+    (utils/sink.py) in plaats van Mongo; `load_sink.py` laadt ze later met
+    dezelfde upsert-regels. Werkt zonder MONGODB_URI. Instelbaar via
+    SCRAPER_SINK_DIR, SCRAPER_SINK_FORMAT (jsonl/parquet),
+    SCRAPER_SINK_ROTATE_ITEMS en SCRAPER_SINK_ROTATE_MB.
+    """
+
+    def open_spider(self, spider):
+        self.spider = spider
+        self.stats = spider.crawler.stats if getattr(spider, 'crawler', None) else None
+        self.writers: Dict[str, SinkWriter] = {}
 
-        # Sanity clamps to avoid bad parses crashing Mongo writes
-        try:
-            if isinstance(item.get('size'), (int, float)):
-                if item['size'] <= 0 or item['size'] > 1000:
-                    item['size'] = None
-        except Exception:
-            item['size'] = None
-        try:
-            if isinstance(item.get('rooms'), (int, float)):
-                if item['rooms'] < 0 or item['rooms'] > 50:
-                    item['rooms'] = None
-        except Exception:
-            item['rooms'] = None
-        try:
-            if isinstance(item.get('price'), (int, float)):
-                if item['price'] <= 0 or item['price'] > 10_000_000:
-                    item['price'] = None
-        except Exception:
-            item['price'] = None
-
-        # Upsert per source + sourceId
-        q = {"source": item["source"], "sourceId": item["sourceId"]}
+    def _writer(self, source: str) -> SinkWriter:
+        writer = self.writers.get(source)
+        if writer is None:
+            writer = self.writers[source] = SinkWriter(
+                source,
+                fmt=os.getenv("SCRAPER_SINK_FORMAT", "jsonl"),
+                rotate_items=int(os.getenv("SCRAPER_SINK_ROTATE_ITEMS", "50000")),
+                rotate_bytes=int(float(os.getenv("SCRAPER_SINK_ROTATE_MB", "64")) * 1024 * 1024),
+                row_group=int(os.getenv("SCRAPER_SINK_ROW_GROUP", "5000")),
+            )
+        return writer
+
+    def close_spider(self, spider):
+        files = 0
+        for writer in self.writers.values():
+            writer.close()
+            files += len(writer.files)
+            if self.stats is not None:
+                self.stats.inc_value("sink/bytes", writer.bytes)
+            spider.logger.info(f"[FileSinkPipeline] {writer.items} items in {len(writer.files)} bestand(en) onder {writer.directory}")
+        if self.stats is not None:
+            self.stats.set_value("sink/files", files)
+
+    def process_item(self, item: Dict[str, Any], spider):
+        now = dt.datetime.utcnow()
+        if item.get("_touch"):
+            record = {"source": item["source"], "sourceId": item["sourceId"], "sourceUrl": item.get("sourceUrl"),
+                      "_touch": True, "_checkedAt": now}
+        else:
+            item.setdefault("scrapedAt", now)
+            item.setdefault("isStillAvailable", True)
+            clamp_item(item)
+            # Tijd van de crawl; de loader gebruikt hem als lastCheckedAt
+            record = {**item, "_checkedAt": now}
+        self._writer(item["source"]).write(record)
+        if self.stats is not None:
+            self.stats.inc_value("sink/touched" if item.get("_touch") else "sink/items")
+        metrics = getattr(spider, 'metrics', None)
+        if metrics is not None:
+            # Nieuw of gewijzigd is pas bij het laden bekend
+            metrics.observe_stored("touched" if item.get("_touch") else "sink")
+        return item
+
+
+class LivenessPipeline:
+    """
+    Uitkomsten van de LivenessSpider in batches terugschrijven (zelfde
+    BulkWriter als MongoPipeline). `live` zet alleen `lastProbedAt`;
+    `lastCheckedAt` blijft van de crawl, want de inhoud is niet gecontroleerd.
+    `gone` en `redirected` maken de listing onbeschikbaar.
+    """
+
+    def open_spider(self, spider):
+        self.client = get_client()
+        db = get_database(self.client)
+        self.props = db.get_collection(properties_collection_name())
+        self.spider = spider
+        self.stats = spider.crawler.stats
+        self.counts: Dict[str, int] = {}
+        return threads.deferToThread(open_outbox, db).addCallback(self._start_writer)
+
+    def _start_writer(self, outbox):
+        self.outbox = outbox
+        self.writer = BulkWriter(
+            self.props,
+            batch_size=int(os.getenv("SCRAPER_BULK_SIZE", "500")),
+            flush_interval=float(os.getenv("SCRAPER_BULK_INTERVAL", "2.0")),
+            max_pending=int(os.getenv("SCRAPER_BULK_MAX_PENDING", "2")),
+            on_result=self._on_written,
+            on_error=self._on_write_error,
+            prepare=self._prepare if self.outbox is not None else None,
+            after_write=self._emit_events if self.outbox is not None else None,
+        )
+        self.writer.start()
+
+    def close_spider(self, spider):
+        d = self.writer.close()
+
+        def _close_client(_):
+            spider.logger.info("[LivenessPipeline] " + " ".join(f"{k}={v}" for k, v in sorted(self.counts.items())))
+            try:
+                self.client.close()
+            except Exception:
+                pass
+
+        d.addBoth(_close_client)
+        return d
+
+    def _on_written(self, entries, upserted):
+        for entry in entries:
+            status = entry.item['status']
+            self.stats.inc_value(f"liveness/{status}")
+            self.counts[status] = self.counts.get(status, 0) + 1
+
+    def _on_write_error(self, entry, err):
+        self.stats.inc_value("liveness/write_errors")
+        item = entry.item if entry else None
+        ref = f"{item.get('source')}:{item.get('sourceId')}" if item else '?'
+        self.spider.logger.error(f"[LivenessPipeline] write mislukt voor {ref}: {err.get('errmsg')}")
+
+    def _prepare(self, entries):
+        # Alleen listings die nu nog beschikbaar zijn krijgen een delisted event
+        gone = [e.item for e in entries if e.item['status'] in ("gone", "redirected")]
+        available = set()
+        by_source: Dict[str, list] = {}
+        for item in gone:
+            by_source.setdefault(item["source"], []).append(item["sourceId"])
+        for source, ids in by_source.items():
+            for doc in self.props.find({"source": source, "sourceId": {"$in": ids}, "isStillAvailable": {"$ne": False}},
+                                       {"_id": 0, "sourceId": 1}):
+                available.add((source, doc["sourceId"]))
+        for e in entries:
+            key = (e.item["source"], e.item["sourceId"])
+            e.event = delisted_event(key[0], key[1], f"liveness:{e.item['status']}") if key in available else None
+        return [e.op for e in entries]
+
+    def _emit_events(self, entries, failed, upserted):
+        n = self.outbox.append(e.event for i, e in enumerate(entries) if i not in failed and e.event)
+        if n:
+            self.stats.inc_value("outbox/events", n)
+
+    def process_item(self, item: Dict[str, Any], spider):
+        now = dt.datetime.utcnow()
+        entry = _Pending(item, now, liveness_update(item, now))
+        wait = self.writer.add((item["source"], item["sourceId"]), entry.op, entry)
+        return wait.addCallback(lambda _: item) if wait is not None else item
+
+
+def liveness_update(item: Dict[str, Any], now: dt.datetime) -> UpdateOne:
+    q = {"source": item["source"], "sourceId": item["sourceId"]}
+    status = item["status"]
+    u = {"lastProbedAt": now, "probeStatus": status, "probeHttpStatus": item.get("httpStatus")}
+    if status in ("gone", "redirected"):
+        q["isStillAvailable"] = {"$ne": False}
+        u.update({"isStillAvailable": False, "unavailableAt": now})
+    elif status == "live":
+        u["missedRuns"] = 0
+    return UpdateOne(q, {"$set": u})
+
+
+class _Pending:
+    __slots__ = ("item", "now", "kind", "op", "event")
+
+    def __init__(self, item, now, op=None, kind=None):
+        self.item = item
+        self.now = now
+        # Vooraf gebouwde write (bijv. touch); anders bouwt _prepare hem
+        self.op = op
+        self.kind = kind
+        # Outbox event, gezet in _prepare
+        self.event = None
+
+
+def settle_new(entries, upserted):
+    """
+    "new" komt uit de find vóór de write; met twee batches tegelijk kan een
+    andere batch de listing intussen ingevoegd hebben. Alleen een write die
+    echt een document invoegde (`upserted`) telt als nieuw en geeft een new
+    event; de andere was een update (volledige $set) en krijgt geen event.
+    """
+    for i, e in enumerate(entries):
+        if e is not None and e.kind == "new" and i not in upserted:
+            e.kind = "changed"
+            e.event = None
+
+
+def fetch_existing(collection, items) -> Dict[tuple, Dict[str, Any]]:
+    """Opgeslagen documenten voor build_upsert, één find per source: {(source, sourceId): doc}."""
+    by_source: Dict[str, list] = {}
+    for item in items:
+        by_source.setdefault(item["source"], []).append(item["sourceId"])
+    existing = {}
+    projection = {"_id": 0, "sourceId": 1, "contentHash": 1, "address": 1, "isStillAvailable": 1, "missedRuns": 1,
+                  **{f: 1 for f in CONTENT_FIELDS + DEDUP_FIELDS if not f.startswith("address.")}}
+    for source, ids in by_source.items():
+        for doc in collection.find({"source": source, "sourceId": {"$in": ids}}, projection):
+            existing[(source, doc.get("sourceId"))] = doc
+    return existing
+
+
+def clamp_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Sanity clamps to avoid bad parses crashing Mongo writes"""
+    try:
+        if isinstance(item.get('size'), (int, float)):
+            if item['size'] <= 0 or item['size'] > 1000:
+                item['size'] = None
+    except Exception:
+        item['size'] = None
+    try:
+        if isinstance(item.get('rooms'), (int, float)):
+            if item['rooms'] < 0 or item['rooms'] > 50:
+                item['rooms'] = None
+    except Exception:
+        item['rooms'] = None
+    try:
+        if isinstance(item.get('price'), (int, float)):
+            if item['price'] <= 0 or item['price'] > 10_000_000:
+                item['price'] = None
+    except Exception:
+        item['price'] = None
+    return item
+
+
+def build_upsert(item: Dict[str, Any], doc: Optional[Dict[str, Any]], now: dt.datetime):
+    """
+    Bouwt de write voor één item op basis van het opgeslagen document.
+    Geeft (UpdateOne, kind) terug met kind in new/changed/unchanged:
+    - new: volledige upsert zoals voorheen
+    - unchanged (zelfde contentHash): alleen lastCheckedAt bijwerken
+    - changed: alleen gewijzigde velden + contentHash, scrapedAt en lastCheckedAt
+    """
+    q = {"source": item["source"], "sourceId": item["sourceId"]}
+    h = content_hash(item)
+    if doc is None:
         u = {
             "$set": {
                 **item,
+                "contentHash": h,
                 "lastCheckedAt": now,
                 "approvalStatus": item.get("approvalStatus", "approved"),
             },
@@ -73,9 +489,29 @@ class MongoPipeline:
                 "createdAt": now,
             },
         }
+        return UpdateOne(q, u, upsert=True), "new"
 
-        res = self.props.update_one(q, u, upsert=True)
-        if self.verbose:
-            action = 'inserted' if res.upserted_id else 'updated'
-            print(f"[MongoPipeline] {action} {item.get('source')}:{item.get('sourceId')} €{item.get('price')} {item.get('address',{}).get('city')}")
-        return item
+    # Weer online na de availability sweep (utils/availability.py)
+    relisted = {"isStillAvailable": True, "missedRuns": 0} \
+        if doc.get("isStillAvailable") is False or doc.get("missedRuns") else {}
+    # Dedup velden (DedupPipeline) tellen niet mee in de contentHash maar worden wel bijgewerkt
+    dedup = {f: item[f] for f in DEDUP_FIELDS if f in item and item[f] != doc.get(f)}
+    if doc.get("contentHash") == h:
+        return UpdateOne(q, {"$set": {"lastCheckedAt": now, **relisted, **dedup}}), "unchanged"
+
+    changes = changed_fields(item, doc)
+    if not changes:
+        # Oud document zonder (of met verouderde) fingerprint, inhoud gelijk
+        return UpdateOne(q, {"$set": {"contentHash": h, "lastCheckedAt": now, **relisted, **dedup}}), "unchanged"
+    u = {
+        "$set": {
+            **changes,
+            **dedup,
+            "contentHash": h,
+            "scrapedAt": item.get("scrapedAt") or now,
+            "lastCheckedAt": now,
+            "isStillAvailable": item.get("isStillAvailable", True),
+            **({"missedRuns": 0} if relisted else {}),
+        },
+    }
+    return UpdateOne(q, u, upsert=True), "changed"
@@ -0,0 +1,295 @@
+"""
+Gecompileerde extractieplannen per source (config/sources/<naam>.json).
+
+Een plan wordt één keer per proces gebouwd (en opnieuw als het bestand
+wijzigt) en is daarna immutable: selectors, keyword-sets, regexes, het
+href-filter en de sourceId-strategie liggen vast, zodat de spider per
+response geen dicts meer hoeft te lezen of regexes hoeft op te zoeken.
+"""
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from itertools import chain
+from types import MappingProxyType
+from typing import Callable, FrozenSet, Iterator, Mapping, Optional, Pattern, Tuple
+from urllib.parse import urlparse
+
+from rentbird_scraper.spiders.base import HEX8_RE, TRAILING_DIGITS_RE, source_id_from_url
+from rentbird_scraper.utils.html import css_xpath
+from rentbird_scraper.utils.normalize import parse_price, parse_size, parse_rooms
+from rentbird_scraper.utils.structured import StructuredPlan, compile_structured, extract as structured_values
+
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config')
+
+OFFERED_SINCE_RE = re.compile(r"Aangeboden\s+sinds\s+(\d{2}-\d{2}-\d{4})", re.IGNORECASE)
+
+# Default heuristic zonder hrefPattern: must contain '-te-huur' or '/huren/' and must NOT be makelaars/info/etc
+DEFAULT_EXCLUDED_SEGMENTS = ('/makelaars', '/info', '/registreren', '/over')
+
+
+def furnished_from_text(text: Optional[str], keywords: FrozenSet[str]) -> Optional[bool]:
+    """Heuristiek met `furnishedKeywords`: noemt de tekst er één, dan telt 'gemeubileerd'."""
+    if not text or not keywords:
+        return None
+    lowered = text.lower()
+    if any(k in lowered for k in keywords):
+        return 'gemeubileerd' in lowered
+    return None
+
+
+def offered_since_from_text(text: str) -> Optional[str]:
+    """`Aangeboden sinds dd-mm-yyyy` -> `YYYY-MM-DDT00:00:00Z`."""
+    m = OFFERED_SINCE_RE.search(text)
+    if not m:
+        return None
+    d, mth, y = m.group(1).split('-')
+    return f"{y}-{mth}-{d}T00:00:00Z"
+
+
+def _id_last_segment(url: str) -> Optional[str]:
+    segs = [s for s in urlparse(url).path.split('/') if s]
+    return segs[-1] if segs else None
+
+
+def _id_hex_segment(url: str) -> Optional[str]:
+    for s in urlparse(url).path.split('/'):
+        if HEX8_RE.fullmatch(s):
+            return s
+    return None
+
+
+def _id_trailing_digits(url: str) -> Optional[str]:
+    m = TRAILING_DIGITS_RE.search(urlparse(url).path)
+    return m.group(1) if m else None
+
+
+# 'slug-last-segment' (pararius.json) werd nooit apart uitgevoerd; het blijft een alias
+# van 'auto' zodat bestaande sourceIds in Mongo stabiel blijven.
+SOURCE_ID_STRATEGIES = {
+    'auto': source_id_from_url,
+    'slug-last-segment': source_id_from_url,
+    'hex-segment': _id_hex_segment,
+    'trailing-digits': _id_trailing_digits,
+    'last-segment': _id_last_segment,
+}
+
+
+@dataclass(frozen=True)
+class ListPlan:
+    item_link: str
+    next: Optional[str]
+
+
+@dataclass(frozen=True)
+class DetailPlan:
+    title: str
+    price_text: bool
+    size_text: str
+    images: str
+    furnished_keywords: FrozenSet[str]
+    # Stad van de detailpagina (discovery mode: geen stad uit de start URL)
+    city: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class ExtractionPlan:
+    source: str
+    start_url_templates: Tuple[str, ...]
+    list: ListPlan
+    detail: DetailPlan
+    href_re: Optional[Pattern]
+    id_strategy: str
+    parser: Optional[str]
+    config: Mapping
+    structured: Optional[StructuredPlan] = None
+
+    def allows_path(self, path: str) -> bool:
+        """Filter to true listing detail pages only"""
+        if self.href_re is not None:
+            return self.href_re.search(path) is not None
+        return ((('-te-huur' in path) or ('/huren/' in path))
+                and all(seg not in path for seg in DEFAULT_EXCLUDED_SEGMENTS))
+
+    def source_id(self, url: str) -> Optional[str]:
+        if self.id_strategy == 'href-pattern' and self.href_re is not None:
+            # Eerste capture group van hrefPattern, anders de standaardregels
+            m = self.href_re.search(urlparse(url).path)
+            if m and m.groups() and m.group(1):
+                return m.group(1)
+            return source_id_from_url(url)
+        return SOURCE_ID_STRATEGIES.get(self.id_strategy, source_id_from_url)(url)
+
+    def listing_urls(self, page, urljoin: Callable[[str], str]) -> Iterator[str]:
+        """Absolute detail-URLs op een lijstpagina (gefilterd, per pagina ontdubbeld)."""
+        seen = set()
+        anchors = page.select(self.list.item_link)
+        # Fallback: collect all anchors if few/no matches (zonder de lijsten te kopiëren)
+        if len(anchors) < 3:
+            anchors = chain(anchors, page.select('a'))
+        for a in anchors:
+            href = a.get('href')
+            if not href:
+                continue
+            full = urljoin(href)
+            if full in seen:
+                continue
+            if not self.allows_path(urlparse(full).path):
+                continue
+            seen.add(full)
+            yield full
+
+    def extract_structured(self, text: str, url: str, city: Optional[str]) -> Optional[dict]:
+        """Fast path via `structuredData` (utils/structured.py); None = selectors gebruiken."""
+        if self.structured is None:
+            return None
+        values = structured_values(self.structured, text)
+        if values is None:
+            return None
+        # Zelfde normalisatie als extract_detail; ontbreekt het veld, dan de heuristiek op de ruwe pagina
+        furnished = values.get('furnished')
+        if not isinstance(furnished, bool):
+            furnished = furnished_from_text(furnished or text, self.detail.furnished_keywords)
+        return {
+            'source': self.source,
+            'sourceId': self.source_id(url),
+            'title': values.get('title') or 'Woning',
+            'sourceUrl': url,
+            'address': {
+                'city': city or values.get('city'),
+                'street': values.get('street')
+            },
+            'price': values.get('price'),
+            'size': values.get('size'),
+            'rooms': values.get('rooms'),
+            'furnished': furnished,
+            'images': values.get('images') or [],
+            'offeredSince': values.get('offeredSince') or offered_since_from_text(text)
+        }
+
+    def extract_detail(self, page, url: str, city: Optional[str]) -> dict:
+        det = self.detail
+        title_el = page.select_one(det.title)
+        title = title_el.get_text(strip=True) if title_el else 'Woning'
+
+        price_text = None
+        if det.price_text:
+            # find first element containing €
+            price_text = page.first_text_containing('€')
+
+        size_text = None
+        rooms_text = None
+        for li in page.select(det.size_text):
+            txt = li.get_text(' ', strip=True)
+            if 'm²' in txt and not size_text:
+                size_text = txt
+            if 'kamer' in txt and not rooms_text:
+                rooms_text = txt
+            if size_text and rooms_text:
+                break
+
+        text = page.text()
+        furnished = furnished_from_text(text, det.furnished_keywords)
+
+        if not city and det.city:
+            city_el = page.select_one(det.city)
+            city = (city_el.get_text(' ', strip=True) if city_el else None) or None
+
+        images = []
+        for img in page.select(det.images):
+            src = img.get('src') or img.get('data-src')
+            if src and src.startswith('http'):
+                images.append(src)
+                if len(images) >= 12:
+                    break
+
+        # offeredSince (Aangeboden sinds dd-mm-yyyy)
+        offered_since = offered_since_from_text(text)
+
+        return {
+            'source': self.source,
+            'sourceId': self.source_id(url),
+            'title': title,
+            'sourceUrl': url,
+            'address': {
+                'city': city,
+                'street': None
+            },
+            'price': parse_price(price_text),
+            'size': parse_size(size_text),
+            'rooms': parse_rooms(rooms_text),
+            'furnished': furnished,
+            'images': images,
+            'offeredSince': offered_since
+        }
+
+
+def freeze(value):
+    """Read-only kopie van een JSON-waarde: dicts -> MappingProxyType, lijsten -> tuple (recursief)."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def compile_plan(source: str, cfg: dict) -> ExtractionPlan:
+    templates = cfg.get('startUrlTemplates')
+    if not isinstance(templates, list):
+        templates = [cfg['startUrlTemplate']] if 'startUrlTemplate' in cfg else []
+    lst = cfg.get('list') or {}
+    det = cfg.get('detail') or {}
+    plan = ExtractionPlan(
+        source=source,
+        start_url_templates=tuple(templates),
+        list=ListPlan(item_link=lst.get('itemLink', 'a'), next=lst.get('next')),
+        detail=DetailPlan(
+            title=det.get('title', 'h1'),
+            price_text=bool(det.get('priceText')),
+            size_text=det.get('sizeText', 'li'),
+            images=det.get('images', 'img'),
+            furnished_keywords=frozenset(k.lower() for k in det.get('furnishedKeywords', [])),
+            city=det.get('city'),
+        ),
+        href_re=re.compile(cfg['hrefPattern']) if cfg.get('hrefPattern') else None,
+        id_strategy=cfg.get('idFromUrl', 'auto'),
+        parser=cfg.get('parser'),
+        # Gedeeld tussen spiders: ook geneste selectors/lijsten niet wijzigbaar
+        config=freeze(cfg),
+        structured=compile_structured(source, cfg.get('structuredData')),
+    )
+    if plan.id_strategy not in SOURCE_ID_STRATEGIES and plan.id_strategy != 'href-pattern':
+        raise ValueError(f"[{source}] onbekende idFromUrl strategie: {plan.id_strategy}")
+    # Selectors alvast naar XPath compileren (gedeelde cache, gebruikt door de lxml backend)
+    for css in (plan.list.item_link, plan.list.next, plan.detail.title, plan.detail.size_text, plan.detail.images,
+                plan.detail.city):
+        if css:
+            css_xpath(css)
+    return plan
+
+
+_plans = {}
+_lock = threading.Lock()
+
+
+def config_path(source: str) -> str:
+    return os.path.join(CONFIG_DIR, 'sources', f"{source}.json")
+
+
+def load_plan(source: str) -> ExtractionPlan:
+    """Gecachet per proces; wordt opnieuw gebouwd als het configbestand gewijzigd is."""
+    path = config_path(source)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _plans.get(source)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with _lock:
+        cached = _plans.get(source)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'r') as f:
+            plan = compile_plan(source, json.load(f))
+        _plans[source] = (mtime, plan)
+        return plan
@@ -0,0 +1,101 @@
+"""
+Record/replay van een run (zie utils/archive.py).
+
+  python run_sources.py --sources pararius --record .archive/pararius
+  python run_sources.py --sources pararius --replay .archive/pararius --items items.jsonl
+
+Opnemen: ArchiveRecorderMiddleware (middlewares.py) schrijft elke response
+ruw weg, conditional requests staan uit zodat er volledige pagina's in het
+archief komen. Afspelen: ArchiveDownloadHandler vervangt de http(s) handler,
+zonder netwerk, delays, AutoThrottle, backoff of robots.txt; state
+(validators, run state, metrics) gaat naar `<archief>/state`, zodat een
+replay de echte state niet verandert. Een request die niet in het archief
+staat krijgt een 404 (`archive/miss`).
+
+Elke replay begint schoon (`reset_replay`): lege state dir en replay
+collectie, `--mode auto` wordt `full` en de known-listing index staat uit.
+Zo geven twee replays van hetzelfde archief dezelfde items.
+"""
+import os
+import shutil
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.settings import Settings
+from twisted.internet import defer
+
+from rentbird_scraper.utils.archive import ResponseArchive, request_key
+
+
+HANDLER = 'rentbird_scraper.replay.ArchiveDownloadHandler'
+
+
+def record_settings(settings: Settings, path: str) -> Settings:
+    settings.set('ARCHIVE_RECORD_DIR', os.path.abspath(path), priority='cmdline')
+    settings.set('REVALIDATE_ENABLED', False, priority='cmdline')
+    return settings
+
+
+def replay_settings(settings: Settings, path: str) -> Settings:
+    """Na source_settings/scale_for_shards toepassen: replay draait zo snel als de parser toelaat."""
+    settings.set('ARCHIVE_REPLAY_DIR', os.path.abspath(path), priority='cmdline')
+    settings.set('DOWNLOAD_HANDLERS', {'http': HANDLER, 'https': HANDLER}, priority='cmdline')
+    for name, value in (
+        ('DOWNLOAD_DELAY', 0),
+        ('RANDOMIZE_DOWNLOAD_DELAY', False),
+        ('AUTOTHROTTLE_ENABLED', False),
+        ('BACKOFF_ENABLED', False),
+        ('RETRY_ENABLED', False),
+        ('REVALIDATE_ENABLED', False),
+        ('ROBOTSTXT_OBEY', False),
+        ('CONCURRENT_REQUESTS', 64),
+        ('CONCURRENT_REQUESTS_PER_DOMAIN', 64),
+    ):
+        settings.set(name, value, priority='cmdline')
+    return settings
+
+
+def replay_state_dir(path: str) -> str:
+    return os.path.join(os.path.abspath(path), 'state')
+
+
+def reset_replay(path: str, collection: str):
+    """State en collectie van een vorige replay weggooien (vóór de crawl, ook vóór de shards)."""
+    shutil.rmtree(replay_state_dir(path), ignore_errors=True)
+    if os.getenv('SCRAPER_SINK', 'mongo') == 'file' or not os.getenv('MONGODB_URI'):
+        return
+    from rentbird_scraper.utils.mongo import get_client, get_database
+    if collection == 'properties':
+        raise SystemExit("--replay-collection mag niet 'properties' zijn (wordt bij elke replay geleegd)")
+    client = get_client()
+    try:
+        get_database(client).drop_collection(collection)
+    finally:
+        client.close()
+
+
+class ArchiveDownloadHandler:
+    lazy = False
+
+    def __init__(self, archive: ResponseArchive, stats):
+        self.archive = archive
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(ResponseArchive(crawler.settings['ARCHIVE_REPLAY_DIR']), crawler.stats)
+
+    def download_request(self, request, spider):
+        recorded = self.archive.get(request_key(request.method, request.url, request.body))
+        if recorded is None:
+            self.stats.inc_value('archive/miss')
+            return defer.succeed(responsetypes.from_args(url=request.url)(
+                url=request.url, status=404, request=request, flags=['archive-miss']))
+        self.stats.inc_value('archive/served')
+        headers = Headers({name: values for name, values in recorded.headers})
+        respcls = responsetypes.from_args(headers=headers, url=request.url, body=recorded.body)
+        return defer.succeed(respcls(url=request.url, status=recorded.status, headers=headers,
+                                     body=recorded.body, request=request, flags=['archive']))
+
+    def close(self):
+        self.archive.close()
@@ -10,8 +10,55 @@ NEWSPIDER_MODULE = "rentbird_scraper.spiders"
 ROBOTSTXT_OBEY = os.getenv("SCRAPER_OBEY", "1") == "1"
 DOWNLOAD_DELAY = float(os.getenv("SCRAPER_DELAY", "0.75"))  # ~1 req/sec
 CONCURRENT_REQUESTS = int(os.getenv("SCRAPER_CONCURRENCY", "8"))
+CONCURRENT_REQUESTS_PER_DOMAIN = int(os.getenv("SCRAPER_CONCURRENCY_PER_DOMAIN", "8"))
 RANDOMIZE_DOWNLOAD_DELAY = True
 
+# Per source te overschrijven via het `throughput` blok in config/sources/<naam>.json
+# (zie rentbird_scraper/throughput.py); AutoThrottle staat aan zodra een source
+# `targetConcurrency` opgeeft.
+AUTOTHROTTLE_ENABLED = os.getenv("SCRAPER_AUTOTHROTTLE", "0") == "1"
+AUTOTHROTTLE_MAX_DELAY = 30.0
+
+# Backoff bij 429/503 en netwerkfouten; budget 0 = nooit stoppen
+BACKOFF_BUDGET = int(os.getenv("SCRAPER_BACKOFF_BUDGET", "0"))
+BACKOFF_MAX_DELAY = 60.0
+BACKOFF_HTTP_CODES = [429, 503]
+
+DOWNLOADER_MIDDLEWARES = {
+    "rentbird_scraper.middlewares.BudgetMiddleware": 100,
+    "rentbird_scraper.middlewares.BackoffMiddleware": 560,
+    # Vóór HttpCompressionMiddleware (590), zodat de opgeslagen body al gedecomprimeerd is
+    "rentbird_scraper.middlewares.RevalidationMiddleware": 580,
+    # Alleen met run_sources.py --record: ruwe responses, vóór redirects/retries/decompressie
+    "rentbird_scraper.middlewares.ArchiveRecorderMiddleware": 950,
+}
+
+# Conditional requests (ETag / Last-Modified) met een lokale sqlite store (scraper/.state/validators.sqlite)
+REVALIDATE_ENABLED = os.getenv("SCRAPER_REVALIDATE", "1") == "1"
+REVALIDATE_DB = os.getenv("SCRAPER_VALIDATOR_DB")
+REVALIDATE_MAX_ENTRIES = int(os.getenv("SCRAPER_VALIDATOR_MAX", "50000"))
+
+# max_items / max_per_city: gereserveerde detail requests en items bijhouden
+SPIDER_MIDDLEWARES = {
+    "rentbird_scraper.middlewares.BudgetMiddleware": 100,
+    # Zo dicht mogelijk bij de spider: meet alleen de callback zelf
+    "rentbird_scraper.middlewares.ParseTimingMiddleware": 950,
+}
+
+# Metingen per stage -> <METRICS_DIR>/<source>.prom (Prometheus textfile) en <source>.json
+EXTENSIONS = {
+    "rentbird_scraper.extensions.CrawlMetrics": 500,
+    "rentbird_scraper.extensions.MemoryProfile": 510,
+}
+METRICS_ENABLED = os.getenv("SCRAPER_METRICS", "1") == "1"
+METRICS_DIR = os.getenv("SCRAPER_METRICS_DIR")  # standaard scraper/.state/metrics
+
+# Opt-in: tracemalloc per callback en RSS samples -> <METRICS_DIR>/<source>.memory.json (extensions.MemoryProfile)
+MEMPROFILE_ENABLED = os.getenv("SCRAPER_MEMPROFILE", "0") == "1"
+MEMPROFILE_EVERY = int(os.getenv("SCRAPER_MEMPROFILE_EVERY", "100"))  # snapshot bij elke N-de response per callback
+MEMPROFILE_FRAMES = int(os.getenv("SCRAPER_MEMPROFILE_FRAMES", "1"))
+MEMPROFILE_INTERVAL = float(os.getenv("SCRAPER_MEMPROFILE_INTERVAL", "5"))
+
 DEFAULT_REQUEST_HEADERS = {
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
     "Accept-Language": "nl-NL,nl;q=0.8,en-US;q=0.5,en;q=0.3",
@@ -22,8 +69,13 @@ DEFAULT_REQUEST_HEADERS = {
     ),
 }
 
+# SCRAPER_SINK=file: items naar lokale bestanden (utils/sink.py) in plaats van Mongo; laden met load_sink.py
 ITEM_PIPELINES = {
-    "rentbird_scraper.pipelines.MongoPipeline": 300,
+    "rentbird_scraper.pipelines.FileSinkPipeline" if os.getenv("SCRAPER_SINK", "mongo") == "file"
+    else "rentbird_scraper.pipelines.MongoPipeline": 300,
 }
+# Dedup over sources heen heeft de opgeslagen listings nodig, dus alleen met de Mongo sink
+if os.getenv("SCRAPER_SINK", "mongo") != "file" and os.getenv("SCRAPER_DEDUP", "1") == "1":
+    ITEM_PIPELINES["rentbird_scraper.pipelines.DedupPipeline"] = 250
 
 LOG_LEVEL = os.getenv("SCRAPER_LOG", "INFO")
@@ -0,0 +1,169 @@
+"""
+Verdeling van (source, stad) werk over meerdere processen (`run_sources.py --workers N`).
+
+- Sources met `{city}`/`{citySlug}` in hun start-URL's worden per stad verdeeld;
+  andere sources (bijv. rebogroep, vaste aanbod-URL's) blijven één job.
+- Politeness per domein blijft globaal: draait een source in k shards, dan
+  krijgt elke shard 1/k van de per-domein concurrency en backoff budget (de
+  rest naar de eerste shards, de som blijft gelijk) en k× de delay. Een source
+  met minder per-domein concurrency (of backoff budget) dan shards wordt niet
+  per stad verdeeld.
+- Na afloop worden de Scrapy stats per source samengevoegd.
+"""
+import json
+import math
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from scrapy.settings import Settings
+
+from rentbird_scraper.plans import config_path
+
+
+Job = Tuple[str, Optional[str]]  # (source, stad); stad None = hele source in één job
+
+
+def is_city_sharded(source: str) -> bool:
+    """True als de start-URL's van de source per stad zijn (dus per stad te verdelen)."""
+    try:
+        with open(config_path(source), 'r') as f:
+            cfg = json.load(f)
+    except (OSError, ValueError):
+        return False
+    templates = cfg.get('startUrlTemplates') or [cfg.get('startUrlTemplate') or '']
+    return any('{city' in t for t in templates)
+
+
+def max_shards(settings: Settings) -> int:
+    """Zoveel shards kan een source krijgen met minstens 1 request per domein en 1 backoff per shard."""
+    limit = max(1, settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN'))
+    budget = settings.getint('BACKOFF_BUDGET')
+    return min(limit, budget) if budget else limit
+
+
+def build_jobs(sources: Sequence[str], cities: Sequence[str], workers: int = 1,
+               limits: Optional[Dict[str, int]] = None) -> List[Job]:
+    """`limits`: max_shards per source; een source die niet over alle shards te delen is blijft één job."""
+    jobs: List[Job] = []
+    shards = max(1, min(int(workers), len(cities)))
+    for source in sources:
+        if is_city_sharded(source) and (limits is None or limits.get(source, shards) >= shards):
+            jobs.extend((source, city) for city in cities)
+        else:
+            jobs.append((source, None))
+    return jobs
+
+
+def plan_shards(jobs: Sequence[Job], workers: int) -> List[List[Job]]:
+    """
+    Round-robin per source, zodat de steden van één source over de shards
+    gespreid worden. Elke job zit in precies één shard.
+    """
+    workers = max(1, int(workers))
+    shards: List[List[Job]] = [[] for _ in range(workers)]
+    by_source: Dict[str, List[Job]] = defaultdict(list)
+    for job in jobs:
+        by_source[job[0]].append(job)
+    i = 0
+    for source in sorted(by_source):
+        for job in by_source[source]:
+            shards[i % workers].append(job)
+            i += 1
+    shards = [s for s in shards if s]
+    assert_disjoint(shards)
+    return shards
+
+
+def assert_disjoint(shards: Iterable[Sequence[Job]]):
+    seen = {}
+    for idx, shard in enumerate(shards):
+        for job in shard:
+            if job in seen:
+                raise AssertionError(f"{job} zit in shard {seen[job]} en {idx}")
+            seen[job] = idx
+
+
+def shards_per_source(shards: Sequence[Sequence[Job]]) -> Dict[str, int]:
+    counts: Dict[str, int] = defaultdict(int)
+    for shard in shards:
+        for source in {job[0] for job in shard}:
+            counts[source] += 1
+    return dict(counts)
+
+
+def shard_ranks(shards: Sequence[Sequence[Job]]) -> List[Dict[str, int]]:
+    """Per shard: source -> volgnummer van deze shard onder de shards van die source (0..k-1)."""
+    seen: Dict[str, int] = defaultdict(int)
+    ranks = []
+    for shard in shards:
+        rank = {}
+        for source in sorted({job[0] for job in shard}):
+            rank[source] = seen[source]
+            seen[source] += 1
+        ranks.append(rank)
+    return ranks
+
+
+def split_share(total: int, shards: int, rank: int) -> int:
+    """Deel van shard `rank` (0..shards-1): de rest gaat naar de eerste shards, samen precies `total`."""
+    return total // shards + (1 if rank < total % shards else 0)
+
+
+def scale_for_shards(settings: Settings, shards: int, rank: int = 0) -> Settings:
+    """Per-domein budget van een source delen over `shards` processen; `rank` = welke shard van de source."""
+    if shards <= 1:
+        return settings
+    per_domain = settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN')
+    # build_jobs shardt een source niet over meer processen dan max_shards, dus nooit 0
+    settings.set('CONCURRENT_REQUESTS_PER_DOMAIN', max(1, split_share(per_domain, shards, rank)), priority='spider')
+    delay = settings.getfloat('DOWNLOAD_DELAY')
+    settings.set('DOWNLOAD_DELAY', delay * shards, priority='spider')
+    budget = settings.getint('BACKOFF_BUDGET')
+    if budget:
+        settings.set('BACKOFF_BUDGET', max(1, split_share(budget, shards, rank)), priority='spider')
+    if settings.getbool('AUTOTHROTTLE_ENABLED'):
+        target = settings.getfloat('AUTOTHROTTLE_TARGET_CONCURRENCY')
+        settings.set('AUTOTHROTTLE_TARGET_CONCURRENCY', target / shards, priority='spider')
+        settings.set('AUTOTHROTTLE_START_DELAY', settings.getfloat('AUTOTHROTTLE_START_DELAY') * shards, priority='spider')
+    return settings
+
+
+def split_max(max_items: int, part: int, total: int) -> int:
+    """`--max` naar rato van het aantal steden in deze shard (0 = onbeperkt)."""
+    if not max_items or total <= 0:
+        return max_items
+    return max(1, math.ceil(max_items * part / total))
+
+
+def _merge_value(key: str, a, b):
+    if isinstance(a, datetime) and isinstance(b, datetime):
+        return min(a, b) if key.startswith('start') else max(a, b)
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a or b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        # Elke shard laadt dezelfde index en draait parallel; groottes, maxima en looptijd niet optellen.
+        # Percentielen (latency/*) zijn niet samen te voegen: de slechtste shard als bovengrens
+        if 'max' in key or key.endswith('/size') or key == 'elapsed_time_seconds' \
+                or key.startswith(('latency/', 'freshness/')):
+            return max(a, b)
+        return a + b
+    if a == b:
+        return a
+    parts = str(a).split(',') + [str(b)]
+    return ','.join(sorted(set(parts)))
+
+
+def merge_stats(stats: Iterable[dict]) -> dict:
+    merged: dict = {}
+    for part in stats:
+        for key, value in part.items():
+            merged[key] = value if key not in merged else _merge_value(key, merged[key], value)
+    # Ratio's opnieuw berekenen i.p.v. optellen
+    hits = merged.get('known_index/hit', 0)
+    total = hits + merged.get('known_index/miss_new', 0) + merged.get('known_index/miss_stale', 0)
+    if total:
+        merged['known_index/hit_rate'] = round(hits / total, 3)
+    else:
+        merged.pop('known_index/hit_rate', None)
+    return merged
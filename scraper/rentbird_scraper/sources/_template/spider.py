@@ -1,25 +1,25 @@
 import os
 import json
 import scrapy
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 from ..spiders.base import BaseListingSpider, city_to_slug
+from rentbird_scraper.plans import load_plan
+from rentbird_scraper.utils.html import resolve_backend
 from rentbird_scraper.utils.normalize import parse_price, parse_size, parse_rooms
 
 
 class Spider(scrapy.Spider, BaseListingSpider):
     name = "template"
 
-    def __init__(self, cities: str = None, max_items: int = 0, *args, **kwargs):
+    def __init__(self, cities: str = None, max_items: int = 0, parser: str = None, max_per_city: int = 0,
+                 *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.source = "template"
-        self._yielded = 0
-        self.max_items = int(max_items or 0)
+        self.init_budget(max_items, max_per_city)
 
-        # Load selectors/config from scraper/config/sources/template.json
-        conf_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config', 'sources')
-        with open(os.path.join(conf_dir, f"{self.source}.json"), 'r') as f:
-            self.cfg = json.load(f)
+        # Load selectors/config from scraper/config/sources/template.json (gecachet extractieplan)
+        self.cfg = load_plan(self.source).config
+        self.parser_backend = resolve_backend(self.cfg, parser)
 
         if cities:
             self.cities = [c.strip() for c in cities.split(',') if c.strip()]
@@ -29,41 +29,49 @@ class Spider(scrapy.Spider, BaseListingSpider):
 
     def start_requests(self):
         templates = []
-        if 'startUrlTemplates' in self.cfg and isinstance(self.cfg['startUrlTemplates'], list):
+        if 'startUrlTemplates' in self.cfg and isinstance(self.cfg['startUrlTemplates'], (list, tuple)):
             templates = self.cfg['startUrlTemplates']
         elif 'startUrlTemplate' in self.cfg:
             templates = [self.cfg['startUrlTemplate']]
         for city in self.cities:
             for tpl in templates:
                 url = tpl.replace('{citySlug}', city_to_slug(city)).replace('{city}', city)
-                yield scrapy.Request(url, callback=self.parse_list, meta={'city': city})
+                yield scrapy.Request(url, callback=self.parse_list, errback=self.list_errback, meta={'city': city})
 
     def parse_list(self, response: scrapy.http.Response):
-        soup = BeautifulSoup(response.text, 'html.parser')
+        page = self.page(response)
         sel = self.cfg['list']
-        anchors = list(soup.select(sel['itemLink']))
+        anchors = list(page.select(sel['itemLink']))
         for a in anchors:
+            if self.budget_covered(response.meta['city']):
+                break
             href = a.get('href')
             if not href:
                 continue
             full = response.urljoin(href)
-            yield scrapy.Request(full, callback=self.parse_detail, meta={'city': response.meta['city']})
+            if not self.claim_listing(full, response.meta['city']):
+                continue
+            request = self.detail_request(full, self.parse_detail, {'city': response.meta['city']})
+            if request is not None:
+                yield request
 
         next_sel = sel.get('next')
-        if next_sel:
-            nxt = soup.select_one(next_sel)
+        if next_sel and not self.budget_exhausted(response.meta['city']):
+            nxt = page.select_one(next_sel)
             if nxt and nxt.get('href'):
-                yield scrapy.Request(response.urljoin(nxt['href']), callback=self.parse_list, meta={'city': response.meta['city']})
+                yield scrapy.Request(response.urljoin(nxt['href']), callback=self.parse_list, errback=self.list_errback,
+                                     meta={'city': response.meta['city']})
 
     def parse_detail(self, response: scrapy.http.Response):
-        if self.max_items and self._yielded >= self.max_items:
+        if response.status == 304:
+            yield self.touch_item(response)
             return
-        soup = BeautifulSoup(response.text, 'html.parser')
+        page = self.page(response)
         det = self.cfg['detail']
-        title_el = soup.select_one(det.get('title', 'h1'))
+        title_el = page.select_one(det.get('title', 'h1'))
         title = title_el.get_text(strip=True) if title_el else 'Woning'
 
-        price_text = soup.get_text(' ', strip=True)
+        price_text = page.text()
         size_text = price_text
         rooms_text = price_text
 
@@ -82,6 +90,5 @@ class Spider(scrapy.Spider, BaseListingSpider):
             'images': [],
         }
 
-        self._yielded += 1
         yield item
 
@@ -1,13 +1,17 @@
 import os
 import re
-import json
 import scrapy
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 from ...spiders.base import BaseListingSpider, city_to_slug
+from rentbird_scraper.plans import load_plan
+from rentbird_scraper.utils.html import resolve_backend
 from rentbird_scraper.utils.normalize import parse_price, parse_size, parse_rooms
 
 
+SIZE_RE = re.compile(r"(\d{1,4})\s*(?:m²|m2|m\u00b2)", re.IGNORECASE)
+ROOMS_RE = re.compile(r"(\d{1,2})\s*(?:kamers?|slaapkamers?)", re.IGNORECASE)
+
+
 def normalize_city_from_slug(slug: str) -> str:
     s = (slug or '').strip().lower().replace('-', ' ')
     # Quick special cases
@@ -23,18 +27,34 @@ def normalize_city_from_slug(slug: str) -> str:
     return ' '.join(w.capitalize() for w in s.split())
 
 
+def source_id_from_url(url: str):
+    parsed = urlparse(url)
+    segs = [s for s in parsed.path.split('/') if s]
+    # segs like ["nl", "aanbod", "gen-041666-oudenoord-262-3513ev-utrecht"]
+    source_id = None
+    if len(segs) >= 3:
+        tail = segs[2]
+        parts = tail.split('-')
+        if tail.startswith('gen-') and len(parts) >= 2:
+            source_id = '-'.join(parts[:2])  # e.g., gen-041666 or gen-vgo0026694
+        else:
+            source_id = parts[0]  # e.g., r20204564401003
+    return source_id or parsed.path
+
+
 class Spider(scrapy.Spider, BaseListingSpider):
     name = "rebogroep"
 
-    def __init__(self, cities: str = None, max_items: int = 0, *args, **kwargs):
+    def __init__(self, cities: str = None, max_items: int = 0, crawl_mode: str = 'auto',
+                 parser: str = None, max_per_city: int = 0, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.source = "rebogroep"
-        self._yielded = 0
-        self.max_items = int(max_items or 0)
+        self.requested_mode = crawl_mode
+        self.init_budget(max_items, max_per_city)
 
-        conf_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), 'config', 'sources')
-        with open(os.path.join(conf_dir, f"{self.source}.json"), 'r') as f:
-            self.cfg = json.load(f)
+        self.plan = load_plan(self.source)
+        self.cfg = self.plan.config
+        self.parser_backend = resolve_backend(self.cfg, parser)
 
         # Cities filter
         if cities:
@@ -43,29 +63,40 @@ class Spider(scrapy.Spider, BaseListingSpider):
             # If none provided, allow all (no filtering)
             self.allowed_cities = None
 
-        pat = self.cfg.get('hrefPattern')
-        self.href_re = re.compile(pat) if pat else None
+        self.href_re = self.plan.href_re
 
         # Optional: seed detail URLs via env var (comma-separated) for testing
         seeds = os.getenv('SCRAPER_SEED_URLS')
         self.seed_urls = [u.strip() for u in seeds.split(',')] if seeds else []
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.connect_known_index(crawler)
+        return spider
+
+    def source_id_from_url(self, url: str):
+        return source_id_from_url(url)
+
     def start_requests(self):
+        self.resolve_crawl_mode(self.requested_mode)
         if self.seed_urls:
             for u in self.seed_urls:
                 yield scrapy.Request(u, callback=self.parse_detail)
         else:
-            for url in self.cfg.get('startUrlTemplates', ["https://www.rebogroep.nl/nl/aanbod"]):
-                yield scrapy.Request(url, callback=self.parse_list)
+            for i, url in enumerate(self.cfg.get('startUrlTemplates', ["https://www.rebogroep.nl/nl/aanbod"])):
+                yield scrapy.Request(url, callback=self.parse_list, errback=self.list_errback,
+                                     meta={'chain': f"start|{i}", 'page': 1, 'revalidate': 'body'},
+                                     priority=self.list_priority(None, 1))
 
     def parse_list(self, response: scrapy.http.Response):
-        soup = BeautifulSoup(response.text, 'html.parser')
+        page = self.page(response)
         sel = self.cfg.get('list', {})
         item_sel = sel.get('itemLink', "a[href^='/nl/aanbod/']")
-        anchors = list(soup.select(item_sel))
+        anchors = list(page.select(item_sel))
         # Fallback: scan all anchors if none found
         if len(anchors) == 0:
-            anchors = soup.find_all('a')
+            anchors = page.select('a')
         try:
             self.logger.debug(f"[rebogroep] anchors found: {len(anchors)} on {response.url}")
             for a in anchors[:8]:
@@ -74,7 +105,11 @@ class Spider(scrapy.Spider, BaseListingSpider):
             pass
 
         seen = set()
+        unseen = 0
         for a in anchors:
+            # Stad is pas op de detailpagina bekend; alleen het totaalbudget telt hier
+            if self.budget_covered():
+                break
             href = a.get('href')
             if not href:
                 continue
@@ -90,29 +125,35 @@ class Spider(scrapy.Spider, BaseListingSpider):
                 allow = '/nl/aanbod/' in urlparse(full).path
             if not allow:
                 continue
-            yield scrapy.Request(full, callback=self.parse_detail)
+            source_id = self.source_id_from_url(full)
+            if not self.is_known(source_id):
+                unseen += 1
+            # Beide start-URL's tonen deels dezelfde listings
+            if not self.claim_listing(full):
+                continue
+            if not self.should_fetch_detail(source_id):
+                continue
+            request = self.detail_request(full, self.parse_detail, {}, page=response.meta.get('page', 1))
+            if request is not None:
+                yield request
 
         next_sel = sel.get('next')
-        if next_sel:
-            nxt = soup.select_one(next_sel)
+        if next_sel and not self.budget_exhausted():
+            nxt = page.select_one(next_sel)
             if nxt and nxt.get('href'):
-                yield scrapy.Request(response.urljoin(nxt['href']), callback=self.parse_list)
+                meta = self.next_page_meta(response, unseen)
+                if meta is not None:
+                    yield scrapy.Request(response.urljoin(nxt['href']), callback=self.parse_list,
+                                         errback=self.list_errback, meta=dict(meta, revalidate='body'),
+                                         priority=self.list_priority(None, meta['page']))
 
     def parse_detail(self, response: scrapy.http.Response):
-        if self.max_items and self._yielded >= self.max_items:
+        if response.status == 304:
+            yield self.touch_item(response)
             return
-
         parsed = urlparse(response.url)
         segs = [s for s in parsed.path.split('/') if s]
-        # segs like ["nl", "aanbod", "gen-041666-oudenoord-262-3513ev-utrecht"]
-        source_id = None
-        if len(segs) >= 3:
-            tail = segs[2]
-            parts = tail.split('-')
-            if tail.startswith('gen-') and len(parts) >= 2:
-                source_id = '-'.join(parts[:2])  # e.g., gen-041666 or gen-vgo0026694
-            else:
-                source_id = parts[0]  # e.g., r20204564401003
+        source_id = self.source_id_from_url(response.url)
 
         # City from last slug segment as fallback
         city_slug = None
@@ -124,17 +165,17 @@ class Spider(scrapy.Spider, BaseListingSpider):
         city_name = normalize_city_from_slug(city_slug or '')
 
         # Optional stricter city extraction: scan page text for address city if needed
-        soup = BeautifulSoup(response.text, 'html.parser')
-        title_el = soup.select_one(self.cfg.get('detail', {}).get('title', 'h1'))
+        page = self.page(response)
+        title_el = page.select_one(self.cfg.get('detail', {}).get('title', 'h1'))
         title = title_el.get_text(strip=True) if title_el else 'Woning'
 
         # Price via page text; size/rooms via targeted regex near units/keywords
-        page_text = soup.get_text(' ', strip=True)
+        page_text = page.text()
         price = parse_price(page_text)
 
         size = None
         try:
-            m2 = re.search(r"(\d{1,4})\s*(?:m²|m2|m\u00b2)", page_text, flags=re.IGNORECASE)
+            m2 = SIZE_RE.search(page_text)
             if m2:
                 size = int(m2.group(1))
         except Exception:
@@ -142,7 +183,7 @@ class Spider(scrapy.Spider, BaseListingSpider):
 
         rooms = None
         try:
-            r = re.search(r"(\d{1,2})\s*(?:kamers?|slaapkamers?)", page_text, flags=re.IGNORECASE)
+            r = ROOMS_RE.search(page_text)
             if r:
                 rooms = float(r.group(1))
         except Exception:
@@ -150,7 +191,7 @@ class Spider(scrapy.Spider, BaseListingSpider):
 
         # Images
         images = []
-        for img in soup.select(self.cfg.get('detail', {}).get('images', 'img')):
+        for img in page.select(self.cfg.get('detail', {}).get('images', 'img')):
             src = img.get('src') or img.get('data-src')
             if src and src.startswith('http'):
                 images.append(src)
@@ -162,7 +203,7 @@ class Spider(scrapy.Spider, BaseListingSpider):
 
         item = {
             'source': self.source,
-            'sourceId': source_id or parsed.path,
+            'sourceId': source_id,
             'title': title,
             'sourceUrl': response.url,
             'address': {
@@ -175,5 +216,4 @@ class Spider(scrapy.Spider, BaseListingSpider):
             'images': images[:12],
         }
 
-        self._yielded += 1
         yield item
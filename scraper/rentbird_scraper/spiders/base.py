@@ -1,14 +1,583 @@
+import os
+import re
+import time
 import urllib.parse as urlparse
+from typing import Iterator, Optional
+import scrapy
+from scrapy import signals
+from scrapy.exceptions import IgnoreRequest
+from scrapy.spidermiddlewares.httperror import HttpError
+from twisted.internet import defer, threads
+from twisted.python.failure import Failure
+from rentbird_scraper.utils.availability import ALL_CITIES, city_key
+from rentbird_scraper.utils.budget import BudgetController
+from rentbird_scraper.utils.discovery import SITEMAP, iter_entries
+from rentbird_scraper.utils.freshness import FreshnessModel, cached_demand, city_demand, freshness_enabled
+from rentbird_scraper.utils.frontier import canonical_url, get_frontier
+from rentbird_scraper.utils.html import DEFAULT_BACKEND, page_for
+from rentbird_scraper.utils.known_index import KnownListingIndex
+from rentbird_scraper.utils.state import RunState
+
+
+HEX8_RE = re.compile(r'[a-f0-9]{8}')
+TRAILING_DIGITS_RE = re.compile(r'-(\d{5,})$')
+# Sitemap index -> sitemap -> ... (beveiliging tegen lussen)
+MAX_SITEMAP_DEPTH = 3
 
 
 def city_to_slug(city: str) -> str:
     return urlparse.quote(city.lower().replace(" ", "-"))
 
 
+def source_id_from_url(url: str) -> Optional[str]:
+    """Robust sourceId extraction from URL"""
+    parsed = urlparse.urlparse(url)
+    segs = [s for s in parsed.path.split('/') if s]
+    source_id = None
+    # Prefer an 8-char hex segment (Pararius style)
+    for s in segs:
+        if HEX8_RE.fullmatch(s):
+            source_id = s
+            break
+    # Else try trailing -digits (Kamernet style)
+    if not source_id:
+        m = TRAILING_DIGITS_RE.search(parsed.path)
+        if m:
+            source_id = m.group(1)
+    # Else fallback to second last segment
+    if not source_id and len(segs) >= 1:
+        source_id = segs[-1]
+    return source_id
+
+
 class BaseListingSpider:
     name = "base-listing"
     source = "generic"
+    parser_backend = DEFAULT_BACKEND
 
     def build_start_url(self, template: str, city: str) -> str:
         return template.replace("{city}", city).replace("{citySlug}", city_to_slug(city))
 
+    def page(self, response):
+        """Geparste pagina met de voor deze source gekozen backend (zie utils/html.py)."""
+        return page_for(response, self.parser_backend)
+
+    def source_id_from_url(self, url: str) -> Optional[str]:
+        """Zelfde regels als parse_detail; spiders met een eigen sourceId-schema overschrijven dit."""
+        return source_id_from_url(url)
+
+    # --- Known-listing index: detailpagina's overslaan die recent nog gecheckt zijn ---
+
+    def refresh_seconds(self) -> float:
+        settings = getattr(self, 'settings', None)
+        if settings is not None and settings.get('ARCHIVE_REPLAY_DIR'):
+            # Replay: elke listing uit het archief ophalen, niet afhankelijk van een vorige replay
+            return 0.0
+        cfg = getattr(self, 'cfg', None) or {}
+        minutes = cfg.get('refreshMinutes', os.getenv('SCRAPER_REFRESH_MINUTES', '15'))
+        try:
+            return max(0.0, float(minutes)) * 60
+        except (TypeError, ValueError):
+            return 0.0
+
+    def connect_known_index(self, crawler):
+        """
+        Index laden bij spider_opened; de engine begint pas met start_requests als hij er is.
+        De vraag per stad (freshness) laadt tegelijk, maar daar wacht de crawl niet op.
+        """
+        crawler.signals.connect(self.open_known_index, signal=signals.spider_opened)
+        crawler.signals.connect(self.open_freshness, signal=signals.spider_opened)
+
+    def open_known_index(self, spider=None) -> defer.Deferred:
+        """Laadt de index in een worker thread (grote sources blokkeren de reactor anders seconden lang)."""
+        self.known = KnownListingIndex(self.source)
+        if not os.getenv('MONGODB_URI') or self.refresh_seconds() <= 0:
+            return defer.succeed(self.known)
+        return threads.deferToThread(self._load_known_index).addBoth(self._known_index_loaded)
+
+    def _load_known_index(self):
+        # Worker thread
+        from rentbird_scraper.utils.mongo import get_client, get_database, properties_collection_name
+        client = get_client()
+        try:
+            self.known.load(get_database(client).get_collection(properties_collection_name()))
+        finally:
+            client.close()
+
+    def _known_index_loaded(self, result):
+        if isinstance(result, Failure):
+            self.logger.warning(f"[{self.source}] known-listing index niet geladen: {result.getErrorMessage()}")
+        self._stat_set('known_index/size', len(self.known))
+        return self.known
+
+    def should_fetch_detail(self, source_id: Optional[str]) -> bool:
+        """True als de listing nieuw is of langer dan de refresh-leeftijd niet gecheckt."""
+        known = getattr(self, 'known', None)
+        if known is None or not source_id:
+            return True
+        now = time.time()
+        if known.is_fresh(source_id, self.refresh_seconds(), now):
+            self._stat_inc('known_index/hit')
+            return False
+        self._stat_inc('known_index/miss_stale' if source_id in known else 'known_index/miss_new')
+        # Binnen deze run niet nog een keer ophalen
+        known.mark(source_id, now)
+        return True
+
+    def is_known(self, source_id: Optional[str]) -> bool:
+        known = getattr(self, 'known', None)
+        return bool(known is not None and source_id and source_id in known)
+
+    def is_stored(self, source_id: Optional[str]) -> bool:
+        """Zoals is_known, maar zonder de listings die pas deze run gemarkeerd zijn (dus echt nieuw)."""
+        known = getattr(self, 'known', None)
+        return bool(known is not None and source_id and known.stored(source_id))
+
+    # --- Volgorde: nieuwe listings en eerste pagina's eerst (utils/freshness.py) ---
+
+    def open_freshness(self, spider=None):
+        """Vraag per stad in een worker thread laden (scant `users`); tot dan priority zonder vraag."""
+        demand = cached_demand()
+        if demand is not None or not freshness_enabled():
+            self._set_freshness(demand or {})
+            return
+        self._set_freshness({})
+        threads.deferToThread(city_demand).addCallback(self._set_freshness)
+
+    def _set_freshness(self, demand):
+        model = self.freshness = FreshnessModel(demand, enabled=freshness_enabled())
+        self._stat_set('freshness/demand_cities', len(model.weights))
+
+    def freshness_model(self) -> FreshnessModel:
+        model = getattr(self, 'freshness', None)
+        if model is None:
+            # Spider zonder spider_opened koppeling: alleen de gecachete vraag, nooit Mongo op de reactor
+            model = self.freshness = FreshnessModel(cached_demand() or {}, enabled=freshness_enabled())
+        return model
+
+    def list_priority(self, city: Optional[str] = None, page: Optional[int] = 1) -> int:
+        """Priority voor een lijstpagina of sitemap; diepere pagina's later."""
+        return self.freshness_model().list_priority(city, page)
+
+    # --- Run-brede frontier: elke (source, sourceId) maximaal één keer per run ophalen ---
+
+    def claim_listing(self, url: str, city: Optional[str] = None) -> bool:
+        """False als deze listing deze run al ingepland is (andere pagina, template of URL-variant)."""
+        # sourceId van de canonieke URL, zodat bijv. een trailing slash geen andere key geeft
+        canonical = canonical_url(url)
+        source_id = self.source_id_from_url(canonical)
+        self.saw_listing(source_id, city)
+        if get_frontier(self.source).claim(self.source, source_id, canonical):
+            return True
+        self._stat_inc('frontier/dropped_duplicate')
+        return False
+
+    def detail_url(self, url: str) -> str:
+        """Detail-URL zonder tracking params en fragment; pad en overige query blijven zoals de site ze geeft."""
+        return canonical_url(url, keep_slash=True)
+
+    # --- Beschikbaarheid: welke listings stonden deze run op de lijstpagina's (utils/availability.py) ---
+
+    def _init_seen(self):
+        if not hasattr(self, '_seen_ids'):
+            self._seen_ids, self._seen_cities, self._list_failed = set(), {}, set()
+
+    def saw_listing(self, source_id: Optional[str], city: Optional[str] = None):
+        self._init_seen()
+        if source_id:
+            self._seen_ids.add(source_id)
+            key = city_key(city)
+            self._seen_cities[key] = self._seen_cities.get(key, 0) + 1
+
+    def list_errback(self, failure):
+        """Lijstpagina mislukt: deze stad is niet volledig gezien en doet niet mee aan de sweep."""
+        request = getattr(failure, 'request', None)
+        city = request.meta.get('city') if request is not None else None
+        self._init_seen()
+        self._list_failed.add(city_key(city))
+        self._stat_inc('sweep/list_errors')
+        if failure.check(HttpError):
+            self.logger.warning(f"[{self.source}] lijstpagina {failure.value.response.status}: {getattr(request, 'url', '?')}")
+        elif not failure.check(IgnoreRequest):
+            self.logger.error(f"[{self.source}] lijstpagina mislukt {getattr(request, 'url', '?')}: {failure.getErrorMessage()}")
+
+    def sweep_skip_reason(self, reason: str) -> Optional[str]:
+        """Waarom deze run niet mag archiveren (None = sweep mag)."""
+        if reason != 'finished':
+            return f"finish_reason={reason}"
+        mode = getattr(self, 'crawl_mode', 'full')
+        if mode != 'full':
+            # discovery: alleen gewijzigde sub-sitemaps gelezen, dus geen volledig beeld
+            return mode
+        settings = getattr(self, 'settings', None)
+        if settings is not None and settings.get('ARCHIVE_REPLAY_DIR'):
+            return 'replay'
+        if os.getenv('SCRAPER_SINK', 'mongo') == 'file':
+            # De items van deze run staan nog niet in Mongo
+            return 'file sink'
+        stats = self._stats()
+        values = stats.get_stats() if stats is not None else {}
+        if any(k.startswith('spider_exceptions/') and v for k, v in values.items()):
+            return 'spider_exceptions'
+        budget = getattr(self, 'budget', None)
+        if budget is not None and budget.limited:
+            if budget.exhausted() or any(values.get(k) for k in ('budget/detail_skipped', 'budget/dropped_request',
+                                                                  'budget/dropped_item')):
+                return 'budget'
+        return None
+
+    def availability_sweep(self, reason: str) -> Optional[defer.Deferred]:
+        """Sweep na een volledige crawl; geeft de Deferred van de worker thread terug (None = overgeslagen)."""
+        cfg = (getattr(self, 'cfg', None) or {}).get('availability') or {}
+        if not cfg.get('enabled', os.getenv('SCRAPER_SWEEP', '1') == '1') or not os.getenv('MONGODB_URI'):
+            return
+        skip = self.sweep_skip_reason(reason)
+        if skip is None and not getattr(self, '_seen_ids', None):
+            skip = 'geen lijstpagina'
+        if skip is not None:
+            self._stat_set('sweep/skipped', skip)
+            return
+        budget = getattr(self, 'budget', None)
+        clean = []
+        for key, count in self._seen_cities.items():
+            if count <= 0 or key in self._list_failed:
+                continue
+            # Stad die op zijn budget liep is niet volledig gepagineerd
+            if budget is not None and budget.limited and key != '*' and (budget.exhausted(key) or budget.covered(key)):
+                continue
+            clean.append(key)
+
+        # Zoekt over alle actieve listings van de source en schrijft in bulk: in een worker thread,
+        # anders staan de andere crawlers (multi-source run, daemon) zo lang stil
+        d = threads.deferToThread(self._run_sweep, cfg, clean)
+        d.addCallbacks(self._swept, self._sweep_failed)
+        return d
+
+    def _run_sweep(self, cfg: dict, clean) -> dict:
+        # Worker thread
+        from rentbird_scraper.utils.availability import sweep
+        from rentbird_scraper.utils.mongo import get_client, get_database, properties_collection_name
+        from rentbird_scraper.utils.outbox import open_outbox
+        client = get_client()
+        try:
+            db = get_database(client)
+            return sweep(
+                db.get_collection(properties_collection_name()), self.source, self._seen_ids, clean,
+                misses_required=int(cfg.get('missedRuns', os.getenv('SCRAPER_SWEEP_MISSES', '2'))),
+                max_missing_fraction=float(cfg.get('maxMissingFraction', os.getenv('SCRAPER_SWEEP_MAX_MISSING', '0.5'))),
+                logger=self.logger,
+                outbox=open_outbox(db),
+            )
+        finally:
+            client.close()
+
+    def _swept(self, counts: dict):
+        for k, v in counts.items():
+            self._stat_set(f'sweep/{k}', v)
+        self.logger.info(f"[{self.source}] sweep: {counts.get('cities', 0)} steden, {counts.get('missing', 0)} niet gezien, "
+                         f"{counts.get('marked_unavailable', 0)} niet meer beschikbaar")
+
+    def _sweep_failed(self, failure):
+        self.logger.warning(f"[{self.source}] availability sweep mislukt: {failure.getErrorMessage()}")
+        self._stat_set('sweep/skipped', 'error')
+
+    # --- Item budget (max_items / max_per_city), zie utils/budget.py en BudgetMiddleware ---
+
+    def init_budget(self, max_items: int = 0, max_per_city: int = 0) -> BudgetController:
+        self.max_items = int(max_items or 0)
+        self.max_per_city = int(max_per_city or 0)
+        self.budget = BudgetController(self.max_items, self.max_per_city)
+        return self.budget
+
+    def budget_covered(self, city: Optional[str] = None) -> bool:
+        """True als lopende detail requests het resterende budget al dekken (geen nieuwe meer nodig)."""
+        budget = getattr(self, 'budget', None)
+        return bool(budget is not None and budget.limited and budget.covered(city))
+
+    def budget_exhausted(self, city: Optional[str] = None) -> bool:
+        budget = getattr(self, 'budget', None)
+        return bool(budget is not None and budget.limited and budget.exhausted(city))
+
+    def detail_request(self, url: str, callback, meta: dict, page: Optional[int] = 1,
+                       modified: bool = False) -> Optional[scrapy.Request]:
+        """
+        Detail request met een reservering in het budget, of None als het budget al gedekt is.
+        `page` (lijstpagina waar de listing op stond) en `modified` (sitemap lastmod) bepalen de priority.
+        """
+        source_id = self.source_id_from_url(url)
+        budget = getattr(self, 'budget', None)
+        if budget is not None and budget.limited:
+            if not budget.reserve(meta.get('city')):
+                self._stat_inc('budget/detail_skipped')
+                # should_fetch_detail heeft de listing al gemarkeerd; zonder unmark telt hij als bekend
+                # (incrementele paginering, revalidate) terwijl hij nooit opgehaald is
+                known = getattr(self, 'known', None)
+                if known is not None and source_id:
+                    known.unmark(source_id)
+                return None
+            meta = dict(meta, budget_reserved=True)
+        if self.is_known(source_id):
+            # Alleen bekende listings conditioneel ophalen: een 304 levert een touch item op,
+            # en dat mag nooit de eerste write voor een listing zijn
+            meta = dict(meta, revalidate=True)
+        priority = self.freshness_model().detail_priority(meta.get('city'), page, known=self.is_stored(source_id),
+                                                          modified=modified)
+        return scrapy.Request(self.detail_url(url), callback=callback, meta=meta, errback=self.budget_errback,
+                              priority=priority)
+
+    def touch_item(self, response) -> dict:
+        """Item voor een 304 op een detailpagina: de pipeline zet alleen `lastCheckedAt`."""
+        return {
+            'source': self.source,
+            'sourceId': self.source_id_from_url(response.url),
+            'sourceUrl': response.url,
+            '_touch': True,
+        }
+
+    def budget_errback(self, failure):
+        """Download mislukt, HTTP-fout of gedropt: reservering vrijgeven."""
+        request = getattr(failure, 'request', None)
+        if request is not None and request.meta.get('budget_reserved'):
+            request.meta['budget_reserved'] = False
+            self.budget.release(request.meta.get('city'))
+            self._stat_inc('budget/released')
+        if failure.check(HttpError):
+            self.logger.info(f"[{self.source}] {failure.value.response.status} voor {getattr(request, 'url', '?')}")
+        elif not failure.check(IgnoreRequest):
+            self.logger.error(f"[{self.source}] download mislukt {getattr(request, 'url', '?')}: {failure.getErrorMessage()}")
+
+    # --- Discovery via sitemaps/feeds in plaats van lijstpagina's (utils/discovery.py) ---
+
+    def discovery_config(self) -> dict:
+        return (getattr(self, 'cfg', None) or {}).get('discovery') or {}
+
+    def detail_callback(self):
+        return self.parse_detail
+
+    def discovery_allows(self, url: str) -> bool:
+        """Alleen detailpagina's uit de sitemap; ConfigSpider gebruikt hrefPattern."""
+        return True
+
+    def discovery_city(self, url: str) -> Optional[str]:
+        """Stad uit de URL via `cityPattern` (slug -> naam uit cities_nl.json), anders None: dan bepaalt de detailpagina de stad."""
+        pattern = getattr(self, '_city_re', None)
+        if pattern is None:
+            return None
+        m = pattern.search(urlparse.urlparse(url).path)
+        if not m:
+            return None
+        return (getattr(self, 'city_slugs', None) or {}).get(m.group(1).lower())
+
+    def _discovery_keys(self):
+        """Steden van deze run (city_key), of ['*'] als de run niet op steden filtert."""
+        only = getattr(self, 'discovery_cities', None)
+        return sorted(only) if only and getattr(self, '_city_re', None) is not None else [ALL_CITIES]
+
+    def _full_crawl_keys(self, exclude=()):
+        """Steden van een lijstcrawl (city_key), of ['*'] als de spider geen steden kent."""
+        cities = getattr(self, 'cities', None) or getattr(self, 'allowed_cities', None)
+        keys = {city_key(c) for c in cities} if cities else {ALL_CITIES}
+        return sorted(keys - set(exclude))
+
+    def last_full_crawl(self) -> float:
+        """Oudste volledige lijstcrawl over de steden van deze run (0 = een stad nog nooit)."""
+        last = self.run_state.get('lastFullCrawlAt') or {}
+        if not isinstance(last, dict):
+            # Oude run state: één tijdstip voor de hele source
+            last = {ALL_CITIES: last}
+        full = float(last.get(ALL_CITIES) or 0)
+        return min(max(float(last.get(k) or 0), full) for k in self._full_crawl_keys())
+
+    def discovery_since(self) -> float:
+        last = self.run_state.get('lastDiscoveryAt') or {}
+        if not isinstance(last, dict):
+            return 0.0
+        full = float(last.get(ALL_CITIES) or 0)
+        return min(max(float(last.get(k) or 0), full) for k in self._discovery_keys())
+
+    def discovery_requests(self) -> Iterator[scrapy.Request]:
+        cfg = self.discovery_config()
+        self._city_re = re.compile(cfg['cityPattern']) if cfg.get('cityPattern') else None
+        only = getattr(self, 'discovery_cities', None)
+        if only and self._city_re is None:
+            self.logger.warning(f"[{self.source}] discovery zonder cityPattern: --cities wordt genegeerd")
+        # Sub-sitemaps met een lastmod van vóór de vorige geslaagde discovery run (voor dezelfde steden) overslaan
+        self._discovery_started = time.time()
+        self._discovery_since = self.discovery_since() if cfg.get('skipUnchangedSitemaps', True) else 0.0
+        for url in cfg.get('urls') or []:
+            yield scrapy.Request(url, callback=self.parse_discovery, errback=self.list_errback,
+                                 meta={'discovery_depth': 0}, dont_filter=True, priority=self.list_priority())
+
+    def parse_discovery(self, response: scrapy.http.Response):
+        depth = response.meta.get('discovery_depth', 0)
+        content_type = response.headers.get(b'Content-Type', b'').decode('latin-1')
+        self._stat_inc('discovery/files')
+        try:
+            for entry in iter_entries(response.body, response.url, content_type):
+                if entry.kind == SITEMAP:
+                    if depth >= MAX_SITEMAP_DEPTH:
+                        continue
+                    if entry.lastmod is not None and entry.lastmod < self._discovery_since:
+                        self._stat_inc('discovery/sitemaps_unchanged')
+                        continue
+                    yield scrapy.Request(response.urljoin(entry.loc), callback=self.parse_discovery,
+                                         errback=self.list_errback, meta={'discovery_depth': depth + 1},
+                                         priority=self.list_priority())
+                    continue
+                if self.budget_exhausted():
+                    return
+                request = self.discovered(response.urljoin(entry.loc), entry.lastmod)
+                if request is not None:
+                    yield request
+        except (ValueError, SyntaxError) as e:
+            # lxml XMLSyntaxError is een SyntaxError; json fouten een ValueError
+            self._stat_inc('discovery/parse_errors')
+            self.logger.warning(f"[{self.source}] discovery bestand onleesbaar {response.url}: {e}")
+
+    def discovered(self, url: str, lastmod: Optional[float]) -> Optional[scrapy.Request]:
+        """Detail request voor een URL uit een sitemap/feed, of None (gefilterd, bekend en ongewijzigd, budget)."""
+        self._stat_inc('discovery/urls')
+        if not self.discovery_allows(url):
+            self._stat_inc('discovery/filtered')
+            return None
+        city = self.discovery_city(url)
+        only = getattr(self, 'discovery_cities', None)
+        if only and self._city_re is not None and (city is None or city_key(city) not in only):
+            self._stat_inc('discovery/filtered_city')
+            return None
+        if self.budget_covered(city):
+            return None
+        if not self.claim_listing(url, city):
+            return None
+        source_id = self.source_id_from_url(canonical_url(url))
+        checked = self.known.get(source_id) if source_id else None
+        modified = False
+        if lastmod is not None and checked is not None:
+            # lastmod bepaalt het, niet de refresh-leeftijd
+            if lastmod <= checked:
+                self._stat_inc('discovery/unchanged')
+                return None
+            self._stat_inc('discovery/modified')
+            self.known.mark(source_id)
+            modified = True
+        elif not self.should_fetch_detail(source_id):
+            return None
+        return self.detail_request(url, self.detail_callback(), {'city': city}, modified=modified)
+
+    # --- Incrementele crawl: paginering stoppen na N pagina's zonder nieuwe listings ---
+
+    def resolve_crawl_mode(self, requested: str = 'auto') -> str:
+        """
+        'full', 'incremental' of 'discovery'. Bij 'auto' bepaalt de source config
+        de mode: met `discovery.enabled` sitemaps/feeds (behalve als er volgens
+        `discovery.fullCrawlEveryMinutes` een volledige lijstcrawl nodig is),
+        anders het `incremental` blok: incrementeel, behalve als de laatste
+        volledige crawl langer dan `fullCrawlEveryMinutes` geleden is.
+        """
+        inc = (getattr(self, 'cfg', None) or {}).get('incremental') or {}
+        disc = self.discovery_config()
+        self.run_state = RunState(self.source)
+        self._list_pages = {}
+        last_full = self.last_full_crawl()
+        if requested in ('full', 'incremental'):
+            mode = requested
+        elif requested == 'discovery' or disc.get('enabled'):
+            every = disc.get('fullCrawlEveryMinutes')
+            if not disc.get('urls'):
+                self.logger.warning(f"[{self.source}] geen discovery.urls in de config, volledige crawl")
+                mode = 'full'
+            elif requested == 'auto' and every is not None and time.time() - last_full >= float(every) * 60:
+                mode = 'full'
+            else:
+                mode = 'discovery'
+        elif not inc.get('enabled'):
+            mode = 'full'
+        else:
+            every = float(inc.get('fullCrawlEveryMinutes', 360)) * 60
+            mode = 'full' if time.time() - last_full >= every else 'incremental'
+        self.crawl_mode = mode
+        self.stop_after_known_pages = max(1, int(inc.get('stopAfterKnownPages', 1)))
+        self._stat_set('crawl/mode', mode)
+        return mode
+
+    def next_page_meta(self, response, unseen: int) -> Optional[dict]:
+        """
+        Meta voor de volgende lijstpagina, of None als de paginering in
+        incrementele mode moet stoppen (N opeenvolgende pagina's zonder onbekende listings).
+        """
+        meta = response.meta
+        page = meta.get('page', 1)
+        chain = meta.get('chain')
+        streak = 0 if unseen else meta.get('known_streak', 0) + 1
+        if chain:
+            # Er is een volgende pagina, dus deze keten heeft minstens page + 1 pagina's
+            self._list_pages[chain] = max(self._list_pages.get(chain, 0), page + 1)
+        if getattr(self, 'crawl_mode', 'full') == 'incremental' and streak >= self.stop_after_known_pages:
+            # Schatting van overgeslagen pagina's op basis van de laatste volledige crawl
+            last_pages = (self.run_state.get('listPages') or {}).get(chain, page + 1)
+            self._stat_inc('incremental/pagination_stopped')
+            self._stat_inc('incremental/pages_saved', max(1, last_pages - page))
+            return None
+        return {'city': meta.get('city'), 'chain': chain, 'page': page + 1, 'known_streak': streak}
+
+    def closed(self, reason):
+        state = getattr(self, 'run_state', None)
+        if state is not None and getattr(self, 'crawl_mode', None) == 'full' and reason == 'finished':
+            now = time.time()
+
+            def merge(data):
+                pages = dict(data.get('listPages') or {})
+                pages.update(self._list_pages)
+                data['listPages'] = pages
+                last = data.get('lastFullCrawlAt')
+                last = dict(last) if isinstance(last, dict) else {ALL_CITIES: last} if last else {}
+                # Steden met een mislukte lijstpagina zijn niet volledig gecrawld
+                self._init_seen()
+                last.update({k: now for k in self._full_crawl_keys(self._list_failed)})
+                data['lastFullCrawlAt'] = last
+            try:
+                state.update(merge)
+            except OSError as e:
+                self.logger.warning(f"[{self.source}] run state niet opgeslagen: {e}")
+        budget = getattr(self, 'budget', None)
+        if state is not None and getattr(self, 'crawl_mode', None) == 'discovery' and reason == 'finished' \
+                and not (budget is not None and budget.limited):
+            def mark(data):
+                last = data.get('lastDiscoveryAt')
+                last = dict(last) if isinstance(last, dict) else {}
+                last.update({k: self._discovery_started for k in self._discovery_keys()})
+                data['lastDiscoveryAt'] = last
+            try:
+                state.update(mark)
+            except OSError as e:
+                self.logger.warning(f"[{self.source}] run state niet opgeslagen: {e}")
+        swept = self.availability_sweep(reason)
+
+        stats = self._stats()
+        if stats is not None:
+            self._close_stats(stats)
+        # Scrapy wacht op de Deferred (spider_closed) voordat de stats en de reactor dichtgaan
+        return swept
+
+    def _close_stats(self, stats):
+        frontier = get_frontier(self.source)
+        stats.set_value('frontier/size', len(frontier))
+        stats.set_value('frontier/bytes', frontier.nbytes)
+        hits = stats.get_value('known_index/hit', 0)
+        total = hits + stats.get_value('known_index/miss_new', 0) + stats.get_value('known_index/miss_stale', 0)
+        if total:
+            stats.set_value('known_index/hit_rate', round(hits / total, 3))
+
+    def _stats(self):
+        crawler = getattr(self, 'crawler', None)
+        return crawler.stats if crawler is not None else None
+
+    def _stat_inc(self, key: str, count: int = 1):
+        stats = self._stats()
+        if stats is not None:
+            stats.inc_value(key, count)
+
+    def _stat_set(self, key: str, value):
+        stats = self._stats()
+        if stats is not None:
+            stats.set_value(key, value)
@@ -2,30 +2,31 @@ import json
 import os
 from typing import Iterable
 from urllib.parse import urlparse
-import re
 import scrapy
-from bs4 import BeautifulSoup
+from scrapy.utils.defer import maybe_deferred_to_future
 from .base import BaseListingSpider, city_to_slug
-from rentbird_scraper.utils.normalize import parse_price, parse_size, parse_rooms
+from rentbird_scraper.utils.availability import city_key
+from rentbird_scraper.plans import load_plan
+from rentbird_scraper.utils.html import resolve_backend
+from rentbird_scraper.utils import parse_pool
 
 
 class ConfigSpider(scrapy.Spider, BaseListingSpider):
     name = "config-spider"
 
-    def __init__(self, source: str, cities: str = None, max_items: int = 0, *args, **kwargs):
+    def __init__(self, source: str, cities: str = None, max_items: int = 0, crawl_mode: str = 'auto',
+                 parser: str = None, max_per_city: int = 0, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.source = source
-        self._yielded = 0
-        self.max_items = int(max_items or 0)
-
-        conf_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config', 'sources')
-        with open(os.path.join(conf_dir, f"{source}.json"), 'r') as f:
-            self.cfg = json.load(f)
-        # Optional href filter pattern to avoid non-listing pages
-        self.href_re = None
-        pat = self.cfg.get('hrefPattern')
-        if pat:
-            self.href_re = re.compile(pat)
+        self.requested_mode = crawl_mode
+        self.init_budget(max_items, max_per_city)
+
+        # Gecompileerd extractieplan (gedeeld tussen spiders in dit proces)
+        self.plan = load_plan(source)
+        self.cfg = self.plan.config
+        self.parser_backend = resolve_backend(self.cfg, parser)
+        # SCRAPER_PARSE_WORKERS > 0: detailpagina's parsen in worker processen
+        self.parse_pool = parse_pool.get_pool()
 
         # Optional per-source slug overrides (skip or map special cases)
         overrides_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config', 'slug_overrides')
@@ -36,21 +37,38 @@ class ConfigSpider(scrapy.Spider, BaseListingSpider):
         except Exception:
             self.slug_overrides = {}
 
+        with open(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config', 'cities_nl.json'), 'r') as f:
+            all_cities = json.load(f)
         if cities:
             self.cities = [c.strip() for c in cities.split(',') if c.strip()]
+            # Discovery mode: alleen URLs van deze steden (als de config een cityPattern heeft)
+            self.discovery_cities = {city_key(c) for c in self.cities}
         else:
-            with open(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config', 'cities_nl.json'), 'r') as f:
-                self.cities = json.load(f)
+            self.cities = all_cities
+        self.city_slugs = {city_to_slug(c): c for c in list(all_cities) + list(self.cities)}
 
-    def start_requests(self) -> Iterable[scrapy.Request]:
-        templates = []
-        if 'startUrlTemplates' in self.cfg and isinstance(self.cfg['startUrlTemplates'], list):
-            templates = self.cfg['startUrlTemplates']
-        elif 'startUrlTemplate' in self.cfg:
-            templates = [self.cfg['startUrlTemplate']]
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.connect_known_index(crawler)
+        return spider
+
+    def source_id_from_url(self, url: str):
+        return self.plan.source_id(url)
+
+    def discovery_allows(self, url: str) -> bool:
+        return self.plan.allows_path(urlparse(url).path)
 
+    def detail_callback(self):
+        return self.parse_detail_offloaded if self.parse_pool is not None else self.parse_detail
+
+    def start_requests(self) -> Iterable[scrapy.Request]:
+        templates = self.plan.start_url_templates
+        if self.resolve_crawl_mode(self.requested_mode) == 'discovery':
+            yield from self.discovery_requests()
+            return
         for city in self.cities:
-            for tpl in templates:
+            for i, tpl in enumerate(templates):
                 # Apply slug override; empty override means skip this city for this source
                 slug = self.slug_overrides.get(city)
                 if slug is None:
@@ -58,126 +76,76 @@ class ConfigSpider(scrapy.Spider, BaseListingSpider):
                 if isinstance(self.slug_overrides.get(city), str) and self.slug_overrides.get(city) == '':
                     continue
                 url = tpl.replace('{citySlug}', slug).replace('{city}', city)
-                yield scrapy.Request(url, callback=self.parse_list, meta={'city': city})
+                yield scrapy.Request(url, callback=self.parse_list, errback=self.list_errback,
+                                     meta={'city': city, 'chain': f"{city}|{i}", 'page': 1, 'revalidate': 'body'},
+                                     priority=self.list_priority(city, 1))
 
     def parse_list(self, response: scrapy.http.Response):
+        city = response.meta['city']
+        page_no = response.meta.get('page', 1)
         # Respect max_items early to avoid following pagination when done
-        if self.max_items and self._yielded >= self.max_items:
+        if self.budget_exhausted(city):
             return
-        soup = BeautifulSoup(response.text, 'html.parser')
-        sel = self.cfg['list']
-        seen = set()
-        anchors = list(soup.select(sel['itemLink']))
-        # Fallback: collect all anchors if few/no matches
-        if len(anchors) < 3:
-            anchors.extend(soup.find_all('a'))
-        for a in anchors:
-            href = a.get('href')
-            if not href:
-                continue
-            full = response.urljoin(href)
-            if full in seen:
+        # Eerst de URLs uit de pagina halen en de parse tree vrijgeven; de requests
+        # hieronder worden pas gemaakt als Scrapy de output consumeert
+        page = self.page(response)
+        urls = list(self.plan.listing_urls(page, response.urljoin))
+        next_sel = self.plan.list.next
+        nxt = page.select_one(next_sel) if next_sel else None
+        next_href = nxt.get('href') if nxt else None
+        page.close()
+        del page, nxt
+
+        unseen = 0
+        for full in urls:
+            # Lopende detail requests dekken het resterende budget al
+            if self.budget_covered(city):
+                break
+            source_id = self.source_id_from_url(full)
+            if not self.is_known(source_id):
+                unseen += 1
+            # Al ingepland via een andere pagina/template deze run
+            if not self.claim_listing(full, city):
                 continue
-            # Filter to true listing detail pages only
-            allow = True
-            if self.href_re:
-                allow = bool(self.href_re.search(urlparse(full).path))
-            else:
-                p = urlparse(full).path
-                # Default heuristic: must contain '-te-huur' or '/huren/' and must NOT be makelaars/info/etc
-                allow = ((('-te-huur' in p) or ('/huren/' in p))
-                         and all(seg not in p for seg in ['/makelaars', '/info', '/registreren', '/over']))
-            if not allow:
+            # Recent gecheckte listings niet opnieuw ophalen
+            if not self.should_fetch_detail(source_id):
                 continue
-            seen.add(full)
-            yield scrapy.Request(full, callback=self.parse_detail, meta={'city': response.meta['city']})
+            request = self.detail_request(full, self.detail_callback(), {'city': city}, page=page_no)
+            if request is not None:
+                yield request
 
-        next_sel = sel.get('next')
-        if next_sel and (not self.max_items or self._yielded < self.max_items):
-            nxt = soup.select_one(next_sel)
-            if nxt and nxt.get('href'):
-                yield scrapy.Request(response.urljoin(nxt['href']), callback=self.parse_list, meta={'city': response.meta['city']})
+        if next_href and not self.budget_exhausted(city):
+            meta = self.next_page_meta(response, unseen)
+            if meta is not None:
+                yield scrapy.Request(response.urljoin(next_href), callback=self.parse_list,
+                                     errback=self.list_errback, meta=dict(meta, revalidate='body'),
+                                     priority=self.list_priority(city, meta['page']))
 
     def parse_detail(self, response: scrapy.http.Response):
-        if self.max_items and self._yielded >= self.max_items:
+        if response.status == 304:
+            yield self.touch_item(response)
             return
-        soup = BeautifulSoup(response.text, 'html.parser')
-        det = self.cfg['detail']
-        title_el = soup.select_one(det.get('title', 'h1'))
-        title = title_el.get_text(strip=True) if title_el else 'Woning'
-
-        price_text = None
-        if (pt := det.get('priceText')):
-            # find first element containing €
-            price_text = soup.find(text=lambda t: isinstance(t, str) and '€' in t)
-
-        size_text = None
-        rooms_text = None
-        for li in soup.select(det.get('sizeText', 'li')):
-            txt = li.get_text(' ', strip=True)
-            if 'm²' in txt and not size_text:
-                size_text = txt
-            if 'kamer' in txt and not rooms_text:
-                rooms_text = txt
-
-        furnished = None
-        furn_keys = [k.lower() for k in det.get('furnishedKeywords', [])]
-        if furn_keys:
-            page_text = soup.get_text(' ', strip=True).lower()
-            if any(k in page_text for k in furn_keys):
-                furnished = 'gemeubileerd' in page_text
-
-        images = []
-        for img in soup.select(det.get('images', 'img')):
-            src = img.get('src') or img.get('data-src')
-            if src and src.startswith('http'):
-                images.append(src)
-
-        # offeredSince (Aangeboden sinds dd-mm-yyyy)
-        offered_since = None
-        txt = soup.get_text(' ', strip=True)
-        m = re.search(r"Aangeboden\s+sinds\s+(\d{2}-\d{2}-\d{4})", txt, re.IGNORECASE)
-        if m:
-            try:
-                d, mth, y = m.group(1).split('-')
-                offered_since = f"{y}-{mth}-{d}T00:00:00Z"
-            except Exception:
-                offered_since = None
-
-        # Robust sourceId extraction from URL
-        parsed = urlparse(response.url)
-        segs = [s for s in parsed.path.split('/') if s]
-        source_id = None
-        # Prefer an 8-char hex segment (Pararius style)
-        for s in segs:
-            if re.fullmatch(r'[a-f0-9]{8}', s):
-                source_id = s
-                break
-        # Else try trailing -digits (Kamernet style)
-        if not source_id:
-            m = re.search(r'-(\d{5,})$', parsed.path)
-            if m:
-                source_id = m.group(1)
-        # Else fallback to second last segment
-        if not source_id and len(segs) >= 1:
-            source_id = segs[-1]
-
-        item = {
-            'source': self.source,
-            'sourceId': source_id,
-            'title': title,
-            'sourceUrl': response.url,
-            'address': {
-                'city': response.meta.get('city'),
-                'street': None
-            },
-            'price': parse_price(price_text),
-            'size': parse_size(size_text),
-            'rooms': parse_rooms(rooms_text),
-            'furnished': furnished,
-            'images': images[:12],
-            'offeredSince': offered_since
-        }
-
-        self._yielded += 1
+        if self.plan.structured is not None:
+            # JSON-LD / embedded JSON: geen DOM nodig als dat lukt
+            item = self.plan.extract_structured(response.text, response.url, response.meta.get('city'))
+            self._stat_inc('structured/hit' if item is not None else 'structured/miss')
+            if item is not None:
+                yield item
+                return
+        page = self.page(response)
+        item = self.plan.extract_detail(page, response.url, response.meta.get('city'))
+        page.close()
+        yield item
+
+    async def parse_detail_offloaded(self, response: scrapy.http.Response):
+        if response.status == 304:
+            yield self.touch_item(response)
+            return
+        # Budget telt via de reservering van deze request (BudgetMiddleware)
+        # Deferred -> awaitable, ook onder de asyncio reactor (TWISTED_REACTOR)
+        item, structured = await maybe_deferred_to_future(parse_pool.submit(
+            self.parse_pool, parse_pool.extract_detail, self.source, response.body,
+            response.encoding, self.parser_backend, response.url, response.meta.get('city')))
+        if structured is not None:
+            self._stat_inc('structured/hit' if structured else 'structured/miss')
         yield item
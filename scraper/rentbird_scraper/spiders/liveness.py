@@ -0,0 +1,243 @@
+import datetime as dt
+import itertools
+import json
+import os
+import re
+from typing import Iterable, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+import scrapy
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from twisted.internet import threads
+from twisted.internet.defer import CancelledError
+
+from rentbird_scraper.plans import config_path
+from rentbird_scraper.throughput import slot_key
+from rentbird_scraper.utils.frontier import canonical_url
+
+
+LIVE, GONE, REDIRECTED, UNKNOWN = 'live', 'gone', 'redirected', 'unknown'
+# Alleen het begin van de pagina voor `goneMarkers` (GET mode)
+RANGE_BYTES = int(os.getenv('SCRAPER_LIVENESS_RANGE', '16384'))
+# Server negeert de Range header: download afbreken boven deze grootte (de pagina bestaat dus)
+MAX_BYTES = RANGE_BYTES * 4
+# Listings per batch uit Mongo (in een worker thread opgehaald)
+BATCH_SIZE = int(os.getenv('SCRAPER_LIVENESS_BATCH', '1000'))
+
+
+def same_listing(path: str, source_id: str) -> bool:
+    """`source_id` als heel padsegment, of als `-`-deel aan het begin/eind ervan (`kamer-2279581`)."""
+    return re.search(r'(?:^|[/-])' + re.escape(source_id) + r'(?:$|[/-])', path) is not None
+
+
+def load_liveness_config(source: str) -> dict:
+    """`liveness` blok uit config/sources/<source>.json (method, goneMarkers)."""
+    try:
+        with open(config_path(source), 'r') as f:
+            return (json.load(f) or {}).get('liveness') or {}
+    except (OSError, ValueError):
+        return {}
+
+
+def classify(status: int, url: str, source_id: Optional[str], location: Optional[str] = None,
+             body: bytes = b'', gone_markers=()) -> str:
+    """
+    live: 2xx/304 (zonder gone marker) of redirect naar dezelfde listing
+    gone: 404/410 of een gone marker in het begin van de pagina
+    redirected: redirect naar een andere pagina (meestal zoekresultaten/overzicht)
+    unknown: al het andere (403/429/5xx, netwerkfout): alleen `lastProbedAt`
+    """
+    if status in (404, 410):
+        return GONE
+    if 300 <= status < 400 and status != 304:
+        if not location:
+            return UNKNOWN
+        target = canonical_url(urljoin(url, location))
+        if target == canonical_url(url) or (source_id and same_listing(urlsplit(target).path, source_id)):
+            return LIVE
+        return REDIRECTED
+    if 200 <= status < 300 or status == 304:
+        if body and gone_markers:
+            text = body.decode('utf-8', errors='ignore').lower()
+            if any(m.lower() in text for m in gone_markers):
+                return GONE
+        return LIVE
+    return UNKNOWN
+
+
+class LivenessSpider(scrapy.Spider):
+    """
+    Controleert of opgeslagen listings nog online zijn zonder de detailpagina
+    te parsen: HEAD (of GET met een Range header) op `sourceUrl`, oudste
+    `lastCheckedAt` eerst, redirects niet volgen. De LivenessPipeline schrijft
+    de uitkomst in batches terug.
+
+    De cursor wordt in een worker thread gepagineerd (per BATCH_SIZE): de
+    eerste batch bij spider_opened, de volgende zodra de vorige ingepland is;
+    een idle spider plant de klaarstaande batch in. Elke probe gaat via het
+    download slot van zijn source (DOWNLOAD_SLOTS, zie run_liveness.py).
+    """
+    name = "liveness"
+    custom_settings = {
+        'ITEM_PIPELINES': {'rentbird_scraper.pipelines.LivenessPipeline': 300},
+        'CONCURRENT_REQUESTS': int(os.getenv('SCRAPER_LIVENESS_CONCURRENCY', '32')),
+        'RETRY_TIMES': 1,
+        'DOWNLOAD_TIMEOUT': 20,
+    }
+
+    def __init__(self, sources: str = None, limit: int = 0, older_than_minutes: float = 360,
+                 method: str = None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sources = [s.strip() for s in sources.split(',') if s.strip()] if sources else []
+        self.limit = int(limit or 0)
+        self.older_than = max(0.0, float(older_than_minutes or 0)) * 60
+        self.method = method
+        self._configs = {}
+        self.client = None
+        self._cursor = None
+        self._ready: List[dict] = []
+        self._fetching = None
+        self._exhausted = False
+        self._slots = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.open_cursor, signal=signals.spider_opened)
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        return spider
+
+    def source_config(self, source: str) -> dict:
+        if source not in self._configs:
+            self._configs[source] = load_liveness_config(source)
+        return self._configs[source]
+
+    def query(self, now: dt.datetime) -> dict:
+        cutoff = now - dt.timedelta(seconds=self.older_than)
+        q = {
+            "isStillAvailable": {"$ne": False},
+            "sourceUrl": {"$type": "string"},
+            # Niet recent gecrawld en niet recent geprobed
+            "$and": [
+                {"$or": [{"lastCheckedAt": {"$lt": cutoff}}, {"lastCheckedAt": None}]},
+                {"$or": [{"lastProbedAt": {"$lt": cutoff}}, {"lastProbedAt": None}]},
+            ],
+        }
+        if self.sources:
+            q["source"] = {"$in": self.sources}
+        return q
+
+    def open_cursor(self, spider=None):
+        """Cursor openen en de eerste batch ophalen vóór start_requests (Scrapy wacht op de Deferred)."""
+        self._fetching = threads.deferToThread(self._open_and_fetch)
+        return self._fetching.addCallbacks(self._fetched, self._fetch_failed)
+
+    def _open_and_fetch(self) -> List[dict]:
+        # Worker thread
+        from rentbird_scraper.utils.mongo import get_client, get_database, properties_collection_name
+        self.client = get_client()
+        props = get_database(self.client).get_collection(properties_collection_name())
+        cursor = props.find(
+            self.query(dt.datetime.utcnow()),
+            {"_id": 0, "source": 1, "sourceId": 1, "sourceUrl": 1},
+            batch_size=BATCH_SIZE,
+        ).sort("lastCheckedAt", 1)
+        if self.limit:
+            cursor = cursor.limit(self.limit)
+        self._cursor = cursor
+        return self._fetch()
+
+    def _fetch(self) -> List[dict]:
+        # Worker thread; er loopt nooit meer dan één fetch tegelijk
+        return list(itertools.islice(self._cursor, BATCH_SIZE))
+
+    def _fetched(self, docs: List[dict]):
+        self._fetching = None
+        self._ready = docs
+        self._exhausted = len(docs) < BATCH_SIZE
+        self.crawler.stats.inc_value('liveness/batches')
+
+    def _fetch_failed(self, failure):
+        self._fetching = None
+        self._exhausted = True
+        self.logger.error("liveness: listings ophalen mislukt: %s", failure.getErrorMessage())
+        self.crawler.stats.inc_value('liveness/fetch_failed')
+
+    def _prefetch(self):
+        if not self._exhausted and self._fetching is None and self._cursor is not None:
+            self._fetching = threads.deferToThread(self._fetch)
+            self._fetching.addCallbacks(self._fetched, self._fetch_failed)
+
+    def _take_batch(self) -> List[dict]:
+        docs, self._ready = self._ready, []
+        self._prefetch()
+        return docs
+
+    def start_requests(self) -> Iterable[scrapy.Request]:
+        for doc in self._take_batch():
+            yield self.probe(doc)
+
+    def spider_idle(self, spider=None):
+        if self._ready:
+            for doc in self._take_batch():
+                self.crawler.engine.crawl(self.probe(doc))
+            raise DontCloseSpider
+        if self._fetching is not None:
+            # Volgende batch nog onderweg
+            raise DontCloseSpider
+
+    def probe(self, doc: dict, method: Optional[str] = None) -> scrapy.Request:
+        cfg = self.source_config(doc.get('source'))
+        method = (method or self.method or cfg.get('method') or 'head').upper()
+        headers = {}
+        meta = {'probe': doc, 'dont_redirect': True, 'handle_httpstatus_all': True}
+        slot = slot_key(doc.get('source'))
+        if self._slots is None:
+            self._slots = self.settings.getdict('DOWNLOAD_SLOTS')
+        if slot in self._slots:
+            meta['download_slot'] = slot
+        if method == 'GET':
+            headers['Range'] = f"bytes=0-{RANGE_BYTES - 1}"
+            meta['download_maxsize'] = MAX_BYTES
+        return scrapy.Request(
+            doc['sourceUrl'], method=method, headers=headers, callback=self.parse_probe, errback=self.probe_failed,
+            dont_filter=True, meta=meta,
+        )
+
+    def parse_probe(self, response: scrapy.http.Response):
+        doc = response.meta['probe']
+        if response.request.method == 'HEAD' and response.status in (405, 501):
+            # HEAD niet ondersteund: nog één keer met een beperkte GET
+            self.crawler.stats.inc_value('liveness/head_fallback')
+            yield self.probe(doc, 'GET')
+            return
+        location = response.headers.get(b'Location')
+        status = classify(
+            response.status, doc['sourceUrl'], doc.get('sourceId'),
+            location.decode('latin-1') if location else None,
+            response.body if response.request.method == 'GET' else b'',
+            self.source_config(doc.get('source')).get('goneMarkers') or (),
+        )
+        yield {
+            'source': doc.get('source'),
+            'sourceId': doc.get('sourceId'),
+            'status': status,
+            'httpStatus': response.status,
+        }
+
+    def probe_failed(self, failure):
+        request = getattr(failure, 'request', None)
+        doc = request.meta.get('probe') if request is not None else None
+        if doc is not None and failure.check(CancelledError) and request.meta.get('download_maxsize'):
+            # Afgebroken op download_maxsize: de server stuurde een volledige pagina, dus die bestaat nog
+            self.crawler.stats.inc_value('liveness/maxsize_cancelled')
+            yield {'source': doc.get('source'), 'sourceId': doc.get('sourceId'), 'status': LIVE, 'httpStatus': None}
+            return
+        self.crawler.stats.inc_value(f"liveness/error/{type(failure.value).__name__}")
+        if doc is not None:
+            yield {'source': doc.get('source'), 'sourceId': doc.get('sourceId'), 'status': UNKNOWN, 'httpStatus': None}
+
+    def closed(self, reason):
+        if self.client is not None:
+            self.client.close()
@@ -2,56 +2,88 @@ import os
 import urllib.parse as urlparse
 from typing import Iterable
 import scrapy
-from bs4 import BeautifulSoup
+from .base import BaseListingSpider
+from rentbird_scraper.plans import load_plan
+from rentbird_scraper.utils.html import resolve_backend
 from rentbird_scraper.utils.normalize import parse_price, parse_size, parse_rooms
 
 
-class ParariusSpider(scrapy.Spider):
+class ParariusSpider(scrapy.Spider, BaseListingSpider):
     name = "pararius"
+    source = "pararius"
 
-    def __init__(self, cities: str = None, max_items: int = 0, *args, **kwargs):
+    def __init__(self, cities: str = None, max_items: int = 0, parser: str = None, max_per_city: int = 0,
+                 *args, **kwargs):
         super().__init__(*args, **kwargs)
+        # Source config (parser, refreshMinutes, availability) zoals bij de ConfigSpider
+        self.cfg = load_plan(self.source).config
+        self.parser_backend = resolve_backend(self.cfg, parser)
         # Steden in URL‑formaat
         conf = cities or os.getenv("SCRAPER_CITIES", "Amsterdam,Utrecht")
         self.cities = [c.strip() for c in conf.split(",") if c.strip()]
-        self.max_items = int(max_items or os.getenv("SCRAPER_MAX", 0) or 0)
-        self._yielded = 0
+        self.init_budget(max_items or os.getenv("SCRAPER_MAX", 0), max_per_city)
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.connect_known_index(crawler)
+        return spider
 
     def start_requests(self) -> Iterable[scrapy.Request]:
         for city in self.cities:
             city_slug = urlparse.quote(city.lower().replace(" ", "-"))
             url = f"https://www.pararius.nl/huurwoningen/{city_slug}"
-            yield scrapy.Request(url, callback=self.parse_list, meta={"city": city, "page": 1})
+            yield scrapy.Request(url, callback=self.parse_list, errback=self.list_errback,
+                                 meta={"city": city, "page": 1, "revalidate": "body"},
+                                 priority=self.list_priority(city, 1))
 
     def parse_list(self, response: scrapy.http.Response):
         city = response.meta["city"]
-        soup = BeautifulSoup(response.text, "html.parser")
+        page_no = response.meta.get("page", 1)
+        if self.budget_exhausted(city):
+            return
+        page = self.page(response)
 
         # Kaarten selecteren (selectors kunnen wijzigen; houd in de gaten)
-        cards = soup.select("section.search-listing article") or soup.select(".listing-search-item")
-
-        for card in cards:
-            a = card.select_one("a")
-            if not a:
-                continue
-            href = a.get("href")
+        cards = page.select("section.search-listing article") or page.select(".listing-search-item")
+        hrefs = [a.get("href") for a in (card.select_one("a") for card in cards) if a is not None]
+        next_link = page.select_one('a[rel="next"]')
+        next_href = next_link.get("href") if next_link else None
+        # Parse tree vrijgeven voordat de requests worden gemaakt
+        page.close()
+        del page, cards, next_link
+
+        for href in hrefs:
+            # Lopende detail requests dekken het resterende budget al
+            if self.budget_covered(city):
+                break
             if not href:
                 continue
             url = response.urljoin(href)
-            yield scrapy.Request(url, callback=self.parse_detail, meta={"city": city})
+            source_id = self.source_id_from_url(url)
+            if not self.claim_listing(url, city):
+                continue
+            if not self.should_fetch_detail(source_id):
+                continue
+            request = self.detail_request(url, self.parse_detail, {"city": city}, page=page_no)
+            if request is not None:
+                yield request
 
         # Volgende pagina
-        next_link = soup.select_one('a[rel="next"]')
-        if next_link and next_link.get("href"):
-            yield scrapy.Request(response.urljoin(next_link["href"]), callback=self.parse_list, meta={"city": city})
+        if next_href and not self.budget_exhausted(city):
+            yield scrapy.Request(response.urljoin(next_href), callback=self.parse_list,
+                                 errback=self.list_errback,
+                                 meta={"city": city, "page": page_no + 1, "revalidate": "body"},
+                                 priority=self.list_priority(city, page_no + 1))
 
     def parse_detail(self, response: scrapy.http.Response):
-        if self.max_items and self._yielded >= self.max_items:
+        if response.status == 304:
+            yield self.touch_item(response)
             return
+        page = self.page(response)
 
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        title = (soup.select_one("h1") or {}).get_text(strip=True) if soup.select_one("h1") else None
+        h1 = page.select_one("h1")
+        title = h1.get_text(strip=True) if h1 else None
 
         # Kenmerken – selectors kunnen afwijken; probeer robuust te blijven
         price_text = None
@@ -61,11 +93,11 @@ class ParariusSpider(scrapy.Spider):
         images = []
 
         # Voorbeelden van selectors; bij aanpassingen site, update hier.
-        price_el = soup.find(text=lambda t: t and "€" in t)
+        price_el = page.first_text_containing("€")
         price_text = price_el.strip() if isinstance(price_el, str) else None
 
         # m² en kamers
-        for li in soup.select("li"):
+        for li in page.select("li"):
             txt = li.get_text(" ", strip=True)
             if "m²" in txt and not size_text:
                 size_text = txt
@@ -75,14 +107,14 @@ class ParariusSpider(scrapy.Spider):
                 furnished = "gemeubileerd" in txt.lower()
 
         # Afbeeldingen
-        for img in soup.select("img"):
+        for img in page.select("img"):
             src = img.get("src") or img.get("data-src")
             if src and src.startswith("http"):
                 images.append(src)
 
         item = {
             "source": "pararius",
-            "sourceId": response.url.split("-")[-1].split("/")[0],  # grove benadering
+            "sourceId": self.source_id_from_url(response.url),
             "title": title or "Woning",
             "sourceUrl": response.url,
             "address": {
@@ -95,7 +127,7 @@ class ParariusSpider(scrapy.Spider):
             "furnished": furnished,
             "images": images[:12],
         }
+        page.close()
 
-        self._yielded += 1
         yield item
 
@@ -0,0 +1,92 @@
+"""
+Throughput profielen per source (`throughput` blok in config/sources/<naam>.json).
+
+Elke source krijgt in run_sources.py een eigen Crawler met een kopie van de
+project settings, zodat een trage/strenge site (funda) niet meer het tempo
+van de hele run bepaalt:
+
+  "throughput": {
+    "concurrency": 8,            # CONCURRENT_REQUESTS voor deze source
+    "concurrencyPerDomain": 2,   # CONCURRENT_REQUESTS_PER_DOMAIN
+    "delayFloor": 0.75,          # DOWNLOAD_DELAY; AutoThrottle gaat hier nooit onder
+    "targetConcurrency": 2.0,    # AutoThrottle aan, streefwaarde voor requests in-flight
+    "maxDelay": 30,              # AUTOTHROTTLE_MAX_DELAY en plafond voor backoff
+    "backoffBudget": 20          # 429/5xx/timeouts voordat de source stopt (0 = onbeperkt)
+  }
+
+Ontbrekende keys vallen terug op settings.py (en dus de SCRAPER_* env vars).
+"""
+import json
+from typing import Optional
+
+from scrapy.settings import Settings
+
+from rentbird_scraper.plans import config_path
+
+
+# profile key -> (Scrapy setting, type)
+PROFILE_SETTINGS = {
+    'concurrency': ('CONCURRENT_REQUESTS', int),
+    'concurrencyPerDomain': ('CONCURRENT_REQUESTS_PER_DOMAIN', int),
+    'delayFloor': ('DOWNLOAD_DELAY', float),
+    'targetConcurrency': ('AUTOTHROTTLE_TARGET_CONCURRENCY', float),
+    'maxDelay': ('AUTOTHROTTLE_MAX_DELAY', float),
+    'backoffBudget': ('BACKOFF_BUDGET', int),
+}
+
+
+def load_profile(source: str) -> dict:
+    """`throughput` blok van een source, of {} (ook als er geen config bestaat)."""
+    try:
+        with open(config_path(source), 'r') as f:
+            return json.load(f).get('throughput') or {}
+    except (OSError, ValueError):
+        return {}
+
+
+def source_settings(base: Settings, source: str, profile: Optional[dict] = None) -> Settings:
+    """Kopie van `base` met het throughput profiel van `source` toegepast."""
+    profile = load_profile(source) if profile is None else profile
+    settings = base.copy()
+    for key, (name, cast) in PROFILE_SETTINGS.items():
+        if profile.get(key) is not None:
+            settings.set(name, cast(profile[key]), priority='spider')
+    if profile.get('targetConcurrency') is not None:
+        settings.set('AUTOTHROTTLE_ENABLED', True, priority='spider')
+        # Starten op de floor; AutoThrottle schaalt op basis van latency
+        settings.set('AUTOTHROTTLE_START_DELAY', max(settings.getfloat('DOWNLOAD_DELAY'), 0.25), priority='spider')
+    if profile.get('maxDelay') is not None:
+        settings.set('BACKOFF_MAX_DELAY', float(profile['maxDelay']), priority='spider')
+    return settings
+
+
+def describe(settings: Settings) -> str:
+    return (f"concurrency={settings.getint('CONCURRENT_REQUESTS')} "
+            f"per_domain={settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN')} "
+            f"delay={settings.getfloat('DOWNLOAD_DELAY')} "
+            f"autothrottle={'on' if settings.getbool('AUTOTHROTTLE_ENABLED') else 'off'} "
+            f"backoff_budget={settings.getint('BACKOFF_BUDGET')}")
+
+
+
+def slot_key(source: str) -> str:
+    return f"source:{source}"
+
+
+def download_slots(base: Settings, sources) -> dict:
+    """
+    DOWNLOAD_SLOTS voor een crawler die meerdere sources combineert (liveness):
+    één slot per source met een throughput profiel, concurrency en delay uit dat profiel.
+    """
+    slots = {}
+    for source in sources:
+        profile = load_profile(source)
+        if not profile:
+            continue
+        settings = source_settings(base, source, profile)
+        slots[slot_key(source)] = {
+            'concurrency': min(settings.getint('CONCURRENT_REQUESTS'), settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN')),
+            'delay': settings.getfloat('DOWNLOAD_DELAY'),
+            'randomize_delay': settings.getbool('RANDOMIZE_DOWNLOAD_DELAY'),
+        }
+    return slots
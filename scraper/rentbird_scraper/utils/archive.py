@@ -0,0 +1,114 @@
+"""
+Lokaal response archief voor record/replay (`run_sources.py --record/--replay`).
+
+- `blobs/ab/abcd….z`: body's, zlib-gecomprimeerd en geadresseerd op sha256
+  van de ruwe body, dus een pagina die vaker voorkomt staat er één keer in
+- `index.sqlite`: per request (methode + canonieke URL [+ hash van de request
+  body]) de status, headers en de blob hash van de laatst opgenomen response
+
+Body's worden opgeslagen zoals ze binnenkomen (nog gecomprimeerd, vóór
+redirects en retries), zodat replay dezelfde middleware keten doorloopt.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from typing import List, NamedTuple, Optional, Tuple
+
+from rentbird_scraper.utils.frontier import canonical_url
+
+
+class Recorded(NamedTuple):
+    url: str
+    status: int
+    headers: List[Tuple[str, List[str]]]
+    body: bytes
+
+
+def request_key(method: str, url: str, body: bytes = b'') -> str:
+    key = f"{method.upper()} {canonical_url(url, keep_slash=True)}"
+    if body:
+        key += ' ' + hashlib.sha1(body).hexdigest()
+    return key
+
+
+class ResponseArchive:
+    def __init__(self, path: str, commit_every: int = 200):
+        self.path = path
+        self.blob_dir = os.path.join(path, 'blobs')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        # Meerdere shards (--workers) kunnen tegelijk opnemen
+        self.conn = sqlite3.connect(os.path.join(path, 'index.sqlite'), timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' key TEXT PRIMARY KEY, url TEXT NOT NULL, status INTEGER NOT NULL,'
+            ' headers TEXT NOT NULL, body_sha TEXT NOT NULL, recorded REAL NOT NULL)'
+        )
+        self.conn.commit()
+        self.commit_every = max(1, int(commit_every))
+        self._uncommitted = 0
+
+    def _blob_path(self, sha: str) -> str:
+        return os.path.join(self.blob_dir, sha[:2], f"{sha}.z")
+
+    def put_blob(self, body: bytes) -> Tuple[str, int]:
+        """Slaat de body op (als hij er nog niet is); geeft (sha256, geschreven bytes) terug."""
+        sha = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(sha)
+        if os.path.exists(path):
+            return sha, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = zlib.compress(body, 6)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return sha, len(data)
+
+    def put(self, key: str, url: str, status: int, headers, body: bytes) -> int:
+        """Neemt een response op; geeft het aantal nieuw geschreven blob bytes terug."""
+        sha, written = self.put_blob(body)
+        self.conn.execute(
+            'INSERT OR REPLACE INTO responses (key, url, status, headers, body_sha, recorded) VALUES (?, ?, ?, ?, ?, ?)',
+            (key, url, int(status), json.dumps(headers), sha, time.time()),
+        )
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+        return written
+
+    def get(self, key: str) -> Optional[Recorded]:
+        row = self.conn.execute('SELECT url, status, headers, body_sha FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            with open(self._blob_path(row[3]), 'rb') as f:
+                body = zlib.decompress(f.read())
+        except OSError:
+            return None
+        return Recorded(row[0], row[1], json.loads(row[2]), body)
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def entries(self, method: str = 'GET') -> List[Tuple[str, str, int]]:
+        """(key, url, status) van alle opgenomen responses voor `method`, oudste eerst."""
+        return self.conn.execute(
+            'SELECT key, url, status FROM responses WHERE key LIKE ? ORDER BY recorded', (f"{method.upper()} %",)
+        ).fetchall()
+
+    def commit(self):
+        if self._uncommitted:
+            self.conn.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        try:
+            self.commit()
+            self.conn.close()
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,116 @@
+"""
+Beschikbaarheid na een volledige crawl: listings die in K opeenvolgende
+schone volledige runs niet meer op de lijstpagina's van hun stad stonden,
+krijgen `isStillAvailable: false` (in één bulk_write).
+
+- `missedRuns` op het document telt de gemiste runs; gezien = terug naar 0
+- alleen steden waarvan alle lijstpagina's gelukt zijn en die minstens één
+  listing opleverden doen mee (`clean_cities`)
+- ontbreekt er in één keer meer dan `max_missing_fraction` van de actieve
+  listings van een stad, dan wordt die stad overgeslagen (site gewijzigd,
+  captcha, kapotte selector) in plaats van alles te archiveren
+- listings die weer gezien worden, worden opnieuw beschikbaar
+- met een `outbox` krijgt elke gearchiveerde listing een `delisted` event en
+  elke listing die hier weer beschikbaar wordt (304, dus niet via de
+  pipeline) een `reactivated` event
+"""
+import datetime as dt
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+from pymongo import UpdateMany
+
+from rentbird_scraper.utils.outbox import delisted_event, reactivated_event
+
+
+ALL_CITIES = '*'
+# $in lijsten klein houden (BSON limiet)
+CHUNK = 5000
+
+
+def city_key(city: Optional[str]) -> str:
+    return city.strip().lower() if city else ALL_CITIES
+
+
+def _chunks(ids, size=CHUNK):
+    ids = sorted(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def sweep(collection, source: str, seen: Set[str], clean_cities: Iterable[str], misses_required: int = 2,
+          max_missing_fraction: float = 0.5, now: Optional[dt.datetime] = None, logger=None,
+          outbox=None) -> Dict[str, int]:
+    """
+    `seen`: alle sourceIds die deze run op een lijstpagina stonden.
+    `clean_cities`: city_key() van de steden die volledig gecrawld zijn (ALL_CITIES = hele source).
+    Geeft tellers terug voor de stats.
+    """
+    now = now or dt.datetime.utcnow()
+    misses_required = max(1, int(misses_required))
+    clean = set(clean_cities)
+    counts = defaultdict(int)
+    ops = []
+
+    # Weer gezien: teller resetten / opnieuw beschikbaar maken
+    reactivated = []
+    for ids in _chunks(seen):
+        if outbox is not None:
+            reactivated.extend(collection.find(
+                {"source": source, "sourceId": {"$in": ids}, "isStillAvailable": False},
+                {"_id": 0, "sourceId": 1, "price": 1, "address.city": 1},
+            ))
+        ops.append(UpdateMany(
+            {"source": source, "sourceId": {"$in": ids},
+             "$or": [{"isStillAvailable": False}, {"missedRuns": {"$gt": 0}}]},
+            {"$set": {"isStillAvailable": True, "missedRuns": 0}, "$unset": {"unavailableAt": ""}},
+        ))
+
+    by_city = defaultdict(list)
+    if clean:
+        cursor = collection.find(
+            {"source": source, "isStillAvailable": {"$ne": False}},
+            {"_id": 0, "sourceId": 1, "address.city": 1, "missedRuns": 1},
+            batch_size=5000,
+        )
+        for doc in cursor:
+            key = city_key((doc.get("address") or {}).get("city"))
+            if ALL_CITIES in clean or key in clean:
+                by_city[key].append(doc)
+
+    increment: Set[str] = set()
+    archive: Set[str] = set()
+    for key, docs in by_city.items():
+        missing = [d for d in docs if d.get("sourceId") and d["sourceId"] not in seen]
+        if not missing:
+            continue
+        if len(docs) >= 10 and len(missing) > max_missing_fraction * len(docs):
+            counts['skipped_suspicious'] += 1
+            if logger is not None:
+                logger.warning(f"[{source}] sweep {key}: {len(missing)}/{len(docs)} actieve listings niet gezien, stad overgeslagen")
+            continue
+        counts['missing'] += len(missing)
+        for d in missing:
+            if int(d.get("missedRuns") or 0) + 1 >= misses_required:
+                archive.add(d["sourceId"])
+            else:
+                increment.add(d["sourceId"])
+
+    for ids in _chunks(increment):
+        ops.append(UpdateMany({"source": source, "sourceId": {"$in": ids}}, {"$inc": {"missedRuns": 1}}))
+    for ids in _chunks(archive):
+        ops.append(UpdateMany(
+            {"source": source, "sourceId": {"$in": ids}, "isStillAvailable": {"$ne": False}},
+            {"$set": {"isStillAvailable": False, "unavailableAt": now, "missedRuns": misses_required}},
+        ))
+
+    if ops:
+        res = collection.bulk_write(ops, ordered=True)
+        counts['modified'] = res.modified_count
+    if outbox is not None and (archive or reactivated):
+        events = [reactivated_event(source, d) for d in reactivated]
+        events += [delisted_event(source, sid, 'sweep') for sid in sorted(archive)]
+        counts['events'] = outbox.append(events, now)
+    counts['cities'] = len(clean)
+    counts['marked_unavailable'] = len(archive)
+    return dict(counts)
@@ -0,0 +1,77 @@
+"""
+Item budget per spider: `max_items` (totaal) en `max_per_city`.
+
+Detail requests reserveren vóór het inplannen een plek in het budget
+(`reserve`); die telt mee tot het item geleverd is (`commit`) of de request
+niets oplevert/mislukt (`release`). Zo worden er nooit meer detailpagina's
+gedownload dan er nog items nodig zijn, en kan BudgetMiddleware wachtende
+requests laten vallen zodra het budget op is.
+"""
+from collections import defaultdict
+from typing import Dict, Optional
+
+
+class BudgetController:
+    def __init__(self, max_items: int = 0, max_per_city: int = 0):
+        self.max_items = max(0, int(max_items or 0))
+        self.max_per_city = max(0, int(max_per_city or 0))
+        self.done = 0
+        self.inflight = 0
+        self._city_done: Dict[str, int] = defaultdict(int)
+        self._city_inflight: Dict[str, int] = defaultdict(int)
+
+    @property
+    def limited(self) -> bool:
+        return bool(self.max_items or self.max_per_city)
+
+    @staticmethod
+    def _key(city: Optional[str]) -> Optional[str]:
+        return city.strip().lower() if city else None
+
+    def remaining(self, city: Optional[str] = None) -> Optional[int]:
+        """Aantal items dat nog gereserveerd kan worden (None = onbeperkt)."""
+        left = None
+        if self.max_items:
+            left = self.max_items - self.done - self.inflight
+        key = self._key(city)
+        if self.max_per_city and key:
+            city_left = self.max_per_city - self._city_done[key] - self._city_inflight[key]
+            left = city_left if left is None else min(left, city_left)
+        return None if left is None else max(0, left)
+
+    def exhausted(self, city: Optional[str] = None) -> bool:
+        """True als er (voor deze stad) geen items meer geleverd hoeven te worden."""
+        if self.max_items and self.done >= self.max_items:
+            return True
+        key = self._key(city)
+        return bool(self.max_per_city and key and self._city_done[key] >= self.max_per_city)
+
+    def covered(self, city: Optional[str] = None) -> bool:
+        """True als het resterende budget al door lopende requests gedekt wordt."""
+        return self.remaining(city) == 0
+
+    def reserve(self, city: Optional[str] = None) -> bool:
+        if self.covered(city):
+            return False
+        self.inflight += 1
+        key = self._key(city)
+        if key:
+            self._city_inflight[key] += 1
+        return True
+
+    def commit(self, city: Optional[str] = None) -> bool:
+        """Item geleverd (eerst de eventuele reservering vrijgeven). False = over het budget."""
+        if self.exhausted(city):
+            return False
+        self.done += 1
+        key = self._key(city)
+        if key:
+            self._city_done[key] += 1
+        return True
+
+    def release(self, city: Optional[str] = None):
+        """Reservering vrijgeven: item geleverd, request mislukt, gedropt of leverde niets op."""
+        self.inflight = max(0, self.inflight - 1)
+        key = self._key(city)
+        if key:
+            self._city_inflight[key] = max(0, self._city_inflight[key] - 1)
@@ -0,0 +1,163 @@
+import logging
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+from twisted.internet import defer, task, threads
+
+
+logger = logging.getLogger(__name__)
+
+
+class BulkWriter:
+    """
+    Buffert Mongo write-operaties en schrijft ze in batches via
+    `bulk_write(ordered=False)` in een worker thread, zodat de Twisted
+    reactor niet op Mongo round trips wacht.
+
+    - flush bij `batch_size` operaties of na `flush_interval` seconden
+    - maximaal `max_pending` flushes tegelijk; daarna geeft `add()` een
+      Deferred terug die pas vuurt als er weer ruimte is (backpressure)
+    - operaties met dezelfde key binnen één batch worden samengevoegd
+      (laatste wint), zodat één batch nooit twee upserts op dezelfde
+      (source, sourceId) bevat
+    - optioneel bouwt `prepare(entries)` de operaties pas in de worker
+      thread (bijv. na het ophalen van bestaande documenten); het moet een
+      lijst teruggeven die gelijk loopt met `entries` (None = niets schrijven)
+    - optioneel draait `after_write(entries, failed, upserted)` in dezelfde
+      thread na de bulk_write; `failed` = indexen in `entries` waarvan de write
+      mislukte, `upserted` = indexen die als nieuw document zijn ingevoegd
+    """
+
+    def __init__(self, collection, batch_size: int = 500, flush_interval: float = 2.0,
+                 max_pending: int = 2, on_result: Optional[Callable] = None,
+                 on_error: Optional[Callable] = None, prepare: Optional[Callable] = None,
+                 on_batch: Optional[Callable] = None, after_write: Optional[Callable] = None):
+        self.collection = collection
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.0, float(flush_interval))
+        self.max_pending = max(1, int(max_pending))
+        # on_result(entries, upserted) en on_error(entry, write_error) draaien op de reactor thread;
+        # `upserted` is de set met indexen (in `entries`) die als nieuw document zijn ingevoegd
+        self.on_result = on_result
+        self.on_error = on_error
+        self.prepare = prepare
+        # on_batch(size, seconds): per flush, van inplannen tot klaar (incl. prepare en wachten op een thread)
+        self.on_batch = on_batch
+        self.after_write = after_write
+        self._buffer: Dict[Hashable, Tuple[Any, Any]] = {}
+        self._pending: List[defer.Deferred] = []
+        self._waiters: List[defer.Deferred] = []
+        self._loop: Optional[task.LoopingCall] = None
+        self._last_flush = time.monotonic()
+
+    def start(self):
+        if self.flush_interval and self._loop is None:
+            self._loop = task.LoopingCall(self._tick)
+            self._loop.start(self.flush_interval, now=False)
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def add(self, key: Hashable, op, entry=None) -> Optional[defer.Deferred]:
+        """Voeg een operatie toe. Geeft een Deferred terug als de caller moet wachten."""
+        self._buffer.pop(key, None)
+        self._buffer[key] = (op, entry)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+        if len(self._pending) >= self.max_pending:
+            waiter = defer.Deferred()
+            self._waiters.append(waiter)
+            return waiter
+        return None
+
+    def _tick(self):
+        if self._buffer and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> defer.Deferred:
+        if not self._buffer:
+            return defer.succeed(None)
+        batch = list(self._buffer.values())
+        self._buffer = {}
+        self._last_flush = time.monotonic()
+        d = threads.deferToThread(self._write, batch)
+        d.addCallbacks(self._written, self._failed, callbackArgs=(batch,), errbackArgs=(batch,))
+        d.addErrback(self._callback_failed)
+        if self.on_batch:
+            d.addBoth(self._timed, len(batch), self._last_flush)
+        d.addBoth(self._release, d)
+        self._pending.append(d)
+        return d
+
+    def _write(self, batch):
+        # Draait in een worker thread
+        entries = [entry for _, entry in batch]
+        if self.prepare:
+            ops = self.prepare(entries)
+        else:
+            ops = [op for op, _ in batch]
+        # positions[i] = index in batch van de i-de verstuurde operatie
+        positions = [i for i, op in enumerate(ops) if op is not None]
+        if not positions:
+            return set(), [], positions
+        try:
+            res = self.collection.bulk_write([ops[i] for i in positions], ordered=False)
+            outcome = set(res.upserted_ids or {}), [], positions
+        except BulkWriteError as e:
+            upserted = {u.get('index') for u in e.details.get('upserted', [])}
+            outcome = upserted, e.details.get('writeErrors', []), positions
+        if self.after_write:
+            failed = {positions[err['index']] for err in outcome[1] if err.get('index') is not None
+                      and err['index'] < len(positions)}
+            upserted = {positions[i] for i in outcome[0] if i is not None and i < len(positions)}
+            try:
+                self.after_write(entries, failed, upserted)
+            except Exception:
+                # De writes zelf zijn gelukt; alleen loggen
+                logger.exception("[BulkWriter] after_write mislukt")
+        return outcome
+
+    def _written(self, outcome, batch):
+        sent_upserted, errors, positions = outcome
+        upserted = {positions[i] for i in sent_upserted if i is not None and i < len(positions)}
+        if self.on_error:
+            for err in errors:
+                idx = err.get('index')
+                entry = batch[positions[idx]][1] if idx is not None and idx < len(positions) else None
+                self.on_error(entry, err)
+        if self.on_result:
+            self.on_result([entry for _, entry in batch], upserted)
+
+    def _failed(self, failure, batch):
+        # Hele batch mislukt (verbinding weg, maar ook een fout in prepare): meld per item
+        logger.error("[BulkWriter] batch van %d operaties mislukt:\n%s", len(batch), failure.getTraceback())
+        if self.on_error:
+            for _, entry in batch:
+                self.on_error(entry, {'errmsg': failure.getErrorMessage()})
+
+    def _callback_failed(self, failure):
+        # Fout in on_result/on_error zelf: de writes zijn al gedaan, alleen loggen
+        logger.error("[BulkWriter] afhandeling van een batch mislukt:\n%s", failure.getTraceback())
+
+    def _timed(self, result, size, started):
+        self.on_batch(size, time.monotonic() - started)
+        return result
+
+    def _release(self, result, d):
+        if d in self._pending:
+            self._pending.remove(d)
+        while self._waiters and len(self._pending) < self.max_pending:
+            self._waiters.pop(0).callback(None)
+        return result
+
+    def close(self) -> defer.Deferred:
+        """Stop de timer, flush de rest en wacht op alle lopende writes."""
+        if self._loop is not None and self._loop.running:
+            self._loop.stop()
+        self._loop = None
+        self.flush()
+        waiters, self._waiters = self._waiters, []
+        for w in waiters:
+            w.callback(None)
+        return defer.DeferredList(list(self._pending), consumeErrors=True)
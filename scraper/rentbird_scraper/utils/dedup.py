@@ -0,0 +1,365 @@
+"""
+Dubbele listings over sources heen (dezelfde woning op pararius, funda,
+kamernet, ...): MinHash over een set kenmerken per listing, LSH banden per
+stad, en een gedeelde `canonicalId` op elk document.
+
+- kenmerken: straat (+ huisnummer), prijs/m²/kamers als overlappende
+  buckets gecombineerd met de straat, titelwoorden en fingerprints van de
+  afbeeldingsnamen; de combinaties maken willekeurige listings in dezelfde
+  stad vrijwel disjunct, zodat een bucket klein blijft
+- `SIGNATURE` minhashes in `BANDS` banden; één gedeelde band maakt een
+  kandidaat, `_matches` controleert daarna prijs, m², kamers en huisnummer
+- een kandidaat telt pas als dubbel met ondersteunend bewijs: hetzelfde
+  huisnummer, een gedeelde afbeelding (fingerprint) of een beschrijving met
+  Jaccard >= `MIN_DESC_JACCARD` (geschat uit `DESC_SIGNATURE` minhashes over
+  woord-shingles); prijs/m²/kamers alleen zijn in een stad niet uniek genoeg
+- per listing wordt `dedup: {city, bands[, desc]}` opgeslagen, zodat de index
+  per stad uit Mongo geladen kan worden zonder de signatures opnieuw te berekenen
+- `canonicalId` = kleinste `<source>:<sourceId>` van de groep, onafhankelijk van
+  de volgorde; wijzigt hij (groepen samengevoegd), dan krijgen alle leden de nieuwe
+  (`DedupIndex.relabelled`)
+
+Zie DedupPipeline (tijdens de crawl) en build_dedup.py (offline opnieuw opbouwen).
+"""
+import hashlib
+import os
+import re
+import struct
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from rentbird_scraper.utils.availability import city_key
+
+
+# Velden die de dedup stap op het item zet (buiten de contentHash)
+DEDUP_FIELDS = ('canonicalId', 'dedup')
+
+SIGNATURE = 64
+BANDS = 16
+ROWS = SIGNATURE // BANDS
+# Grootste priem onder 2^57; met de bandindex erboven blijft een band < 2^61
+_BAND_MOD = (1 << 57) - 13
+# Buckets groter dan dit zijn niet onderscheidend (bijv. listings zonder straat) en worden overgeslagen
+MAX_BUCKET = 200
+MIN_FEATURES = 3
+# Beschrijving: minhashes over shingles van SHINGLE woorden; korter dan MIN_SHINGLES telt niet
+DESC_SIGNATURE = 32
+SHINGLE = 4
+MIN_SHINGLES = 8
+MIN_DESC_JACCARD = 0.5
+
+STOPWORDS = {
+    'te', 'huur', 'in', 'de', 'het', 'een', 'van', 'en', 'met', 'op', 'aan', 'bij', 'voor', 'nabij',
+    'appartement', 'studio', 'kamer', 'huis', 'woning', 'woonhuis', 'benedenwoning', 'bovenwoning',
+    'eengezinswoning', 'maisonnette', 'penthouse', 'tussenwoning', 'hoekwoning', 'gemeubileerd',
+    'for', 'rent', 'the', 'apartment', 'room', 'house', 'flat',
+}
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_STREET_RE = re.compile(r'^(.*?)\s+(\d+)\s*([a-z]?)\b')
+# Grootte/variant achtervoegsels in afbeeldingsnamen: -800x600, _large, @2x
+_IMAGE_SUFFIX_RE = re.compile(r'([-_@]\d+x\d*|[-_@]\d+x|[-_](small|medium|large|thumb|original|xl|lg|md|sm))+$')
+
+
+def dedup_enabled() -> bool:
+    return os.getenv('SCRAPER_DEDUP', '1') == '1'
+
+
+def listing_key(source: str, source_id: str) -> str:
+    return f"{source}:{source_id}"
+
+
+def _fold(text: Optional[str]) -> str:
+    if not text:
+        return ''
+    text = str(text).lower()
+    if text.isascii():
+        return text
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def _tokens(text: Optional[str]) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(_fold(text)) if t not in STOPWORDS and (len(t) > 2 or t.isdigit())]
+
+
+def split_street(street: Optional[str]):
+    """'Keizersgracht 12-A' -> ('keizersgracht', '12a'); zonder huisnummer ('keizersgracht', None)."""
+    folded = ' '.join(_TOKEN_RE.findall(_fold(street)))
+    if not folded:
+        return None, None
+    m = _STREET_RE.match(folded + ' ')
+    if m and m.group(1):
+        return m.group(1), m.group(2) + m.group(3)
+    return folded, None
+
+
+def image_fingerprint(url: str) -> Optional[str]:
+    name = url.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1].lower()
+    name = _IMAGE_SUFFIX_RE.sub('', name.rsplit('.', 1)[0])
+    return name if len(name) >= 6 and not name.isdigit() else None
+
+
+def image_fingerprints(images) -> frozenset:
+    out = set()
+    for url in (images or [])[:8]:
+        fp = image_fingerprint(url) if isinstance(url, str) else None
+        if fp:
+            out.add(fp)
+    return frozenset(out)
+
+
+_unpack_desc = struct.Struct(f'>{DESC_SIGNATURE}I').unpack
+
+
+def description_signature(text: Optional[str]) -> Optional[List[int]]:
+    """Minhash over woord-shingles van de beschrijving; None als hij te kort is."""
+    words = _TOKEN_RE.findall(_fold(text))
+    shingles = {' '.join(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    # Geen lru_cache zoals _row: shingles komen zelden terug
+    rows = [_unpack_desc(hashlib.shake_128(s.encode('utf8')).digest(DESC_SIGNATURE * 4)) for s in shingles]
+    return list(map(min, zip(*rows)))
+
+
+def _number(value) -> Optional[float]:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0 else None
+
+
+def _buckets(value: Optional[float], width: float) -> List[int]:
+    # Twee overlappende buckets, zodat 1249 en 1251 er minstens één delen
+    if value is None:
+        return []
+    return sorted({int(value // width), int((value + width / 2) // width)})
+
+
+def features(item: Dict[str, Any]) -> Set[str]:
+    address = item.get('address') or {}
+    street, number = split_street(address.get('street'))
+    price = _number(item.get('price'))
+    size = _number(item.get('size'))
+    rooms = _number(item.get('rooms'))
+    out = set()
+    prices = _buckets(price, 50)
+    sizes = _buckets(size, 5)
+    for p in prices:
+        for s in sizes:
+            out.add(f"ps:{p}|{s}")
+    if rooms is not None:
+        out.update(f"sr:{s}|{rooms:g}" for s in sizes)
+    if street:
+        out.add(f"st:{street}")
+        if number:
+            out.add(f"nr:{street}|{number}")
+        out.update(f"sp:{street}|{p}" for p in prices)
+        out.update(f"ss:{street}|{s}" for s in sizes)
+    out.update(f"t:{t}" for t in _tokens(item.get('title')))
+    out.update(f"i:{fp}" for fp in image_fingerprints(item.get('images')))
+    return out
+
+
+_unpack = struct.Struct(f'>{SIGNATURE}I').unpack
+
+
+@lru_cache(maxsize=4096)
+def _row(feature: str):
+    # Straat- en bucketkenmerken komen vaak terug; de cache spaart de hash
+    return _unpack(hashlib.shake_128(feature.encode('utf8')).digest(SIGNATURE * 4))
+
+
+def minhash(feats: Iterable[str]) -> List[int]:
+    """
+    `SIGNATURE` onafhankelijke 32-bit hashes per kenmerk in één shake_128 call,
+    daarna het minimum per positie (zip/min in C, geen Python lus per permutatie).
+    """
+    rows = [_row(f) for f in feats]
+    return list(map(min, zip(*rows))) if rows else [0] * SIGNATURE
+
+
+def bands(signature: List[int]) -> List[int]:
+    """Eén waarde per band (past in een Mongo int64); de bandindex zit in de bovenste bits."""
+    out = []
+    for i in range(BANDS):
+        packed = 0
+        for v in signature[i * ROWS:(i + 1) * ROWS]:
+            packed = (packed << 32) | v
+        out.append((i << 57) | (packed % _BAND_MOD))
+    return out
+
+
+def _close(a: Optional[float], b: Optional[float], rel: float, absolute: float) -> bool:
+    return a is None or b is None or abs(a - b) <= max(absolute, rel * max(a, b))
+
+
+class _Listing:
+    __slots__ = ('key', 'source', 'price', 'size', 'rooms', 'number', 'images', 'desc', 'canonical', 'bands')
+
+    def __init__(self, key, source, price, size, rooms, number, images, desc, canonical, bands):
+        self.key = key
+        self.source = source
+        self.price = price
+        self.size = size
+        self.rooms = rooms
+        self.number = number
+        self.images = images
+        self.desc = desc
+        self.canonical = canonical
+        self.bands = bands
+
+
+def _corroborated(a: _Listing, b: _Listing) -> bool:
+    if a.number and a.number == b.number:
+        return True
+    if a.images & b.images:
+        return True
+    if a.desc and b.desc:
+        same = sum(1 for x, y in zip(a.desc, b.desc) if x == y)
+        return same >= MIN_DESC_JACCARD * DESC_SIGNATURE
+    return False
+
+
+def _matches(a: _Listing, b: _Listing) -> bool:
+    if a.source == b.source:
+        return False
+    # Minstens prijs of m² moet aan beide kanten bekend zijn
+    if (a.price is None or b.price is None) and (a.size is None or b.size is None):
+        return False
+    if a.number and b.number and a.number != b.number:
+        return False
+    # Sources tellen kamers verschillend (wel/niet de woonkamer)
+    if a.rooms is not None and b.rooms is not None and abs(a.rooms - b.rooms) > 1:
+        return False
+    if not (_close(a.price, b.price, 0.05, 25) and _close(a.size, b.size, 0.05, 3)):
+        return False
+    return _corroborated(a, b)
+
+
+class _CityIndex:
+    def __init__(self):
+        self.buckets: Dict[int, List[str]] = {}
+        self.listings: Dict[str, _Listing] = {}
+        # canonicalId -> keys van de groep (alleen groepen met meer dan de canonical zelf zijn interessant)
+        self.members: Dict[str, Set[str]] = {}
+
+    def add(self, listing: _Listing):
+        old = self.listings.get(listing.key)
+        if old is not None:
+            for band in old.bands:
+                bucket = self.buckets.get(band)
+                if bucket and listing.key in bucket:
+                    bucket.remove(listing.key)
+            self._leave(old)
+        self.listings[listing.key] = listing
+        for band in listing.bands:
+            self.buckets.setdefault(band, []).append(listing.key)
+        self.members.setdefault(listing.canonical, set()).add(listing.key)
+
+    def _leave(self, listing: _Listing):
+        group = self.members.get(listing.canonical)
+        if group is not None:
+            group.discard(listing.key)
+            if not group:
+                del self.members[listing.canonical]
+
+    def relabel(self, old: str, new: str) -> List[str]:
+        """Alle leden van groep `old` naar canonical `new`; geeft hun keys terug."""
+        keys = self.members.pop(old, set())
+        for key in keys:
+            self.listings[key].canonical = new
+        self.members.setdefault(new, set()).update(keys)
+        return sorted(keys)
+
+    def candidates(self, listing: _Listing) -> Counter:
+        shared = Counter()
+        for band in listing.bands:
+            bucket = self.buckets.get(band)
+            if bucket and len(bucket) <= MAX_BUCKET:
+                shared.update(k for k in bucket if k != listing.key)
+        return shared
+
+
+class DedupIndex:
+    """
+    LSH index per stad (`city_key`). `load` haalt één stad uit Mongo en mag in
+    een worker thread draaien; `assign` draait op de reactor thread.
+    """
+
+    def __init__(self):
+        self.cities: Dict[str, _CityIndex] = {}
+        # (key, canonicalId) van eerder opgenomen listings waarvan de canonical door `assign` veranderde;
+        # de aanroeper schrijft ze weg en leegt de lijst
+        self.relabelled: List[tuple] = []
+
+    def __len__(self):
+        return sum(len(c.listings) for c in self.cities.values())
+
+    def loaded(self, city: str) -> bool:
+        return city in self.cities
+
+    def load(self, collection, city: str) -> int:
+        index = _CityIndex()
+        cursor = collection.find(
+            {"dedup.city": city, "isStillAvailable": {"$ne": False}},
+            {"_id": 0, "source": 1, "sourceId": 1, "price": 1, "size": 1, "rooms": 1, "address.street": 1,
+             "images": 1, "canonicalId": 1, "dedup.bands": 1, "dedup.desc": 1},
+            batch_size=5000,
+        )
+        for doc in cursor:
+            dedup = doc.get('dedup') or {}
+            if not dedup.get('bands') or not doc.get('source') or not doc.get('sourceId'):
+                continue
+            index.add(self._listing(doc, dedup['bands'], dedup.get('desc'), doc.get('canonicalId')))
+        self.cities[city] = index
+        return len(index.listings)
+
+    def mark_loaded(self, city: str):
+        self.cities.setdefault(city, _CityIndex())
+
+    def canonical(self, city: str, key: str) -> Optional[str]:
+        index = self.cities.get(city)
+        listing = index.listings.get(key) if index is not None else None
+        return listing.canonical if listing is not None else None
+
+    @staticmethod
+    def _listing(item, band_hashes, desc=None, canonical=None) -> _Listing:
+        key = listing_key(item['source'], item['sourceId'])
+        _, number = split_street((item.get('address') or {}).get('street'))
+        return _Listing(key, item['source'], _number(item.get('price')), _number(item.get('size')),
+                        _number(item.get('rooms')), number, image_fingerprints(item.get('images')),
+                        tuple(desc) if desc else None, canonical or key, band_hashes)
+
+    def assign(self, item: Dict[str, Any]) -> Optional[str]:
+        """
+        Zet `canonicalId` en `dedup` op het item en neemt het op in de index.
+        Geeft de key van de gevonden dubbele listing terug (None = uniek).
+        Leden van samengevoegde groepen komen in `relabelled`.
+        """
+        city = city_key((item.get('address') or {}).get('city'))
+        key = listing_key(item['source'], item['sourceId'])
+        feats = features(item)
+        if len(feats) < MIN_FEATURES:
+            item['canonicalId'] = key
+            return None
+        desc = description_signature(item.get('description'))
+        listing = self._listing(item, bands(minhash(feats)), desc)
+        index = self.cities.setdefault(city, _CityIndex())
+        best = None
+        canonicals = set()
+        for other_key, shared in index.candidates(listing).most_common():
+            other = index.listings[other_key]
+            if _matches(listing, other):
+                canonicals.add(other.canonical)
+                if best is None:
+                    best = other
+        # Kleinste key van de groep: dezelfde uitkomst in elke volgorde en in elke shard
+        listing.canonical = min(canonicals | {key})
+        index.add(listing)
+        for old in sorted(canonicals - {listing.canonical}):
+            self.relabelled.extend((k, listing.canonical) for k in index.relabel(old, listing.canonical) if k != key)
+        item['canonicalId'] = listing.canonical
+        item['dedup'] = {'city': city, 'bands': listing.bands}
+        if desc:
+            item['dedup']['desc'] = desc
+        return best.key if best is not None else None
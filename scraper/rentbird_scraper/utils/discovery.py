@@ -0,0 +1,135 @@
+"""
+Discovery via sitemaps en feeds (zie `discovery` in de source config).
+
+De parsers lezen de body in blokken met een lxml pull parser en ruimen elk
+verwerkt element direct op, zodat er nooit een volledige boom van een
+sitemap met tienduizenden URLs in het geheugen staat. Een `.xml.gz`
+sitemap wordt blok voor blok gedecomprimeerd.
+
+- XML sitemap (`<urlset>`) en sitemap index (`<sitemapindex>`)
+- RSS (`<item><link>`, `pubDate`) en Atom (`<entry><link href>`, `updated`)
+- JSON Feed (`items[].url`, `date_modified`); die wordt wel in één keer geladen
+- robots.txt: de `Sitemap:` regels
+"""
+import datetime as dt
+import json
+import zlib
+from email.utils import parsedate_to_datetime
+from typing import Iterator, NamedTuple, Optional
+
+from lxml import etree
+
+
+URL, SITEMAP = 'url', 'sitemap'
+CHUNK = 64 * 1024
+# Limiet op de gedecomprimeerde grootte van een .gz sitemap (spec: max 50 MB)
+MAX_BYTES = 200 * 1024 * 1024
+
+_ENTRY_TAGS = {'url': URL, 'sitemap': SITEMAP, 'item': URL, 'entry': URL}
+_DATE_TAGS = ('lastmod', 'updated', 'pubDate', 'modified', 'published', 'date')
+
+
+class Entry(NamedTuple):
+    kind: str
+    loc: str
+    lastmod: Optional[float]
+
+
+def parse_lastmod(value) -> Optional[float]:
+    """W3C datetime (sitemap/Atom) of RFC 822 (RSS) naar epoch seconden; onbekend = None."""
+    if not value or not isinstance(value, str):
+        return None
+    value = value.strip()
+    try:
+        ts = dt.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        try:
+            ts = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=dt.timezone.utc)
+    return ts.timestamp()
+
+
+def _chunks(body: bytes) -> Iterator[bytes]:
+    if body[:2] == b'\x1f\x8b':
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        total = 0
+        for i in range(0, len(body), CHUNK):
+            out = d.decompress(body[i:i + CHUNK])
+            total += len(out)
+            if total > MAX_BYTES:
+                raise ValueError(f"sitemap groter dan {MAX_BYTES} bytes")
+            yield out
+        yield d.flush()
+        return
+    for i in range(0, len(body), CHUNK):
+        yield body[i:i + CHUNK]
+
+
+def _local(tag) -> str:
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+def _entry(elem) -> Optional[Entry]:
+    kind = _ENTRY_TAGS[_local(elem.tag)]
+    loc = None
+    lastmod = None
+    for child in elem:
+        name = _local(child.tag)
+        if name in ('loc', 'link') and loc is None:
+            # Atom: <link rel="alternate" href="..."/>, RSS/sitemap: tekst
+            if child.get('rel') not in (None, 'alternate'):
+                continue
+            loc = (child.get('href') or child.text or '').strip() or None
+        elif name in _DATE_TAGS and lastmod is None:
+            lastmod = parse_lastmod(child.text)
+    return Entry(kind, loc, lastmod) if loc else None
+
+
+def iter_xml(body: bytes) -> Iterator[Entry]:
+    """Sitemap, sitemap index, RSS of Atom; elementen worden na verwerking vrijgegeven."""
+    # Alleen events voor de entry elementen (met of zonder namespace)
+    tags = [f"{{*}}{t}" for t in _ENTRY_TAGS]
+    parser = etree.XMLPullParser(events=('end',), tag=tags, resolve_entities=False, no_network=True, huge_tree=True)
+    for chunk in _chunks(body):
+        parser.feed(chunk)
+        for _, elem in parser.read_events():
+            entry = _entry(elem)
+            elem.clear()
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
+            if entry is not None:
+                yield entry
+    parser.close()
+
+
+def iter_json_feed(body: bytes) -> Iterator[Entry]:
+    data = json.loads(body)
+    for item in (data.get('items') if isinstance(data, dict) else None) or []:
+        if not isinstance(item, dict):
+            continue
+        loc = item.get('url') or item.get('external_url')
+        if loc:
+            yield Entry(URL, loc, parse_lastmod(item.get('date_modified') or item.get('date_published')))
+
+
+def iter_robots(body: bytes) -> Iterator[Entry]:
+    for line in body.decode('utf-8', errors='ignore').splitlines():
+        key, _, value = line.partition(':')
+        if key.strip().lower() == 'sitemap' and value.strip():
+            yield Entry(SITEMAP, value.strip(), None)
+
+
+def iter_entries(body: bytes, url: str = '', content_type: str = '') -> Iterator[Entry]:
+    """Kiest de parser op basis van URL, content type en het begin van de body."""
+    path = url.split('?', 1)[0].lower()
+    if path.endswith('/robots.txt'):
+        return iter_robots(body)
+    head = body[:64].lstrip()
+    if 'json' in content_type.lower() or path.endswith('.json') or head[:1] in (b'{', b'['):
+        return iter_json_feed(body)
+    return iter_xml(body)
@@ -0,0 +1,81 @@
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+
+# Velden die de inhoud van een advertentie bepalen. Timestamps, beschikbaarheid
+# en interne velden (raw, approvalStatus) tellen niet mee voor de fingerprint.
+CONTENT_FIELDS = (
+    'title',
+    'sourceUrl',
+    'address.city',
+    'address.street',
+    'price',
+    'size',
+    'rooms',
+    'furnished',
+    'petsAllowed',
+    'images',
+    'description',
+    'offeredSince',
+)
+
+
+def get_path(doc: Optional[Dict[str, Any]], path: str) -> Any:
+    cur: Any = doc
+    for part in path.split('.'):
+        if not isinstance(cur, dict):
+            return None
+        cur = cur.get(part)
+    return cur
+
+
+def has_path(doc: Optional[Dict[str, Any]], path: str) -> bool:
+    cur: Any = doc
+    for part in path.split('.'):
+        if not isinstance(cur, dict) or part not in cur:
+            return False
+        cur = cur[part]
+    return True
+
+
+def normalize_value(value: Any) -> Any:
+    """Maak waarden vergelijkbaar: strings gestript, 2 == 2.0, lege strings als None."""
+    if isinstance(value, str):
+        value = ' '.join(value.split())
+        return value or None
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        f = float(value)
+        return int(f) if f.is_integer() else round(f, 2)
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(v) for v in value]
+    if isinstance(value, dict):
+        return {k: normalize_value(v) for k, v in sorted(value.items())}
+    return str(value)
+
+
+def content_fields(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {path: normalize_value(get_path(item, path)) for path in CONTENT_FIELDS}
+
+
+def content_hash(item: Dict[str, Any]) -> str:
+    """Stabiele fingerprint van de genormaliseerde advertentievelden."""
+    payload = json.dumps(content_fields(item), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def changed_fields(item: Dict[str, Any], doc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Geeft {dotted path: nieuwe waarde} voor velden die afwijken van het opgeslagen
+    document. Velden die het item niet levert blijven ongemoeid.
+    """
+    changes = {}
+    for path in CONTENT_FIELDS:
+        if not has_path(item, path):
+            continue
+        new = get_path(item, path)
+        if normalize_value(new) != normalize_value(get_path(doc, path)):
+            changes[path] = new
+    return changes
@@ -0,0 +1,133 @@
+"""
+Freshness-first volgorde van requests: Scrapy haalt requests met een hogere
+`priority` eerder uit de scheduler, dus nieuwe listings op de eerste
+lijstpagina's gaan vóór diepe paginering en her-checks van andere steden.
+
+Lagen (van hoog naar laag), binnen een laag de vraag per stad erbij:
+- detailpagina van een onbekende sourceId (`NEW_DETAIL`, iets lager per pagina diep)
+- lijstpagina's en sitemaps (`LIST`, `PAGE_STEP` lager per pagina)
+- detailpagina die volgens de sitemap lastmod gewijzigd is (`MODIFIED`)
+- her-check van een bekende listing (`RECHECK`)
+
+Vraag per stad = aantal gebruikers met die stad in `preferences.cities`
+(collectie `users`, zoals de matcher), geschaald naar 0..`DEMAND_MAX`; per
+proces gecachet en na SCRAPER_DEMAND_REFRESH_MINUTES (60) opnieuw geladen
+(alleen relevant voor run_daemon.py). Het laden scant `users` en gebeurt in
+een worker thread bij spider_opened; tot de vraag er is geldt geen vraag. Zonder Mongo of met SCRAPER_FRESHNESS=0
+telt de vraag niet mee of is alles priority 0 (volgorde zoals de spider ze yieldt).
+"""
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from rentbird_scraper.utils.availability import city_key
+
+
+logger = logging.getLogger(__name__)
+
+NEW_DETAIL = 300
+LIST = 200
+MODIFIED = 100
+RECHECK = 0
+# Pagina n zakt (n-1) stappen; de vraag blijft kleiner dan een stap, dus
+# pagina 1 van een stille stad gaat vóór pagina 2 van Amsterdam
+PAGE_STEP = 10
+DEMAND_MAX = PAGE_STEP - 1
+MAX_DEPTH = 9
+
+_demand: Optional[Dict[str, int]] = None
+_demand_at = 0.0
+_demand_lock = threading.Lock()
+
+
+def freshness_enabled() -> bool:
+    return os.getenv('SCRAPER_FRESHNESS', '1') == '1'
+
+
+def load_demand(db) -> Dict[str, int]:
+    """city_key -> aantal gebruikers met die stad in hun voorkeuren."""
+    query = {'preferences.cities.0': {'$exists': True}}
+    if os.getenv('SCRAPER_DEMAND_ACTIVE_ONLY', '1') == '1':
+        # Zelfde gebruikers als de matcher (MATCH_REQUIRE_ACTIVE_SUBSCRIPTION)
+        query['subscription.status'] = 'active'
+    counts: Dict[str, int] = {}
+    users = db.get_collection(os.getenv('SCRAPER_USERS_COLLECTION', 'users'))
+    for doc in users.find(query, {'_id': 0, 'preferences.cities': 1}, batch_size=5000):
+        for city in {city_key(c) for c in (doc.get('preferences') or {}).get('cities') or [] if isinstance(c, str)}:
+            counts[city] = counts.get(city, 0) + 1
+    return counts
+
+
+def cached_demand() -> Optional[Dict[str, int]]:
+    """De gecachete vraag als die nog vers is, anders None (blokkeert niet)."""
+    max_age = float(os.getenv('SCRAPER_DEMAND_REFRESH_MINUTES', '60')) * 60
+    if _demand is not None and time.time() - _demand_at < max_age:
+        return _demand
+    return None
+
+
+def city_demand() -> Dict[str, int]:
+    """
+    Vraag per stad uit Mongo, gecachet per proces (leeg zonder MONGODB_URI of bij
+    een fout). Blokkeert: aanroepen vanuit een worker thread. Spiders die tegelijk
+    starten wachten op dezelfde load in plaats van `users` elk te scannen.
+    """
+    global _demand, _demand_at
+    with _demand_lock:
+        cached = cached_demand()
+        if cached is not None:
+            return cached
+        demand: Dict[str, int] = {}
+        if freshness_enabled() and os.getenv('MONGODB_URI'):
+            from rentbird_scraper.utils.mongo import get_client, get_database
+            client = None
+            try:
+                client = get_client()
+                demand = load_demand(get_database(client))
+            except Exception as e:
+                logger.warning(f"[freshness] vraag per stad niet geladen: {e}")
+            finally:
+                if client is not None:
+                    client.close()
+        _demand, _demand_at = demand, time.time()
+        return demand
+
+
+class FreshnessModel:
+    """Request priority per soort request, pagina en stad (zie de module docstring)."""
+
+    def __init__(self, demand: Optional[Dict[str, int]] = None, enabled: bool = True):
+        self.enabled = enabled
+        demand = demand or {}
+        top = max(demand.values(), default=0)
+        # Log-schaal: 1 vs 10 gebruikers maakt meer uit dan 1000 vs 1010
+        self.weights = {city: round(DEMAND_MAX * math.log1p(n) / math.log1p(top))
+                        for city, n in demand.items() if n > 0} if top > 0 else {}
+
+    def demand(self, city: Optional[str]) -> int:
+        return self.weights.get(city_key(city), 0) if city else 0
+
+    @staticmethod
+    def _depth(page: Optional[int]) -> int:
+        return min(max(int(page or 1), 1) - 1, MAX_DEPTH)
+
+    def list_priority(self, city: Optional[str], page: Optional[int] = 1) -> int:
+        if not self.enabled:
+            return 0
+        return LIST - PAGE_STEP * self._depth(page) + self.demand(city)
+
+    def detail_priority(self, city: Optional[str], page: Optional[int] = 1, known: bool = False,
+                        modified: bool = False) -> int:
+        if not self.enabled:
+            return 0
+        if modified:
+            base = MODIFIED
+        elif known:
+            base = RECHECK
+        else:
+            # Onbekend op een diepe pagina is meestal een oude listing die we gemist hebben
+            base = NEW_DETAIL - PAGE_STEP * self._depth(page) // 2
+        return base + self.demand(city)
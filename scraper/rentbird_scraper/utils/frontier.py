@@ -0,0 +1,120 @@
+"""
+Run-brede frontier: elke listing (source, sourceId) wordt per run maximaal één
+keer opgehaald, ook als dezelfde detail-URL op meerdere lijstpagina's, start-
+templates of met andere query/tracking parameters voorkomt.
+
+De set bewaart alleen 64-bit hashes in een open-addressing tabel (`array('Q')`),
+dus 16–32 bytes per listing (vulling 25–50%): 100k listings ≈ 2–4 MB.
+"""
+import threading
+from array import array
+from hashlib import blake2b
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+TRACKING_PARAMS = frozenset({'fbclid', 'gclid', 'msclkid', 'mc_cid', 'mc_eid'})
+
+
+def canonical_url(url: str, keep_slash: bool = False) -> str:
+    """Host lowercase, geen fragment, geen utm_*/tracking params en (tenzij `keep_slash`) geen trailing slash."""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if not k.lower().startswith('utm_') and k.lower() not in TRACKING_PARAMS]
+    path = parts.path if keep_slash else (parts.path.rstrip('/') or '/')
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query if keep_slash else sorted(query)), ''))
+
+
+class HashSet64:
+    """Compacte set van 64-bit hashes (lineair proberen, 0 = leeg slot)."""
+
+    def __init__(self, capacity: int = 1 << 14):
+        size = 1
+        while size < capacity * 2:
+            size <<= 1
+        self._table = array('Q', bytes(8 * size))
+        self._mask = size - 1
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def nbytes(self) -> int:
+        return self._table.itemsize * len(self._table)
+
+    def _slot(self, h: int) -> int:
+        i = h & self._mask
+        table = self._table
+        while True:
+            cur = table[i]
+            if cur == 0 or cur == h:
+                return i
+            i = (i + 1) & self._mask
+
+    def add(self, h: int) -> bool:
+        """True als `h` nieuw was."""
+        h = h or 1
+        i = self._slot(h)
+        if self._table[i] == h:
+            return False
+        self._table[i] = h
+        self._len += 1
+        if self._len * 2 > len(self._table):
+            self._grow()
+        return True
+
+    def __contains__(self, h: int) -> bool:
+        h = h or 1
+        return self._table[self._slot(h)] == h
+
+    def _grow(self):
+        old = self._table
+        self._table = array('Q', bytes(8 * len(old) * 2))
+        self._mask = len(self._table) - 1
+        for h in old:
+            if h:
+                self._table[self._slot(h)] = h
+
+
+def listing_key(source: str, source_id: Optional[str], url: str) -> int:
+    """64-bit key voor (source, sourceId); zonder sourceId de canonieke URL."""
+    ident = source_id if source_id else canonical_url(url)
+    digest = blake2b(f"{source}\x00{ident}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class Frontier:
+    """Eén per source per run (zie get_frontier); de key bevat ook de source."""
+
+    def __init__(self, capacity: int = 1 << 14):
+        self._seen = HashSet64(capacity)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._seen)
+
+    @property
+    def nbytes(self) -> int:
+        return self._seen.nbytes
+
+    def claim(self, source: str, source_id: Optional[str], url: str) -> bool:
+        """True als de listing deze run nog niet ingepland was (en claimt hem)."""
+        key = listing_key(source, source_id, url)
+        with self._lock:
+            return self._seen.add(key)
+
+
+_frontiers: Dict[str, Frontier] = {}
+
+
+def get_frontier(source: str) -> Frontier:
+    frontier = _frontiers.get(source)
+    if frontier is None:
+        frontier = _frontiers[source] = Frontier()
+    return frontier
+
+
+def reset_frontier(source: str):
+    """Nieuwe run van deze source in hetzelfde proces (run_daemon.py)."""
+    _frontiers.pop(source, None)
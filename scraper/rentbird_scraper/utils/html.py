@@ -0,0 +1,237 @@
+"""
+HTML parser-abstractie voor alle spiders.
+
+Backends:
+- `bs4`    – BeautifulSoup met html.parser (oude gedrag, standaard)
+- `lxml`   – lxml.html met via cssselect vertaalde, gecachte XPath expressies
+- `parsel` – Scrapy/parsel Selector (ook lxml onder de motorkap)
+
+Alle backends ondersteunen dezelfde CSS selectors uit de source configs en
+geven nodes terug met de bs4-achtige API die de spiders al gebruiken:
+`node.get(attr)`, `node[attr]` en `node.get_text(sep, strip=True)`.
+`page.text()` is de (gecachte) `get_text(' ', strip=True)` van de hele pagina.
+"""
+import os
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import List, Optional
+
+
+BACKENDS = ('bs4', 'lxml', 'parsel')
+DEFAULT_BACKEND = 'bs4'
+
+# Tekst binnen deze elementen telt (net als bij bs4) niet mee in get_text
+_TEXT_XPATH = ".//text()[not(ancestor::script) and not(ancestor::style) and not(ancestor::template)]"
+_HIDDEN_TAGS = ['script', 'style', 'template']
+# $n wordt bij het aanroepen meegegeven; alleen zichtbare tekst (geen scripts, styles of comments)
+_CONTAINS_XPATH = "//text()[contains(., $n)][not(ancestor::script) and not(ancestor::style) and not(ancestor::template)]"
+
+
+def resolve_backend(source_cfg: Optional[dict] = None, override: Optional[str] = None) -> str:
+    """Volgorde: expliciete override (spider arg) > `parser` in source config > SCRAPER_PARSER > bs4."""
+    backend = override or (source_cfg or {}).get('parser') or os.getenv('SCRAPER_PARSER') or DEFAULT_BACKEND
+    backend = backend.strip().lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Onbekende parser backend: {backend} (kies uit {', '.join(BACKENDS)})")
+    return backend
+
+
+def parse_page(body, encoding: Optional[str] = None, backend: str = DEFAULT_BACKEND, url: Optional[str] = None) -> 'Page':
+    """`body` mag bytes (met `encoding`) of str zijn."""
+    if backend == 'lxml':
+        return LxmlPage(body, encoding)
+    if backend == 'parsel':
+        return ParselPage(body, encoding, url)
+    return Bs4Page(body, encoding)
+
+
+def page_for(response, backend: str = DEFAULT_BACKEND) -> 'Page':
+    """Page voor een Scrapy response."""
+    if backend == 'bs4':
+        return Bs4Page(response.text)
+    return parse_page(response.body, response.encoding, backend, response.url)
+
+
+def _join_texts(texts, sep: str, strip: bool) -> str:
+    if strip:
+        texts = [t.strip() for t in texts]
+        texts = [t for t in texts if t]
+    return sep.join(texts)
+
+
+class Page(ABC):
+    backend = None
+
+    def __init__(self):
+        self._text = None
+
+    @abstractmethod
+    def select(self, css: str) -> list:
+        ...
+
+    @abstractmethod
+    def select_one(self, css: str):
+        ...
+
+    @abstractmethod
+    def first_text_containing(self, needle: str) -> Optional[str]:
+        """
+        Eerste zichtbare tekst-node met `needle`; tekst in scripts, styles,
+        templates en comments telt niet mee (bijv. een `€` in tracking JSON).
+        """
+
+    @abstractmethod
+    def _full_text(self) -> str:
+        ...
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self._full_text()
+        return self._text
+
+    def close(self):
+        """Geef de parse tree direct vrij (grote pagina's niet laten hangen tot de GC)."""
+        self._text = None
+
+
+class Bs4Page(Page):
+    backend = 'bs4'
+
+    def __init__(self, body, encoding: Optional[str] = None):
+        super().__init__()
+        from bs4 import BeautifulSoup
+        if isinstance(body, bytes):
+            body = body.decode(encoding or 'utf-8', errors='replace')
+        self.soup = BeautifulSoup(body, 'html.parser')
+
+    def select(self, css: str) -> list:
+        return self.soup.select(css)
+
+    def select_one(self, css: str):
+        return self.soup.select_one(css)
+
+    def first_text_containing(self, needle: str) -> Optional[str]:
+        from bs4.element import NavigableString, PreformattedString
+        return self.soup.find(string=lambda t: isinstance(t, NavigableString) and needle in t
+                              and not isinstance(t, PreformattedString)
+                              and t.find_parent(_HIDDEN_TAGS) is None)
+
+    def _full_text(self) -> str:
+        return self.soup.get_text(' ', strip=True)
+
+    def close(self):
+        super().close()
+        if self.soup is not None:
+            self.soup.decompose()
+            self.soup = None
+
+
+@lru_cache(maxsize=512)
+def css_xpath(css: str):
+    """CSS -> gecompileerde lxml XPath (gecachet per selector)."""
+    from cssselect import HTMLTranslator
+    from lxml import etree
+    return etree.XPath(HTMLTranslator().css_to_xpath(css))
+
+
+@lru_cache(maxsize=None)
+def _xpath(expr: str):
+    from lxml import etree
+    return etree.XPath(expr)
+
+
+class LxmlNode:
+    __slots__ = ('el',)
+
+    def __init__(self, el):
+        self.el = el
+
+    def get(self, attr: str, default=None):
+        return self.el.get(attr, default)
+
+    def __getitem__(self, attr: str):
+        value = self.el.get(attr)
+        if value is None:
+            raise KeyError(attr)
+        return value
+
+    def get_text(self, sep: str = '', strip: bool = False) -> str:
+        return _join_texts(_xpath(_TEXT_XPATH)(self.el), sep, strip)
+
+
+class LxmlPage(Page):
+    backend = 'lxml'
+
+    def __init__(self, body, encoding: Optional[str] = None):
+        super().__init__()
+        import lxml.html
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+            encoding = 'utf-8'
+        parser = lxml.html.HTMLParser(encoding=encoding or 'utf-8')
+        self.root = lxml.html.document_fromstring(body or b'<html></html>', parser=parser)
+
+    def select(self, css: str) -> List[LxmlNode]:
+        return [LxmlNode(el) for el in css_xpath(css)(self.root)]
+
+    def select_one(self, css: str) -> Optional[LxmlNode]:
+        found = css_xpath(css)(self.root)
+        return LxmlNode(found[0]) if found else None
+
+    def first_text_containing(self, needle: str) -> Optional[str]:
+        for node in _xpath(_CONTAINS_XPATH)(self.root, n=needle):
+            return str(node)
+        return None
+
+    def _full_text(self) -> str:
+        return _join_texts(_xpath(_TEXT_XPATH)(self.root), ' ', True)
+
+    def close(self):
+        super().close()
+        self.root = None
+
+
+class ParselNode:
+    __slots__ = ('sel',)
+
+    def __init__(self, sel):
+        self.sel = sel
+
+    def get(self, attr: str, default=None):
+        return self.sel.attrib.get(attr, default)
+
+    def __getitem__(self, attr: str):
+        return self.sel.attrib[attr]
+
+    def get_text(self, sep: str = '', strip: bool = False) -> str:
+        return _join_texts(self.sel.xpath(_TEXT_XPATH).getall(), sep, strip)
+
+
+class ParselPage(Page):
+    backend = 'parsel'
+
+    def __init__(self, body, encoding: Optional[str] = None, url: Optional[str] = None):
+        super().__init__()
+        from parsel import Selector
+        if isinstance(body, bytes):
+            self.sel = Selector(body=body, encoding=encoding or 'utf-8', base_url=url)
+        else:
+            self.sel = Selector(text=body, base_url=url)
+
+    def select(self, css: str) -> List[ParselNode]:
+        return [ParselNode(s) for s in self.sel.css(css)]
+
+    def select_one(self, css: str) -> Optional[ParselNode]:
+        found = self.sel.css(css)
+        return ParselNode(found[0]) if found else None
+
+    def first_text_containing(self, needle: str) -> Optional[str]:
+        found = self.sel.xpath(_CONTAINS_XPATH, n=needle)
+        return found[0].get() if found else None
+
+    def _full_text(self) -> str:
+        return _join_texts(self.sel.xpath(_TEXT_XPATH).getall(), ' ', True)
+
+    def close(self):
+        super().close()
+        self.sel = None
@@ -0,0 +1,135 @@
+import datetime as dt
+import os
+import time
+from typing import Dict, Optional, Set
+
+
+# Delta's overlappen iets, tegen klokverschil tussen hosts en lopende bulk writes
+DELTA_OVERLAP_SECONDS = 120
+
+
+class _Snapshot:
+    __slots__ = ('checked', 'loaded_at', 'full_at')
+
+    def __init__(self, checked: Dict[str, int], now: float):
+        self.checked = checked
+        self.loaded_at = now
+        self.full_at = now
+
+
+# source -> laatst geladen stand uit Mongo, tussen runs in één proces (run_daemon.py); None = uit
+_snapshots: Optional[Dict[str, _Snapshot]] = None
+
+
+def keep_between_runs(enabled: bool = True):
+    global _snapshots
+    _snapshots = {} if enabled else None
+
+
+def _full_reload_seconds() -> float:
+    return float(os.getenv('SCRAPER_KNOWN_FULL_RELOAD_MINUTES', '60')) * 60
+
+
+def to_epoch(ts) -> int:
+    # Mongo levert naive UTC datetimes (datetime.utcnow in de pipeline)
+    if isinstance(ts, dt.datetime):
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=dt.timezone.utc)
+        return int(ts.timestamp())
+    return 0
+
+
+class KnownListingIndex:
+    """
+    Compacte in-memory index van sourceId -> lastCheckedAt (epoch seconden)
+    voor één source. Wordt bij het openen van de spider uit Mongo geladen en
+    bepaalt of een detailpagina opnieuw opgehaald moet worden.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self._checked: Dict[str, int] = {}
+        # Pas deze run gemarkeerd (niet uit Mongo): nog nooit opgeslagen
+        self._added: Set[str] = set()
+        # Waarde uit Mongo van listings die deze run opnieuw gemarkeerd zijn (voor unmark)
+        self._previous: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self._checked)
+
+    def __contains__(self, source_id) -> bool:
+        return source_id in self._checked
+
+    def get(self, source_id: str) -> Optional[int]:
+        return self._checked.get(source_id)
+
+    def stored(self, source_id: str) -> bool:
+        """True als de listing al in Mongo stond bij het laden (niet pas deze run gemarkeerd)."""
+        return source_id in self._checked and source_id not in self._added
+
+    def mark(self, source_id: str, ts: Optional[float] = None):
+        if source_id not in self._checked:
+            self._added.add(source_id)
+        elif source_id not in self._added:
+            self._previous.setdefault(source_id, self._checked[source_id])
+        self._checked[source_id] = int(ts if ts is not None else time.time())
+
+    def unmark(self, source_id: str):
+        """Markering van deze run terugdraaien (de detailpagina wordt toch niet opgehaald)."""
+        if source_id in self._added:
+            self._added.discard(source_id)
+            self._checked.pop(source_id, None)
+        elif source_id in self._previous:
+            self._checked[source_id] = self._previous.pop(source_id)
+
+    def is_fresh(self, source_id: str, max_age_seconds: float, now: Optional[float] = None) -> bool:
+        ts = self._checked.get(source_id)
+        if ts is None or max_age_seconds <= 0:
+            return False
+        return (now if now is not None else time.time()) - ts < max_age_seconds
+
+    def load(self, collection) -> 'KnownListingIndex':
+        """
+        Laad alle actieve advertenties van deze source (alleen sourceId + lastCheckedAt).
+        Met `keep_between_runs` alleen de wijzigingen sinds de vorige run in dit proces,
+        en elke SCRAPER_KNOWN_FULL_RELOAD_MINUTES (60) weer alles.
+        """
+        now = time.time()
+        snapshot = _snapshots.get(self.source) if _snapshots is not None else None
+        if snapshot is not None and now - snapshot.full_at < _full_reload_seconds():
+            self._load_delta(collection, snapshot, now)
+            self._checked = dict(snapshot.checked)
+            return self
+        cursor = collection.find(
+            {"source": self.source, "isStillAvailable": {"$ne": False}},
+            {"_id": 0, "sourceId": 1, "lastCheckedAt": 1},
+            batch_size=5000,
+        )
+        for doc in cursor:
+            sid = doc.get("sourceId")
+            ts = doc.get("lastCheckedAt")
+            if sid and ts is not None:
+                self._checked[sid] = to_epoch(ts)
+        if _snapshots is not None:
+            # Eigen kopie: marks van deze run horen niet in de snapshot
+            _snapshots[self.source] = _Snapshot(dict(self._checked), now)
+        return self
+
+    def _load_delta(self, collection, snapshot: _Snapshot, now: float):
+        since = dt.datetime.utcfromtimestamp(snapshot.loaded_at - DELTA_OVERLAP_SECONDS)
+        cursor = collection.find(
+            {"source": self.source, "$or": [{"lastCheckedAt": {"$gte": since}}, {"unavailableAt": {"$gte": since}}]},
+            {"_id": 0, "sourceId": 1, "lastCheckedAt": 1, "isStillAvailable": 1},
+            batch_size=5000,
+        )
+        checked = snapshot.checked
+        for doc in cursor:
+            sid = doc.get("sourceId")
+            if not sid:
+                continue
+            ts = doc.get("lastCheckedAt")
+            if doc.get("isStillAvailable") is False or ts is None:
+                checked.pop(sid, None)
+            else:
+                checked[sid] = to_epoch(ts)
+        snapshot.loaded_at = now
@@ -0,0 +1,148 @@
+"""
+Opt-in geheugenprofiel van een run (SCRAPER_MEMPROFILE=1, zie
+extensions.MemoryProfile en ParseTimingMiddleware).
+
+- tracemalloc: per callback het netto aantal bytes dat de callback laat
+  staan (goedkoop, elke response) en, voor elke `every`-ste response per
+  callback, een snapshot vóór en na de callback; de grootste toenames per
+  regel worden opgeteld tot de top allocatie-plekken per callback
+- RSS van het proces, elke `interval` seconden gesampled (max en laatste)
+
+Een gesamplede sync callback wordt in één keer leeggelezen tussen de twee
+snapshots, zodat andere code niet meetelt. Async callbacks (parse pool)
+wachten tussendoor, dus daar kan werk van andere responses meetellen.
+tracemalloc en RSS zijn per proces: meerdere sources in één proces delen ze.
+"""
+import os
+import resource
+import sys
+import tracemalloc
+from collections import Counter
+from typing import Dict, Optional
+
+
+_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+# Aantal profielen dat tracemalloc gebruikt (meerdere crawlers in één proces)
+_users = 0
+
+
+def rss_bytes() -> Optional[int]:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        # Geen /proc (macOS): alleen de piek beschikbaar (bytes op macOS, KB elders)
+        peak = int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    except (OSError, ValueError):
+        return None
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _CallbackProfile:
+    __slots__ = ('responses', 'retained', 'samples', 'sites')
+
+    def __init__(self):
+        self.responses = 0
+        self.retained = 0
+        self.samples = 0
+        self.sites = Counter()
+
+
+class MemoryProfiler:
+    def __init__(self, every: int = 100, frames: int = 1, top: int = 10):
+        self.every = max(1, int(every))
+        self.frames = max(1, int(frames))
+        self.top = max(1, int(top))
+        self.callbacks: Dict[str, _CallbackProfile] = {}
+        self.rss_max = 0
+        self.rss_last = 0
+        self.rss_samples = 0
+        self.started = False
+
+    def start(self):
+        global _users
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        _users += 1
+        self.started = True
+        self.sample_rss()
+
+    def stop(self):
+        global _users
+        if not self.started:
+            return
+        self.started = False
+        _users -= 1
+        if _users <= 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _profile(self, callback: str) -> _CallbackProfile:
+        p = self.callbacks.get(callback)
+        if p is None:
+            p = self.callbacks[callback] = _CallbackProfile()
+        return p
+
+    def should_sample(self, callback: str) -> bool:
+        """Eerste response van elke callback en daarna elke `every`-ste."""
+        return self.started and self._profile(callback).responses % self.every == 0
+
+    @staticmethod
+    def traced() -> int:
+        return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+    def snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(_FILTERS) if tracemalloc.is_tracing() else None
+
+    def observe(self, callback: str, retained: int):
+        p = self._profile(callback)
+        p.responses += 1
+        p.retained += retained
+
+    def record(self, callback: str, before):
+        """Toenames per regel tussen `before` en nu bij de callback optellen."""
+        if before is None or not tracemalloc.is_tracing():
+            return
+        after = self.snapshot()
+        p = self._profile(callback)
+        p.samples += 1
+        for stat in after.compare_to(before, 'lineno')[:50]:
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            p.sites[f"{frame.filename}:{frame.lineno}"] += stat.size_diff
+        # Begrensd houden bij lange runs
+        if len(p.sites) > 500:
+            p.sites = Counter(dict(p.sites.most_common(200)))
+
+    def sample_rss(self):
+        rss = rss_bytes()
+        if rss is None:
+            return
+        self.rss_last = rss
+        self.rss_max = max(self.rss_max, rss)
+        self.rss_samples += 1
+
+    def report(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {
+            'rss': {'maxBytes': self.rss_max, 'lastBytes': self.rss_last, 'samples': self.rss_samples},
+            'traced': {'currentBytes': current, 'peakBytes': peak},
+            'callbacks': {
+                name: {
+                    'responses': p.responses,
+                    'retainedBytes': p.retained,
+                    'retainedPerResponse': round(p.retained / p.responses) if p.responses else 0,
+                    'samples': p.samples,
+                    # Opgeteld over de samples; per sample: delen door `samples`
+                    'topSites': [{'site': site, 'bytes': n} for site, n in p.sites.most_common(self.top)],
+                }
+                for name, p in sorted(self.callbacks.items())
+            },
+        }
@@ -0,0 +1,295 @@
+"""
+Metingen per run van één source: download latency per domein, parse tijd per
+callback, items per stad, Mongo batches, weggevallen requests/items en de
+discovery latency (tijd van run-start tot de listing opgeslagen is, per
+soort write en voor nieuwe listings ook per stad).
+
+Alles zit in histogrammen met vaste buckets (geen losse samples), dus het
+geheugen blijft gelijk hoe lang de run ook duurt; p50/p95/p99 zijn een
+benadering uit de buckets, net als Prometheus' histogram_quantile.
+Wordt gevuld door CrawlMetrics (extensions.py), ParseTimingMiddleware en de
+MongoPipeline via `spider.metrics`.
+"""
+import bisect
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+# Seconden sinds de start van de run (een volledige run duurt uren)
+DISCOVERY_BUCKETS = (1, 2.5, 5, 10, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 14400)
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, bounds: Iterable[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        # Laatste teller = boven de hoogste bucket (+Inf)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def cumulative(self) -> List[int]:
+        out, total = [], 0
+        for c in self.counts:
+            total += c
+            out.append(total)
+        return out
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                value = lower + (upper - lower) * (rank - seen) / c
+                return min(value, self.max)
+            seen += c
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': round(self.sum / self.count, 6) if self.count else 0.0,
+            'p50': round(self.quantile(0.50), 6),
+            'p95': round(self.quantile(0.95), 6),
+            'p99': round(self.quantile(0.99), 6),
+            'max': round(self.max, 6),
+        }
+
+
+class CityMetrics:
+    __slots__ = ('items', 'touched', 'responses', 'parse_seconds', 'dropped', 'first', 'last', 'new_latency')
+
+    def __init__(self, now: float):
+        self.items = 0
+        self.touched = 0
+        self.responses = 0
+        self.parse_seconds = 0.0
+        self.dropped = 0
+        self.first = now
+        self.last = now
+        self.new_latency: Optional[Histogram] = None
+
+    def rate(self) -> float:
+        return self.items / max(1.0, self.last - self.first)
+
+
+class RunMetrics:
+    def __init__(self, source: str, shard: Optional[int] = None):
+        self.source = source
+        self.shard = shard
+        self.started_at = time.time()
+        self._t0 = time.monotonic()
+        self.download: Dict[str, Histogram] = {}
+        self.parse: Dict[str, Histogram] = {}
+        self.cities: Dict[str, CityMetrics] = {}
+        self.write_latency = Histogram(LATENCY_BUCKETS)
+        self.batch_size = Histogram(BATCH_BUCKETS)
+        self.dropped: Dict[str, int] = {}
+        # Write-soort (new/changed/unchanged/touched, of sink) -> seconden sinds run-start
+        self.stored: Dict[str, Histogram] = {}
+        self.items = 0
+        self.touched = 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._t0
+
+    def _city(self, city: Optional[str]) -> Optional[CityMetrics]:
+        if not city:
+            return None
+        key = city.strip().lower()
+        now = time.monotonic()
+        m = self.cities.get(key)
+        if m is None:
+            m = self.cities[key] = CityMetrics(now)
+        m.last = now
+        return m
+
+    def observe_download(self, domain: str, seconds: float):
+        h = self.download.get(domain)
+        if h is None:
+            h = self.download[domain] = Histogram(LATENCY_BUCKETS)
+        h.observe(seconds)
+
+    def observe_parse(self, callback: str, city: Optional[str], seconds: float):
+        h = self.parse.get(callback)
+        if h is None:
+            h = self.parse[callback] = Histogram(LATENCY_BUCKETS)
+        h.observe(seconds)
+        m = self._city(city)
+        if m is not None:
+            m.responses += 1
+            m.parse_seconds += seconds
+
+    def observe_item(self, city: Optional[str], touch: bool = False):
+        m = self._city(city)
+        if touch:
+            self.touched += 1
+            if m is not None:
+                m.touched += 1
+            return
+        self.items += 1
+        if m is not None:
+            m.items += 1
+
+    def observe_drop(self, reason: str, city: Optional[str] = None, count: int = 1):
+        self.dropped[reason] = self.dropped.get(reason, 0) + count
+        m = self._city(city)
+        if m is not None:
+            m.dropped += count
+
+    def observe_batch(self, size: int, seconds: float):
+        self.batch_size.observe(size)
+        self.write_latency.observe(seconds)
+
+    def observe_stored(self, kind: str, city: Optional[str] = None, seconds: Optional[float] = None):
+        """Listing opgeslagen: tijd sinds de start van de run (standaard nu)."""
+        seconds = self.elapsed() if seconds is None else seconds
+        h = self.stored.get(kind)
+        if h is None:
+            h = self.stored[kind] = Histogram(DISCOVERY_BUCKETS)
+        h.observe(seconds)
+        if kind != 'new':
+            return
+        m = self._city(city)
+        if m is not None:
+            if m.new_latency is None:
+                m.new_latency = Histogram(DISCOVERY_BUCKETS)
+            m.new_latency.observe(seconds)
+
+    # --- export ---
+
+    def summary(self, finish_reason: Optional[str] = None, writes: Optional[Dict[str, int]] = None) -> dict:
+        elapsed = self.elapsed()
+        return {
+            'source': self.source,
+            'shard': self.shard,
+            'startedAt': _iso(self.started_at),
+            'finishedAt': _iso(time.time()),
+            'finishReason': finish_reason,
+            'elapsedSeconds': round(elapsed, 3),
+            'items': self.items,
+            'touched': self.touched,
+            'itemsPerSecond': round(self.items / elapsed, 3) if elapsed > 0 else 0.0,
+            'download': {d: h.summary() for d, h in sorted(self.download.items())},
+            'parse': {c: h.summary() for c, h in sorted(self.parse.items())},
+            'pipeline': {
+                'batches': self.batch_size.count,
+                'batchSize': self.batch_size.summary(),
+                'writeLatency': self.write_latency.summary(),
+                'writes': dict(writes or {}),
+            },
+            'dropped': dict(sorted(self.dropped.items())),
+            'discoveryLatency': {kind: h.summary() for kind, h in sorted(self.stored.items())},
+            'cities': {
+                city: {
+                    'items': m.items,
+                    'touched': m.touched,
+                    'responses': m.responses,
+                    'parseSeconds': round(m.parse_seconds, 3),
+                    'itemsPerSecond': round(m.rate(), 3),
+                    'dropped': m.dropped,
+                    'newLatency': m.new_latency.summary() if m.new_latency is not None else None,
+                }
+                for city, m in sorted(self.cities.items())
+            },
+        }
+
+    def prometheus(self, finish_reason: Optional[str] = None, writes: Optional[Dict[str, int]] = None) -> str:
+        """Prometheus text format (voor de node_exporter textfile collector)."""
+        base = {'source': self.source}
+        if self.shard is not None:
+            base['shard'] = str(self.shard)
+        out: List[str] = []
+
+        def metric(name, kind, help_text):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+
+        def sample(name, value, **labels):
+            out.append(f"{name}{_labels({**base, **labels})} {_num(value)}")
+
+        def histogram(name, h, **labels):
+            for bound, total in zip(h.bounds + (None,), h.cumulative()):
+                sample(f"{name}_bucket", total, **labels, le='+Inf' if bound is None else _num(bound))
+            sample(f"{name}_sum", h.sum, **labels)
+            sample(f"{name}_count", h.count, **labels)
+
+        elapsed = self.elapsed()
+        metric('scraper_run_info', 'gauge', 'Laatste run van deze source (label finish_reason)')
+        sample('scraper_run_info', 1, finish_reason=finish_reason or 'unknown')
+        metric('scraper_run_finished_timestamp_seconds', 'gauge', 'Einde van de laatste run (unix tijd)')
+        sample('scraper_run_finished_timestamp_seconds', round(time.time(), 3))
+        metric('scraper_run_elapsed_seconds', 'gauge', 'Duur van de laatste run')
+        sample('scraper_run_elapsed_seconds', round(elapsed, 3))
+        metric('scraper_items_per_second', 'gauge', 'Geleverde items per seconde over de hele run')
+        sample('scraper_items_per_second', round(self.items / elapsed, 3) if elapsed > 0 else 0)
+
+        metric('scraper_download_latency_seconds', 'histogram', 'Download latency per domein')
+        for domain, h in sorted(self.download.items()):
+            histogram('scraper_download_latency_seconds', h, domain=domain)
+        metric('scraper_parse_seconds', 'histogram', 'Tijd in de spider callback per response')
+        for callback, h in sorted(self.parse.items()):
+            histogram('scraper_parse_seconds', h, callback=callback)
+        metric('scraper_pipeline_write_seconds', 'histogram', 'Duur van een Mongo batch (find + bulk_write)')
+        histogram('scraper_pipeline_write_seconds', self.write_latency)
+        metric('scraper_pipeline_batch_size', 'histogram', 'Aantal operaties per Mongo batch')
+        histogram('scraper_pipeline_batch_size', self.batch_size)
+        metric('scraper_pipeline_writes_total', 'counter', 'Geschreven items per soort (new/changed/unchanged/touched)')
+        for kind, n in sorted((writes or {}).items()):
+            sample('scraper_pipeline_writes_total', n, kind=kind)
+
+        metric('scraper_discovery_latency_seconds', 'histogram',
+               'Tijd van run-start tot de listing opgeslagen is, per soort write')
+        for kind, h in sorted(self.stored.items()):
+            histogram('scraper_discovery_latency_seconds', h, kind=kind)
+
+        metric('scraper_dropped_total', 'counter', 'Weggevallen requests/items per reden')
+        for reason, n in sorted(self.dropped.items()):
+            sample('scraper_dropped_total', n, reason=reason)
+
+        metric('scraper_items_total', 'counter', 'Geleverde items per stad')
+        cities = sorted(self.cities.items())
+        for city, m in cities:
+            sample('scraper_items_total', m.items, city=city)
+        metric('scraper_city_items_per_second', 'gauge', 'Items per seconde per stad (eerste tot laatste activiteit)')
+        for city, m in cities:
+            sample('scraper_city_items_per_second', round(m.rate(), 3), city=city)
+        metric('scraper_city_parse_seconds_total', 'counter', 'Parse tijd per stad')
+        for city, m in cities:
+            sample('scraper_city_parse_seconds_total', round(m.parse_seconds, 6), city=city)
+        return '\n'.join(out) + '\n'
+
+
+def _iso(ts: float) -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(ts))
+
+
+def _num(value) -> str:
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else repr(round(value, 6))
+    return str(value)
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    parts = []
+    for k, v in labels.items():
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{k}="{v}"')
+    return '{' + ','.join(parts) + '}'
@@ -0,0 +1,68 @@
+import os
+import threading
+from typing import Optional
+from pymongo import MongoClient
+
+
+class SharedClient:
+    """Eén MongoClient (en connection pool) voor het hele proces; `close()` van gebruikers doet niets."""
+
+    def __init__(self, client: MongoClient):
+        self._client = client
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def __getitem__(self, name):
+        return self._client[name]
+
+    def close(self):
+        pass
+
+
+# run_daemon.py: alle pipelines, indexen en sweeps delen de pool tussen crawl cycles
+_shared: Optional[SharedClient] = None
+_share = False
+_lock = threading.Lock()
+
+
+def share_client(enabled: bool = True):
+    global _share
+    _share = enabled
+
+
+def close_shared_client():
+    global _shared
+    with _lock:
+        if _shared is not None:
+            _shared._client.close()
+            _shared = None
+
+
+def get_client(uri: Optional[str] = None) -> MongoClient:
+    global _shared
+    uri = uri or os.getenv("MONGODB_URI")
+    if not uri:
+        raise RuntimeError("MONGODB_URI ontbreekt voor scraper")
+    if not _share:
+        return MongoClient(uri)
+    with _lock:
+        if _shared is None:
+            _shared = SharedClient(MongoClient(uri))
+        return _shared
+
+
+def get_database(client: MongoClient):
+    db_name = os.getenv("MONGODB_DB")
+    if db_name:
+        return client.get_database(db_name)
+    # Try default database from URI; fallback to 'fyxed' if none
+    try:
+        return client.get_default_database()
+    except Exception:
+        return client.get_database('fyxed')
+
+
+def properties_collection_name() -> str:
+    # Allow overriding target collection (for per-source staging)
+    return os.getenv("SCRAPER_COLLECTION", "properties")
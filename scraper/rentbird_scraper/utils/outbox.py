@@ -0,0 +1,113 @@
+"""
+Change-event outbox: compacte events per listing in een capped collectie
+(`property_events`, `SCRAPER_OUTBOX_COLLECTION`), met een oplopend `seq`,
+zodat de matcher (`scripts/match-source.js --outbox`) vanaf een checkpoint
+kan tailen in plaats van `properties` te scannen.
+
+Events (alleen bij echte wijzigingen in de match-velden):
+- `new`: eerste keer gezien
+- `price_drop`: prijs omlaag
+- `changed`: een ander match-veld gewijzigd (ook prijs omhoog)
+- `reactivated`: weer beschikbaar na sweep/liveness
+- `delisted`: niet meer beschikbaar (sweep of liveness probe)
+
+`seq` komt uit `counters` (één `$inc` per batch), dus events van meerdere
+processen kunnen iets buiten volgorde binnenkomen; de consumer wacht bij
+een gat in de nummering kort (zie match-source.js).
+"""
+import datetime as dt
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from rentbird_scraper.utils.fingerprint import get_path, has_path, normalize_value
+
+
+logger = logging.getLogger(__name__)
+
+# Velden waar de matcher op filtert/scoort
+MATCH_FIELDS = ('price', 'rooms', 'size', 'address.city', 'furnished')
+NEW, PRICE_DROP, CHANGED, REACTIVATED, DELISTED = 'new', 'price_drop', 'changed', 'reactivated', 'delisted'
+
+
+def outbox_enabled() -> bool:
+    return os.getenv('SCRAPER_OUTBOX', '1') == '1'
+
+
+def listing_event(item: Dict[str, Any], doc: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Event voor een gescrapet item t.o.v. het opgeslagen document, of None (niets relevants veranderd)."""
+    event = {'source': item['source'], 'sourceId': item['sourceId'], 'price': item.get('price'),
+             'city': get_path(item, 'address.city')}
+    if item.get('canonicalId'):
+        # Zelfde woning op meerdere sources (DedupPipeline): de consumer kan hierop ontdubbelen
+        event['canonicalId'] = item['canonicalId']
+    if doc is None:
+        return dict(event, type=NEW)
+    changed = [f for f in MATCH_FIELDS
+               if has_path(item, f) and normalize_value(get_path(item, f)) != normalize_value(get_path(doc, f))]
+    if doc.get('isStillAvailable') is False:
+        return dict(event, type=REACTIVATED, fields=changed)
+    if not changed:
+        return None
+    old_price = doc.get('price')
+    event.update(fields=changed, prevPrice=old_price)
+    price = item.get('price')
+    if 'price' in changed and isinstance(price, (int, float)) and isinstance(old_price, (int, float)) and price < old_price:
+        return dict(event, type=PRICE_DROP)
+    return dict(event, type=CHANGED)
+
+
+def reactivated_event(source: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Weer beschikbaar zonder nieuwe content (alleen lastCheckedAt/sweep)."""
+    return {'source': source, 'sourceId': doc['sourceId'], 'price': doc.get('price'),
+            'city': get_path(doc, 'address.city'), 'type': REACTIVATED}
+
+
+def delisted_event(source: str, source_id: str, reason: str) -> Dict[str, Any]:
+    return {'source': source, 'sourceId': source_id, 'type': DELISTED, 'reason': reason}
+
+
+class Outbox:
+    """Append-only writer; `append` is thread-safe genoeg voor de BulkWriter thread (één call per batch)."""
+
+    def __init__(self, db, name: Optional[str] = None, size_mb: Optional[float] = None):
+        self.name = name or os.getenv('SCRAPER_OUTBOX_COLLECTION', 'property_events')
+        size = int(float(size_mb if size_mb is not None else os.getenv('SCRAPER_OUTBOX_MB', '256')) * 1024 * 1024)
+        if self.name not in db.list_collection_names():
+            try:
+                db.create_collection(self.name, capped=True, size=size)
+            except CollectionInvalid:
+                pass  # tegelijk aangemaakt door een ander proces
+        self.events = db.get_collection(self.name)
+        self.events.create_index('seq', unique=True)
+        self.counters = db.get_collection('counters')
+
+    def reserve(self, count: int) -> int:
+        """Eerste seq van een blok van `count` opeenvolgende nummers."""
+        doc = self.counters.find_one_and_update(
+            {'_id': self.name}, {'$inc': {'seq': count}}, upsert=True, return_document=ReturnDocument.AFTER)
+        return int(doc['seq']) - count + 1
+
+    def append(self, events: Iterable[Dict[str, Any]], now: Optional[dt.datetime] = None) -> int:
+        events: List[Dict[str, Any]] = [e for e in events if e]
+        if not events:
+            return 0
+        now = now or dt.datetime.utcnow()
+        first = self.reserve(len(events))
+        docs = [{'seq': first + i, 'at': now, **e} for i, e in enumerate(events)]
+        self.events.insert_many(docs, ordered=True)
+        return len(docs)
+
+
+def open_outbox(db) -> Optional[Outbox]:
+    """Outbox of None (uitgezet met SCRAPER_OUTBOX=0, of aanmaken mislukt)."""
+    if not outbox_enabled():
+        return None
+    try:
+        return Outbox(db)
+    except PyMongoError as e:
+        logger.warning("[outbox] niet beschikbaar, geen change events: %s", e)
+        return None
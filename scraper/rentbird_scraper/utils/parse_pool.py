@@ -0,0 +1,94 @@
+"""
+Optionele process pool voor het parsen van detailpagina's.
+
+Met `SCRAPER_PARSE_WORKERS=N` (N > 0) gaan response bodies naar N worker
+processen; die bouwen zelf het extractieplan (zie plans.py), parsen de
+pagina en sturen een gewone item dict terug. De reactor blijft intussen
+downloaden. Zonder de variabele (of 0) parsen de spiders zoals altijd inline.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from twisted.internet import defer
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def parse_workers() -> int:
+    try:
+        return max(0, int(os.getenv('SCRAPER_PARSE_WORKERS', '0')))
+    except ValueError:
+        return 0
+
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    """Gedeelde pool voor alle spiders in dit proces, of None als offload uit staat."""
+    global _pool
+    workers = parse_workers()
+    if not workers:
+        return None
+    with _lock:
+        if _pool is None:
+            # spawn: niet forken vanuit een proces met een draaiende reactor en threads
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            atexit.register(shutdown_pool)
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def extract_detail(source: str, body: bytes, encoding: Optional[str], backend: str,
+                   url: str, city: Optional[str]) -> Tuple[dict, Optional[bool]]:
+    """
+    Draait in een worker proces; moet top-level blijven (pickle).
+    Geeft (item, structured) terug: structured is None zonder `structuredData`,
+    anders of de fast path gelukt is.
+    """
+    from rentbird_scraper.plans import load_plan
+    from rentbird_scraper.utils.html import parse_page
+    plan = load_plan(source)
+    structured = None
+    if plan.structured is not None:
+        item = plan.extract_structured(body.decode(encoding or 'utf-8', errors='replace'), url, city)
+        if item is not None:
+            return item, True
+        structured = False
+    page = parse_page(body, encoding, backend, url)
+    try:
+        return plan.extract_detail(page, url, city), structured
+    finally:
+        page.close()
+
+
+def submit(pool: ProcessPoolExecutor, fn, *args) -> defer.Deferred:
+    """Voer `fn(*args)` uit in de pool; de Deferred vuurt op de reactor thread."""
+    # Pas hier importeren: een import op module-niveau installeert de standaard reactor
+    # vóór TWISTED_REACTOR (asyncio) geïnstalleerd kan worden
+    from twisted.internet import reactor
+    d = defer.Deferred()
+    future = pool.submit(fn, *args)
+
+    def done(f):
+        if f.cancelled():
+            reactor.callFromThread(d.cancel)
+            return
+        exc = f.exception()
+        if exc is not None:
+            reactor.callFromThread(d.errback, exc)
+        else:
+            reactor.callFromThread(d.callback, f.result())
+
+    future.add_done_callback(done)
+    return d
@@ -0,0 +1,256 @@
+"""
+Lokale item sink: items als geroteerde bestanden in plaats van direct naar
+Mongo (`SCRAPER_SINK=file`, zie FileSinkPipeline en load_sink.py).
+
+- `<dir>/<source>/<source>-<tijd>-<pid>-<n>.jsonl.gz` (standaard), of
+  `.parquet` met `SCRAPER_SINK_FORMAT=parquet` (vereist pyarrow)
+- een bestand wordt geschreven als `<naam>.part` en pas na het sluiten
+  hernoemd; de loader leest alleen afgeronde bestanden
+- roteren na `SCRAPER_SINK_ROTATE_ITEMS` items of `SCRAPER_SINK_ROTATE_MB`
+- geheugen blijft begrensd: JSONL gaat direct door gzip, Parquet schrijft
+  per row group (`SCRAPER_SINK_ROW_GROUP` rijen)
+
+Tijdstempels gaan als ISO string (UTC, `Z`) de bestanden in en komen er
+in `iter_file` weer als naive UTC datetime uit, zoals de pipeline ze maakt.
+"""
+import datetime as dt
+import gzip
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from rentbird_scraper.utils.state import state_dir
+
+
+FORMATS = ('jsonl', 'parquet')
+EXTENSIONS = {'jsonl': '.jsonl.gz', 'parquet': '.parquet'}
+# Velden die als datetime terug moeten komen
+DATETIME_FIELDS = ('scrapedAt', '_checkedAt')
+
+
+def sink_dir() -> str:
+    return os.getenv('SCRAPER_SINK_DIR') or os.path.join(state_dir(), 'sink')
+
+
+def _encode(value):
+    if isinstance(value, dt.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(dt.timezone.utc).replace(tzinfo=None)
+        return value.isoformat() + 'Z'
+    raise TypeError(f"niet serialiseerbaar: {type(value).__name__}")
+
+
+def _decode_times(item: Dict[str, Any]) -> Dict[str, Any]:
+    for name in DATETIME_FIELDS:
+        value = item.get(name)
+        if isinstance(value, str) and value.endswith('Z'):
+            try:
+                item[name] = dt.datetime.fromisoformat(value[:-1])
+            except ValueError:
+                pass
+    return item
+
+
+class _JsonlFile:
+    def __init__(self, path: str):
+        self.raw = open(path, 'wb')
+        self.out = gzip.GzipFile(fileobj=self.raw, mode='wb', compresslevel=6)
+
+    def write(self, item: Dict[str, Any]):
+        self.out.write(json.dumps(item, ensure_ascii=False, default=_encode, separators=(',', ':')).encode('utf8'))
+        self.out.write(b'\n')
+
+    def tell(self) -> int:
+        return self.raw.tell()
+
+    def close(self):
+        self.out.close()
+        self.raw.close()
+
+
+# Vaste kolommen; overige velden gaan als JSON in `extra`
+PARQUET_COLUMNS = ('source', 'sourceId', 'title', 'sourceUrl', 'price', 'size', 'rooms', 'furnished', 'images',
+                   'offeredSince', 'isStillAvailable', 'scrapedAt', '_checkedAt', '_touch')
+
+
+def _parquet_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('source', pa.string()), ('sourceId', pa.string()), ('title', pa.string()), ('sourceUrl', pa.string()),
+        ('city', pa.string()), ('street', pa.string()),
+        ('price', pa.int64()), ('size', pa.int64()), ('rooms', pa.float64()), ('furnished', pa.bool_()),
+        ('images', pa.list_(pa.string())), ('offeredSince', pa.string()), ('isStillAvailable', pa.bool_()),
+        ('scrapedAt', pa.timestamp('ms')), ('_checkedAt', pa.timestamp('ms')), ('_touch', pa.bool_()),
+        ('extra', pa.string()),
+    ])
+
+
+class _ParquetFile:
+    def __init__(self, path: str, row_group: int):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("SCRAPER_SINK_FORMAT=parquet vereist pyarrow (pip install pyarrow)") from e
+        self.schema = _parquet_schema()
+        self.path = path
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+        self.row_group = max(1, int(row_group))
+        self.rows: List[Dict[str, Any]] = []
+
+    def write(self, item: Dict[str, Any]):
+        address = item.get('address') or {}
+        row = {k: item.get(k) for k in PARQUET_COLUMNS}
+        row['city'] = address.get('city')
+        row['street'] = address.get('street')
+        row['sourceId'] = None if row['sourceId'] is None else str(row['sourceId'])
+        for name in ('price', 'size'):
+            if isinstance(row[name], float):
+                row[name] = int(row[name])
+        extra = {k: v for k, v in item.items() if k not in PARQUET_COLUMNS and k != 'address'}
+        extra_address = {k: v for k, v in address.items() if k not in ('city', 'street')}
+        if extra_address:
+            extra['address'] = extra_address
+        row['extra'] = json.dumps(extra, ensure_ascii=False, default=_encode) if extra else None
+        self.rows.append(row)
+        if len(self.rows) >= self.row_group:
+            self._flush()
+
+    def _flush(self):
+        if self.rows:
+            import pyarrow as pa
+            self.writer.write_table(pa.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def tell(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+class SinkWriter:
+    """Roterende writer voor één source (niet thread-safe; draait op de reactor thread)."""
+
+    def __init__(self, source: str, directory: Optional[str] = None, fmt: str = 'jsonl',
+                 rotate_items: int = 50000, rotate_bytes: int = 64 * 1024 * 1024, row_group: int = 5000):
+        if fmt not in FORMATS:
+            raise ValueError(f"Onbekend sink formaat: {fmt} (kies uit {', '.join(FORMATS)})")
+        self.source = source
+        self.directory = os.path.join(directory or sink_dir(), source)
+        os.makedirs(self.directory, exist_ok=True)
+        self.fmt = fmt
+        self.rotate_items = max(1, int(rotate_items))
+        self.rotate_bytes = max(1, int(rotate_bytes))
+        self.row_group = row_group
+        self.file = None
+        self.path = None
+        self.count = 0
+        self.seq = 0
+        self.files: List[str] = []
+        self.items = 0
+        self.bytes = 0
+
+    def _open(self):
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime())
+        self.seq += 1
+        name = f"{self.source}-{stamp}-{os.getpid()}-{self.seq:04d}{EXTENSIONS[self.fmt]}"
+        self.path = os.path.join(self.directory, name)
+        part = self.path + '.part'
+        self.file = _ParquetFile(part, self.row_group) if self.fmt == 'parquet' else _JsonlFile(part)
+        self.count = 0
+
+    def write(self, item: Dict[str, Any]):
+        if self.file is None:
+            self._open()
+        self.file.write(item)
+        self.count += 1
+        self.items += 1
+        if self.count >= self.rotate_items or self.file.tell() >= self.rotate_bytes:
+            self.rotate()
+
+    def rotate(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.bytes += os.path.getsize(self.path + '.part')
+        os.replace(self.path + '.part', self.path)
+        self.files.append(self.path)
+        self.file = None
+
+    def close(self):
+        self.rotate()
+
+
+def write_retry(path: str, items: List[Dict[str, Any]]) -> str:
+    """
+    Items waarvan de write mislukte naast `path` schrijven (`<source>-<tijd>-<pid>r-<n>.jsonl.gz`),
+    met de tijd en het volgnummer van het origineel, zodat ze in dezelfde volgorde opnieuw geladen worden.
+    Een retry van een retry overschrijft hetzelfde bestand (dat is dan al gelezen).
+    """
+    name = os.path.basename(path).split('.', 1)[0]
+    source, stamp, pid, seq = name.rsplit('-', 3)
+    if not pid.endswith('r'):
+        pid += 'r'
+    target = os.path.join(os.path.dirname(path), f"{source}-{stamp}-{pid}-{seq}{EXTENSIONS['jsonl']}")
+    out = _JsonlFile(target + '.part')
+    try:
+        for item in items:
+            out.write(item)
+    finally:
+        out.close()
+    os.replace(target + '.part', target)
+    return target
+
+
+def _order(path: str):
+    # <source>-<tijd>-<pid>-<n>.<ext>: op tijd, dan volgnummer
+    name = os.path.basename(path).split('.', 1)[0]
+    _, stamp, pid, seq = name.rsplit('-', 3)
+    return stamp, seq, pid
+
+
+def sink_files(directory: Optional[str] = None, sources=None) -> List[str]:
+    """Afgeronde bestanden per source, oudste eerst."""
+    root = directory or sink_dir()
+    out = []
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return out
+    for source in names:
+        sub = os.path.join(root, source)
+        if not os.path.isdir(sub) or (sources and source not in sources):
+            continue
+        files = [os.path.join(sub, n) for n in os.listdir(sub) if n.endswith(tuple(EXTENSIONS.values()))]
+        out.extend(sorted(files, key=_order))
+    return out
+
+
+def iter_file(path: str) -> Iterator[Dict[str, Any]]:
+    if path.endswith('.parquet'):
+        yield from _iter_parquet(path)
+        return
+    with gzip.open(path, 'rt', encoding='utf8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield _decode_times(json.loads(line))
+
+
+def _iter_parquet(path: str) -> Iterator[Dict[str, Any]]:
+    import pyarrow.parquet as pq
+    pf = pq.ParquetFile(path)
+    for batch in pf.iter_batches(batch_size=5000):
+        for row in batch.to_pylist():
+            extra = json.loads(row.pop('extra') or '{}')
+            row['address'] = {'city': row.pop('city'), 'street': row.pop('street'), **(extra.pop('address', None) or {})}
+            row.update(extra)
+            for name in ('_touch', '_checkedAt', 'scrapedAt'):
+                if not row.get(name):
+                    row.pop(name, None)
+            yield _decode_times(row)
@@ -0,0 +1,59 @@
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from typing import Any, Callable, Dict
+
+
+def state_dir() -> str:
+    default = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.state')
+    return os.getenv('SCRAPER_STATE_DIR', default)
+
+
+class RunState:
+    """
+    Kleine JSON-state per source op schijf (standaard scraper/.state/<source>.json),
+    bijv. wanneer de laatste volledige crawl was. Werkt ook zonder Mongo.
+    """
+
+    def __init__(self, source: str, directory: str = None):
+        self.path = os.path.join(directory or state_dir(), f"{source}.json")
+        self.data: Dict[str, Any] = {}
+        self.reload()
+
+    def reload(self):
+        try:
+            with open(self.path, 'r') as f:
+                self.data = json.load(f) or {}
+        except (OSError, ValueError):
+            self.data = {}
+
+    def get(self, key: str, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key: str, value):
+        self.data[key] = value
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def update(self, fn: Callable[[Dict[str, Any]], None]):
+        """Read-modify-write onder een file lock (meerdere shards per source, zie --workers)."""
+        with self._locked():
+            self.reload()
+            fn(self.data)
+            self.save()
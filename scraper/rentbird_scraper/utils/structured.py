@@ -0,0 +1,300 @@
+"""
+Structured-data fast path: listing velden uit JSON-LD of een framework state
+blob (`__NEXT_DATA__`, `window.__INITIAL_STATE__ = {...}`) halen zonder de
+DOM te bouwen. Configuratie per source in `structuredData`:
+
+    "structuredData": {
+      "scripts": [
+        {"script": "ld+json", "types": ["Apartment", "House", "Residence", "Product"]},
+        {"script": "#__NEXT_DATA__", "root": "props.pageProps.listing"}
+      ],
+      "fields": {
+        "title": "name",
+        "price": ["offers.price", "price.amount"],
+        "size": "floorSize.value",
+        "rooms": "numberOfRooms",
+        "street": "address.streetAddress",
+        "images": "image",
+        "offeredSince": "datePosted"
+      },
+      "required": ["price"]
+    }
+
+- `script`: `ld+json` (alle `<script type="application/ld+json">`), `#id`
+  (script met dat id) of een JS variabele (`window.__INITIAL_STATE__`)
+- `root`: pad naar het listing object binnen de payload; `types`: alleen
+  objecten met dat schema.org `@type` (ook binnen `@graph`)
+- paden zijn punt-gescheiden; een getal indexeert een lijst, een sleutel op
+  een lijst pakt het eerste element dat die sleutel heeft
+- `fields` per entry overschrijft de gedeelde `fields`
+- lukt geen enkele kandidaat met alle `required` velden, dan valt de spider
+  terug op de gewone selectors
+"""
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterator, Optional, Pattern, Tuple
+
+from rentbird_scraper.utils.normalize import parse_price, parse_rooms, parse_size
+
+
+FIELDS = ('title', 'price', 'size', 'rooms', 'street', 'city', 'furnished', 'images', 'offeredSince')
+MAX_IMAGES = 12
+DATE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})")
+# Zoals "Aangeboden sinds" op de pagina: dd-mm-yyyy
+DMY_RE = re.compile(r"^(\d{2})-(\d{2})-(\d{4})")
+PLAIN_NUMBER_RE = re.compile(r"^\d+(?:[.,]\d{1,2})?$")
+
+_decoder = json.JSONDecoder()
+
+
+@dataclass(frozen=True)
+class ScriptSpec:
+    marker: str
+    pattern: Optional[Pattern]
+    root: Tuple[str, ...]
+    types: FrozenSet[str]
+    fields: Tuple[Tuple[str, Tuple[Tuple[str, ...], ...]], ...]
+
+
+@dataclass(frozen=True)
+class StructuredPlan:
+    scripts: Tuple[ScriptSpec, ...]
+    required: FrozenSet[str]
+
+
+def _path(path: str) -> Tuple[str, ...]:
+    return tuple(p for p in path.split('.') if p)
+
+
+def _compile_fields(source: str, fields: dict) -> Tuple[Tuple[str, Tuple[Tuple[str, ...], ...]], ...]:
+    out = []
+    for name, paths in fields.items():
+        if name not in FIELDS:
+            raise ValueError(f"[{source}] structuredData: onbekend veld {name} (kies uit {', '.join(FIELDS)})")
+        if isinstance(paths, str):
+            paths = [paths]
+        out.append((name, tuple(_path(p) for p in paths)))
+    return tuple(out)
+
+
+def _compile_script(source: str, spec: dict, default_fields: dict) -> ScriptSpec:
+    script = spec.get('script', 'ld+json')
+    if script == 'ld+json':
+        marker = 'application/ld+json'
+        pattern = re.compile(r"<script[^>]*type=[\"']application/ld\+json[\"'][^>]*>(.*?)</script>", re.S | re.I)
+    elif script.startswith('#'):
+        marker = script[1:]
+        pattern = re.compile(r"<script[^>]*id=[\"']" + re.escape(marker) + r"[\"'][^>]*>(.*?)</script>", re.S | re.I)
+    else:
+        # JS toewijzing: de payload wordt met raw_decode vanaf het '=' gelezen
+        marker = script
+        pattern = None
+    fields = spec.get('fields') or default_fields
+    if not fields:
+        raise ValueError(f"[{source}] structuredData: geen fields voor {script}")
+    return ScriptSpec(
+        marker=marker,
+        pattern=pattern,
+        root=_path(spec.get('root', '')),
+        types=frozenset(t.lower() for t in spec.get('types', [])),
+        fields=_compile_fields(source, fields),
+    )
+
+
+def compile_structured(source: str, cfg: Optional[dict]) -> Optional[StructuredPlan]:
+    if not cfg:
+        return None
+    fields = cfg.get('fields') or {}
+    scripts = cfg.get('scripts') or [{'script': 'ld+json'}]
+    return StructuredPlan(
+        scripts=tuple(_compile_script(source, s, fields) for s in scripts),
+        required=frozenset(cfg.get('required', ['price'])),
+    )
+
+
+def _loads(raw: str):
+    raw = raw.strip()
+    if raw.startswith('<!--'):
+        raw = raw[4:].lstrip()
+    try:
+        return _decoder.raw_decode(raw)[0]
+    except ValueError:
+        return None
+
+
+def payloads(text: str, spec: ScriptSpec) -> Iterator[Any]:
+    """Geparste JSON payloads voor één script spec (goedkope scan, geen DOM)."""
+    if spec.marker not in text:
+        return
+    if spec.pattern is not None:
+        for m in spec.pattern.finditer(text):
+            data = _loads(m.group(1))
+            if data is not None:
+                yield data
+        return
+    start = 0
+    while True:
+        i = text.find(spec.marker, start)
+        if i < 0:
+            return
+        start = i + len(spec.marker)
+        j = start
+        while j < len(text) and text[j] in ' \t\r\n':
+            j += 1
+        if j < len(text) and text[j] == '=' and text[j + 1:j + 2] != '=':
+            data = _loads(text[j + 1:])
+            if data is not None:
+                yield data
+
+
+def resolve(data: Any, path: Tuple[str, ...]) -> Any:
+    cur = data
+    for key in path:
+        if isinstance(cur, list):
+            if key.isdigit():
+                idx = int(key)
+                cur = cur[idx] if idx < len(cur) else None
+            else:
+                cur = next((el[key] for el in cur if isinstance(el, dict) and key in el), None)
+        elif isinstance(cur, dict):
+            cur = cur.get(key)
+        else:
+            return None
+        if cur is None:
+            return None
+    return cur
+
+
+def _types(obj: dict) -> FrozenSet[str]:
+    t = obj.get('@type')
+    if isinstance(t, str):
+        return frozenset([t.lower()])
+    if isinstance(t, list):
+        return frozenset(x.lower() for x in t if isinstance(x, str))
+    return frozenset()
+
+
+def candidates(data: Any, spec: ScriptSpec) -> Iterator[dict]:
+    if spec.root:
+        data = resolve(data, spec.root)
+    stack = [data]
+    while stack:
+        obj = stack.pop(0)
+        if isinstance(obj, list):
+            stack.extend(obj)
+            continue
+        if not isinstance(obj, dict):
+            continue
+        if isinstance(obj.get('@graph'), list):
+            stack.extend(obj['@graph'])
+        if not spec.types or spec.types & _types(obj):
+            yield obj
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        return _number(value.get('value'))
+    if isinstance(value, str):
+        # "1250", "1250.00", "2,5"; "1.250" of "65 m²" gaan via de normalize functies
+        m = PLAIN_NUMBER_RE.match(value.strip())
+        return float(m.group(0).replace(',', '.')) if m else None
+    return None
+
+
+def _text(value) -> Optional[str]:
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return None
+
+
+def _images(value) -> list:
+    if isinstance(value, (str, dict)):
+        value = [value]
+    images = []
+    for el in value if isinstance(value, list) else []:
+        if isinstance(el, dict):
+            el = el.get('contentUrl') or el.get('url') or el.get('src')
+        if isinstance(el, str) and el.startswith('http'):
+            images.append(el)
+            if len(images) >= MAX_IMAGES:
+                break
+    return images
+
+
+def _furnished(value):
+    """bool, of de tekst als die geen ja/nee is ("Gestoffeerd"): plans.py past daar furnishedKeywords op toe."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        t = value.strip().lower()
+        if t in ('true', 'yes', 'ja', 'furnished', 'gemeubileerd'):
+            return True
+        if t in ('false', 'no', 'nee', 'unfurnished', 'ongemeubileerd', 'kaal'):
+            return False
+        return t or None
+    return None
+
+
+def _offered_since(value) -> Optional[str]:
+    """ISO datum (met of zonder tijd) of dd-mm-yyyy -> `YYYY-MM-DDT00:00:00Z`, zoals extract_detail."""
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    m = DATE_RE.match(value)
+    if m:
+        return f"{m.group(1)}T00:00:00Z"
+    m = DMY_RE.match(value)
+    if m:
+        return f"{m.group(3)}-{m.group(2)}-{m.group(1)}T00:00:00Z"
+    return None
+
+
+def convert(name: str, value):
+    """Ruwe JSON waarde naar het item formaat van ExtractionPlan.extract_detail."""
+    if name == 'price':
+        n = _number(value)
+        if n is not None:
+            return int(round(n))
+        return parse_price(value) if isinstance(value, str) else None
+    if name == 'size':
+        n = _number(value)
+        if n is not None:
+            return int(round(n))
+        return parse_size(value) if isinstance(value, str) else None
+    if name == 'rooms':
+        n = _number(value)
+        if n is not None:
+            return n
+        return parse_rooms(value) if isinstance(value, str) else None
+    if name == 'images':
+        return _images(value)
+    if name == 'furnished':
+        return _furnished(value)
+    if name == 'offeredSince':
+        return _offered_since(value)
+    return _text(value)
+
+
+def extract(plan: StructuredPlan, text: str) -> Optional[Dict[str, Any]]:
+    """Velden van de eerste kandidaat met alle `required` velden, of None."""
+    for spec in plan.scripts:
+        for data in payloads(text, spec):
+            for obj in candidates(data, spec):
+                values = {}
+                for name, paths in spec.fields:
+                    for path in paths:
+                        value = convert(name, resolve(obj, path))
+                        if value not in (None, [], ''):
+                            values[name] = value
+                            break
+                if all(values.get(r) not in (None, []) for r in plan.required):
+                    return values
+    return None
@@ -0,0 +1,181 @@
+"""
+Lokale validator store (sqlite) voor conditional requests.
+
+Per canonieke URL: ETag, Last-Modified, lengte van de laatste body en (alleen
+voor lijstpagina's) de gecomprimeerde body zelf, zodat een 304 op een
+lijstpagina gewoon opnieuw geparst kan worden. Maximaal `max_entries` rijen;
+daarboven worden de langst niet gebruikte rijen verwijderd (LRU).
+
+De store wordt vanaf de reactor thread gebruikt, dus daar alleen korte
+reads: schrijven (comprimeren, upserts, LRU-tijden, evict) gebeurt in één
+writer thread met een eigen verbinding. LRU-tijden worden in het geheugen
+verzameld en per batch weggeschreven. Staat de database op slot (andere
+shard), dan wacht een read maximaal `READ_TIMEOUT` en slaat hij de cache
+anders over (`busy`); een volle write queue laat writes vallen (`dropped`).
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from typing import NamedTuple, Optional
+
+from rentbird_scraper.utils.state import state_dir
+
+
+logger = logging.getLogger(__name__)
+
+# Seconden die een read op de reactor thread op een lock mag wachten
+READ_TIMEOUT = 0.05
+# LRU-tijden per zoveel reads naar de writer
+TOUCH_BATCH = 500
+# Writes die op de writer mogen wachten (bodies van lijstpagina's, ongecomprimeerd)
+QUEUE_SIZE = 1000
+
+
+class Validators(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    length: int
+    body: Optional[bytes]
+
+
+def default_path() -> str:
+    return os.path.join(state_dir(), 'validators.sqlite')
+
+
+class ValidatorStore:
+    def __init__(self, path: Optional[str] = None, max_entries: int = 50000):
+        self.path = path or default_path()
+        self.max_entries = max(100, int(max_entries))
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # Meerdere shards (--workers) kunnen dezelfde store gebruiken; alleen bij het openen wachten op een lock
+        with sqlite3.connect(self.path, timeout=30) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS validators ('
+                ' url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT,'
+                ' length INTEGER NOT NULL DEFAULT 0, body BLOB, used REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS validators_used ON validators(used)')
+            self._count = conn.execute('SELECT COUNT(*) FROM validators').fetchone()[0]
+        conn.close()
+        self.conn = sqlite3.connect(self.path, timeout=READ_TIMEOUT)
+        self.busy = 0
+        self.dropped = 0
+        self._touched = {}
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._writer = threading.Thread(target=self._run, name='validator-writer', daemon=True)
+        self._writer.start()
+
+    def __len__(self):
+        return self._count
+
+    def get(self, url: str) -> Optional[Validators]:
+        try:
+            row = self.conn.execute(
+                'SELECT etag, last_modified, length, body FROM validators WHERE url = ?', (url,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # Op slot bij een andere shard: zonder validators verder
+            self.busy += 1
+            return None
+        if row is None:
+            return None
+        self._touched[url] = time.time()
+        if len(self._touched) >= TOUCH_BATCH:
+            self._flush_touches()
+        body = zlib.decompress(row[3]) if row[3] is not None else None
+        return Validators(row[0], row[1], row[2] or 0, body)
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], length: int,
+            body: Optional[bytes] = None):
+        self._enqueue(('put', (url, etag, last_modified, int(length), body, time.time())))
+
+    def delete(self, url: str):
+        self._touched.pop(url, None)
+        self._enqueue(('delete', url))
+
+    def _flush_touches(self):
+        if self._touched:
+            touched, self._touched = self._touched, {}
+            self._enqueue(('touch', [(used, url) for url, used in touched.items()]))
+
+    def _enqueue(self, op):
+        try:
+            self._queue.put_nowait(op)
+        except queue.Full:
+            self.dropped += 1
+
+    # --- writer thread ---
+
+    def _run(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        stop = False
+        while not stop:
+            ops = [self._queue.get()]
+            while len(ops) < 200:
+                try:
+                    ops.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in ops:
+                stop = True
+                ops = [op for op in ops if op is not None]
+            try:
+                self._write(conn, ops)
+                if self._count > self.max_entries:
+                    self.evict(conn)
+            except sqlite3.Error as e:
+                logger.warning("[validators] schrijven mislukt (%d operaties): %s", len(ops), e)
+        conn.close()
+
+    def _write(self, conn, ops):
+        with conn:
+            for kind, args in ops:
+                if kind == 'put':
+                    url, etag, last_modified, length, body, used = args
+                    blob = zlib.compress(body, 6) if body is not None else None
+                    conn.execute(
+                        'INSERT INTO validators (url, etag, last_modified, length, body, used) VALUES (?, ?, ?, ?, ?, ?)'
+                        ' ON CONFLICT(url) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified,'
+                        ' length = excluded.length, body = excluded.body, used = excluded.used',
+                        (url, etag, last_modified, length, blob, used),
+                    )
+                    # Bovengrens (updates tellen ook mee); evict() telt opnieuw
+                    self._count += 1
+                elif kind == 'delete':
+                    conn.execute('DELETE FROM validators WHERE url = ?', (args,))
+                elif kind == 'touch':
+                    conn.executemany('UPDATE validators SET used = ? WHERE url = ?', args)
+
+    def evict(self, conn):
+        """Terug naar 90% van max_entries door de minst recent gebruikte rijen te verwijderen (writer thread)."""
+        with conn:
+            total = conn.execute('SELECT COUNT(*) FROM validators').fetchone()[0]
+            excess = total - int(self.max_entries * 0.9)
+            if excess > 0:
+                conn.execute(
+                    'DELETE FROM validators WHERE url IN (SELECT url FROM validators ORDER BY used LIMIT ?)',
+                    (excess,),
+                )
+                total -= excess
+        self._count = total
+
+    def close(self, timeout: float = 30.0):
+        """Openstaande writes afronden (maximaal `timeout` seconden) en de verbindingen sluiten."""
+        self._flush_touches()
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            logger.warning("[validators] writer niet op tijd klaar, laatste writes gaan verloren")
+        try:
+            self.conn.close()
+        except sqlite3.Error:
+            pass
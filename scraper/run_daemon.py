@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+NL: Langlopende scraper: één proces met één reactor en één Mongo pool dat elke source op een eigen interval
+crawlt, in plaats van elke run een nieuw run_sources.py proces (zie rentbird_scraper/daemon.py).
+Gebruik:
+  python run_daemon.py --sources pararius,kamernet --every 5
+  python run_daemon.py --sources all --max-per-city 25
+Status: .state/daemon.json en .state/metrics/daemon.prom. Stoppen met SIGTERM/Ctrl-C (lopende cycles
+worden netjes afgesloten; een tweede signaal stopt direct).
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+from scrapy.crawler import CrawlerRunner
+from scrapy.utils.log import configure_logging
+from scrapy.utils.ossignal import install_shutdown_handlers, signal_names
+from twisted.internet import task
+from twisted.python.failure import Failure
+
+from rentbird_scraper.daemon import (
+    ConfigWatcher, CycleLock, DaemonStatus, SourceSchedule, default_every_minutes, every_seconds, read_config,
+    source_names,
+)
+from rentbird_scraper.extensions import metrics_dir
+from rentbird_scraper.utils import known_index, mongo
+from rentbird_scraper.utils.frontier import reset_frontier
+from rentbird_scraper.utils.parse_pool import shutdown_pool
+from run_sources import init_reactor, project_settings, start_crawl
+
+
+logger = logging.getLogger('run_daemon')
+# Lock van een andere daemon bezet: zo lang wachten voor een nieuwe poging
+LOCK_RETRY_SECONDS = 60
+
+
+class Daemon:
+    def __init__(self, reactor, runner, settings, sources, opts: dict, every_minutes: float, tick: float):
+        self.reactor = reactor
+        self.runner = runner
+        self.settings = settings
+        # None = alle sources met een config (ook bestanden die er later bijkomen)
+        self.fixed_sources = sources
+        self.opts = opts
+        self.every_minutes = every_minutes
+        self.tick_seconds = tick
+        self.schedules = {}
+        self.watcher = ConfigWatcher()
+        self.status = DaemonStatus(self.schedules, settings.get('METRICS_DIR') or metrics_dir())
+        self.stopping = False
+        self.loop = None
+
+    def start(self):
+        logger.info(f"[daemon] gestart (pid {os.getpid()}), tick {self.tick_seconds}s, standaard elke "
+                    f"{self.every_minutes} min")
+        self.loop = task.LoopingCall(self.tick)
+        self.loop.start(self.tick_seconds, now=True).addErrback(
+            lambda f: logger.error(f"[daemon] tick gestopt: {f.getTraceback()}"))
+
+    # --- schedule ---
+
+    def sync_sources(self):
+        wanted = self.fixed_sources if self.fixed_sources is not None else source_names()
+        for source in wanted:
+            if source not in self.schedules:
+                self.schedules[source] = SourceSchedule(source, self.every_minutes * 60)
+        for source in list(self.schedules):
+            if source not in wanted and not self.schedules[source].running:
+                logger.info(f"[daemon] {source}: config verwijderd, niet meer ingepland")
+                del self.schedules[source]
+                self.watcher.forget(source)
+
+    def reload(self, source: str):
+        sched = self.schedules[source]
+        try:
+            cfg = read_config(source)
+            every = every_seconds(cfg, self.every_minutes)
+        except (OSError, ValueError, TypeError) as e:
+            # Ongeldige config: source wacht tot het bestand weer klopt (lopende cycle loopt door)
+            sched.config_error = str(e)
+            logger.error(f"[daemon] {source}: config niet te laden, source wacht: {e}")
+            return
+        if sched.config_error is not None or sched.last_started is not None:
+            logger.info(f"[daemon] {source}: config herladen (elke {every / 60:g} min)")
+        sched.config_error = None
+        if sched.every != every and sched.last_started is not None:
+            sched.next_at = sched.last_started + every
+        sched.every = every
+
+    def tick(self):
+        if self.stopping:
+            return
+        try:
+            self._tick()
+        except Exception:
+            # Nooit de LoopingCall laten stoppen
+            logger.exception("[daemon] fout in tick")
+
+    def _tick(self):
+        self.sync_sources()
+        for source in self.watcher.changed(list(self.schedules)):
+            self.reload(source)
+        now = time.time()
+        for sched in list(self.schedules.values()):
+            if sched.config_error is not None or not sched.due(now):
+                continue
+            if sched.running:
+                # Overlap: niet nog een cycle starten; de volgende begint direct na afloop
+                if not sched.overdue:
+                    sched.overdue = True
+                    sched.overlaps += 1
+                    logger.warning(f"[daemon] {sched.source}: vorige cycle loopt nog "
+                                   f"({now - sched.last_started:.0f}s), volgende wacht")
+                continue
+            self.start_cycle(sched, now)
+        self.write_status()
+
+    # --- cycles ---
+
+    def start_cycle(self, sched: SourceSchedule, now: float):
+        source = sched.source
+        lock = CycleLock(source)
+        if not lock.acquire():
+            sched.lock_busy += 1
+            sched.next_at = now + min(sched.every, LOCK_RETRY_SECONDS)
+            logger.warning(f"[daemon] {source}: lock bezet door een ander proces ({lock.path}), later opnieuw")
+            return
+        # Frontier is per run: elke listing één keer per cycle
+        reset_frontier(source)
+        opts = self.opts
+        try:
+            crawler, d = start_crawl(self.runner, self.settings, source, opts['cities'], opts['max'], opts['mode'],
+                                     opts['parser'], opts['max_per_city'])
+        except Exception as e:
+            lock.release()
+            sched.start(now)
+            sched.finish(time.time(), False, f"error: {e}")
+            logger.exception(f"[daemon] {source}: cycle niet gestart")
+            return
+        sched.start(now)
+        logger.info(f"[daemon] {source}: cycle {sched.cycles + 1} gestart")
+        d.addBoth(self.cycle_done, sched, crawler, lock)
+
+    def cycle_done(self, result, sched: SourceSchedule, crawler, lock: CycleLock):
+        lock.release()
+        stats = crawler.stats.get_stats() if crawler.stats is not None else {}
+        reason = stats.get('finish_reason')
+        items = int(stats.get('item_scraped_count', 0) or 0)
+        if isinstance(result, Failure):
+            logger.error(f"[daemon] {sched.source}: cycle mislukt: {result.getTraceback()}")
+            reason = f"error: {result.getErrorMessage()}"
+        sched.finish(time.time(), reason == 'finished', reason, items)
+        wait = max(0.0, sched.next_at - time.time())
+        logger.info(f"[daemon] {sched.source}: cycle {sched.cycles} klaar in {sched.last_duration:.1f}s "
+                    f"({reason}, {items} items), volgende over {wait:.0f}s")
+        if not self.stopping:
+            self.write_status()
+        return None
+
+    def write_status(self):
+        try:
+            self.status.write()
+        except OSError as e:
+            logger.warning(f"[daemon] status niet geschreven: {e}")
+
+    # --- stoppen ---
+
+    def on_signal(self, signum, _):
+        if self.stopping:
+            logger.info(f"[daemon] {signal_names[signum]} opnieuw, direct stoppen")
+            self.reactor.callFromThread(self._stop_reactor)
+            return
+        logger.info(f"[daemon] {signal_names[signum]} ontvangen, lopende cycles afsluiten")
+        self.reactor.callFromThread(self.stop)
+
+    def stop(self):
+        if self.stopping:
+            return
+        self.stopping = True
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        self.runner.stop()
+        self.runner.join().addBoth(self._stopped)
+
+    def _stopped(self, _):
+        self.write_status()
+        self._stop_reactor()
+
+    def _stop_reactor(self):
+        if self.reactor.running:
+            self.reactor.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sources', type=str, default=os.getenv('SCRAPER_SOURCES', 'pararius'),
+                        help="kommagescheiden, of 'all' voor elke config in config/sources (ook nieuwe bestanden)")
+    parser.add_argument('--every', type=float, default=default_every_minutes(),
+                        help="minuten tussen de starts van twee cycles per source (per source: daemon.everyMinutes)")
+    parser.add_argument('--tick', type=float, default=float(os.getenv('SCRAPER_DAEMON_TICK', '5')),
+                        help="seconden tussen twee controles van schedule en configbestanden")
+    parser.add_argument('--cities', type=str, default=None)
+    parser.add_argument('--max', type=int, default=0)
+    parser.add_argument('--max-per-city', type=int, default=int(os.getenv('SCRAPER_MAX_PER_CITY', '0') or 0))
+    parser.add_argument('--mode', choices=['auto', 'full', 'incremental', 'discovery'], default='auto')
+    parser.add_argument('--parser', choices=['bs4', 'lxml', 'parsel'], default=None)
+    parser.add_argument('--memory-bounded', action='store_true',
+                        help="zie run_sources.py; verstandig voor een proces dat dagen draait")
+    args = parser.parse_args()
+
+    if args.memory_bounded:
+        os.environ['SCRAPER_MEMORY_MODE'] = '1'
+    sources = None if args.sources.strip() == 'all' else [s.strip() for s in args.sources.split(',') if s.strip()]
+
+    settings = project_settings()
+    configure_logging(settings)
+    init_reactor(settings)
+    from twisted.internet import reactor
+
+    # Warme state tussen cycles
+    mongo.share_client()
+    known_index.keep_between_runs()
+
+    runner = CrawlerRunner(settings)
+    opts = {'cities': args.cities, 'max': args.max, 'max_per_city': args.max_per_city, 'mode': args.mode,
+            'parser': args.parser}
+    daemon = Daemon(reactor, runner, settings, sources, opts, args.every, max(0.5, args.tick))
+    install_shutdown_handlers(daemon.on_signal)
+    reactor.callWhenRunning(daemon.start)
+    reactor.run(installSignalHandlers=False)
+
+    shutdown_pool()
+    mongo.close_shared_client()
+    logger.info("[daemon] gestopt")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
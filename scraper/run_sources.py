@@ -3,15 +3,222 @@
 NL: Multi-source runner op basis van config.
 Gebruik:
   python run_sources.py --sources pararius --cities Amsterdam,Utrecht --max 50
+  python run_sources.py --sources pararius,kamernet --workers 4
+  python run_sources.py --sources pararius --record .archive/pararius
+  python run_sources.py --sources pararius --replay .archive/pararius --items items.jsonl
+  python run_sources.py --sources pararius --memory-bounded
 Als --cities ontbreekt, wordt config/cities_nl.json gebruikt.
 """
 import argparse
 import json
+import multiprocessing
 import os
 import importlib
-from scrapy.crawler import CrawlerProcess
+import shutil
+import sys
+from collections import defaultdict
+from scrapy.crawler import Crawler, CrawlerProcess
 from scrapy.utils.project import get_project_settings
+from scrapy.utils.reactor import install_reactor
+from rentbird_scraper.sharding import (
+    assert_disjoint, build_jobs, max_shards, merge_stats, plan_shards, scale_for_shards, shard_ranks,
+    shards_per_source, split_max,
+)
+from rentbird_scraper.extensions import clear_outputs, metrics_dir
+from rentbird_scraper.memory import memory_bounded, memory_settings
+from rentbird_scraper.replay import record_settings, replay_settings, replay_state_dir, reset_replay
 from rentbird_scraper.spiders.config_spider import ConfigSpider
+from rentbird_scraper.throughput import describe, source_settings
+from rentbird_scraper.utils.parse_pool import shutdown_pool
+
+
+def load_custom_spider(source_name: str):
+    try:
+        mod = importlib.import_module(f"rentbird_scraper.sources.{source_name}.spider")
+    except ModuleNotFoundError:
+        return None
+    # Prefer attribute 'Spider', else try <Source>Spider
+    spider_cls = getattr(mod, 'Spider', None)
+    if spider_cls is None:
+        alt_name = f"{source_name.capitalize()}Spider"
+        spider_cls = getattr(mod, alt_name, None)
+    return spider_cls
+
+
+def project_settings():
+    # Ensure Scrapy loads our project settings (pipelines, UA, delays)
+    os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'rentbird_scraper.settings')
+    return get_project_settings()
+
+
+def init_reactor(settings):
+    """TWISTED_REACTOR (bijv. asyncio) installeren; de Crawlers hieronder worden zelf gebouwd en doen dat niet."""
+    if settings.get('TWISTED_REACTOR'):
+        install_reactor(settings['TWISTED_REACTOR'], settings.get('ASYNCIO_EVENT_LOOP'))
+
+
+def items_path(path: str, sources, shard=None) -> str:
+    """Pad voor --items: per source een bestand bij meerdere sources, per shard een deelbestand."""
+    suffix = ''
+    if len(sources) > 1 and '%(source)s' not in path:
+        suffix += '.%(source)s'
+    if shard is not None:
+        suffix += f".shard{shard}"
+    if not suffix:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}{suffix}{ext or '.jsonl'}"
+
+
+def merge_item_files(path: str, sources, shards: int):
+    """Deelbestanden van de shards (items_path met shard) samenvoegen tot het --items bestand per source."""
+    for source in sources:
+        target = items_path(path, sources).replace('%(source)s', source)
+        with open(target, 'wb') as out:
+            for shard in range(shards):
+                part = items_path(path, sources, shard).replace('%(source)s', source)
+                if not os.path.exists(part):
+                    continue
+                with open(part, 'rb') as f:
+                    shutil.copyfileobj(f, out)
+                os.remove(part)
+
+
+def archive_settings(settings, opts: dict, sources, shard=None):
+    """--record / --replay / --items op de project settings zetten; met `shard` schrijft --items een deelbestand."""
+    if opts.get('record'):
+        record_settings(settings, opts['record'])
+    if opts.get('replay'):
+        # replay_settings zelf pas per source in crawl_source (na het throughput profiel)
+        settings.set('ARCHIVE_REPLAY_DIR', os.path.abspath(opts['replay']), priority='cmdline')
+    if opts.get('items'):
+        path = items_path(opts['items'], sources, shard)
+        settings.set('FEEDS', {path: {'format': 'jsonlines', 'overwrite': True, 'encoding': 'utf8'}}, priority='cmdline')
+    return settings
+
+
+def crawl_source(process, settings, source: str, cities, max_items: int, mode: str, parser,
+                 max_per_city: int = 0, shards: int = 1, shard=None, rank: int = 0):
+    """Voegt een Crawler voor één source toe; `cities` is een kommagescheiden string of None."""
+    crawler, _ = start_crawl(process, settings, source, cities, max_items, mode, parser, max_per_city, shards, shard,
+                             rank)
+    return crawler
+
+
+def start_crawl(process, settings, source: str, cities, max_items: int, mode: str, parser,
+                max_per_city: int = 0, shards: int = 1, shard=None, rank: int = 0):
+    """Zoals crawl_source, maar geeft ook de Deferred van de crawl terug (CrawlerRunner in run_daemon.py)."""
+    # Eigen Crawler per source: concurrency, delay en backoff budget uit het throughput profiel
+    crawler_settings = scale_for_shards(source_settings(settings, source), shards, rank)
+    if memory_bounded():
+        memory_settings(crawler_settings)
+    if settings.get('ARCHIVE_REPLAY_DIR'):
+        replay_settings(crawler_settings, settings['ARCHIVE_REPLAY_DIR'])
+    if shard is not None:
+        # Eigen metrics bestanden per shard (extensions.CrawlMetrics)
+        crawler_settings.set('METRICS_SHARD', shard, priority='spider')
+    print(f"[{source}] throughput: {describe(crawler_settings)}")
+    spider_cls = load_custom_spider(source)
+    if spider_cls:
+        crawler = Crawler(spider_cls, crawler_settings)
+        d = process.crawl(crawler, cities=cities, max_items=max_items, max_per_city=max_per_city,
+                          crawl_mode=mode, parser=parser)
+    else:
+        crawler = Crawler(ConfigSpider, crawler_settings)
+        d = process.crawl(crawler, source=source, cities=cities, max_items=max_items, max_per_city=max_per_city,
+                          crawl_mode=mode, parser=parser)
+    return crawler, d
+
+
+def run_shard(index: int, jobs, cities_total: int, shard_counts: dict, ranks: dict, opts: dict, results):
+    """Entry point van een worker proces: crawlt alleen de eigen (source, stad) jobs."""
+    # Elke shard een eigen --items deelbestand (overwrite); run_sharded voegt ze na afloop samen
+    settings = archive_settings(project_settings(), opts, opts['sources'], index)
+    init_reactor(settings)
+    process = CrawlerProcess(settings)
+    by_source = defaultdict(list)
+    for source, city in jobs:
+        by_source[source].append(city)
+    crawlers = {}
+    for source, cities in by_source.items():
+        if cities == [None]:
+            # Niet per stad te verdelen: hele source in deze shard
+            cities_arg, max_items = opts['cities'], opts['max']
+        else:
+            cities_arg = ','.join(cities)
+            max_items = split_max(opts['max'], len(cities), cities_total)
+        crawlers[source] = crawl_source(process, settings, source, cities_arg, max_items, opts['mode'], opts['parser'],
+                                        opts['max_per_city'], shard_counts.get(source, 1), index,
+                                        ranks.get(source, 0))
+    process.start()
+    shutdown_pool()
+    results.put((index, jobs, {s: c.stats.get_stats() for s, c in crawlers.items()}))
+
+
+def run_sharded(args, sources, workers: int) -> int:
+    if args.cities:
+        cities = [c.strip() for c in args.cities.split(',') if c.strip()]
+    else:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config', 'cities_nl.json'), 'r') as f:
+            cities = json.load(f)
+    # Per-domein concurrency en backoff budget per source bepalen hoeveel shards hij mag krijgen
+    base = project_settings()
+    limits = {s: max_shards(source_settings(base, s)) for s in sources}
+    shards = plan_shards(build_jobs(sources, cities, workers, limits), workers)
+    counts = shards_per_source(shards)
+    ranks = shard_ranks(shards)
+    for source in sources:
+        if limits[source] < min(workers, len(cities)):
+            print(f"[shards] {source}: per-domein limiet {limits[source]} < {workers} workers, niet per stad verdeeld")
+    opts = {'cities': args.cities, 'max': args.max, 'max_per_city': args.max_per_city,
+            'mode': args.mode, 'parser': args.parser, 'record': args.record, 'replay': args.replay,
+            'items': args.items, 'sources': sources}
+    print(f"[shards] {len(shards)} workers, {sum(len(s) for s in shards)} (source, stad) jobs")
+    directory = project_settings().get('METRICS_DIR') or metrics_dir()
+    for source in sources:
+        clear_outputs(directory, source, shards_only=False)
+
+    # spawn: elke worker een schone interpreter met een eigen reactor
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    procs = []
+    for i, jobs in enumerate(shards):
+        p = ctx.Process(target=run_shard, args=(i, jobs, len(cities), counts, ranks[i], opts, results),
+                        name=f"shard-{i}")
+        p.start()
+        procs.append(p)
+
+    # Eerst de queue leegmaken, anders kan join() blijven hangen
+    reported = {}
+    alive = list(procs)
+    while alive and len(reported) < len(procs):
+        try:
+            index, jobs, stats = results.get(timeout=5)
+            reported[index] = (jobs, stats)
+        except Exception:
+            alive = [p for p in alive if p.is_alive()]
+    for p in procs:
+        p.join()
+
+    if args.items:
+        merge_item_files(args.items, sources, len(shards))
+    assert_disjoint([jobs for jobs, _ in reported.values()])
+    failed = [p.name for p in procs if p.exitcode != 0]
+
+    per_source = defaultdict(list)
+    for _, stats in reported.values():
+        for source, s in stats.items():
+            per_source[source].append(s)
+    for source in sorted(per_source):
+        merged = merge_stats(per_source[source])
+        keys = ('item_scraped_count', 'mongo/new', 'mongo/changed', 'mongo/unchanged', 'known_index/hit_rate',
+                'downloader/request_count', 'finish_reason', 'elapsed_time_seconds')
+        summary = ' '.join(f"{k}={merged[k]}" for k in keys if k in merged)
+        print(f"[shards] {source} ({len(per_source[source])} shards): {summary}")
+    if failed or len(reported) < len(procs):
+        print(f"[shards] ⚠️  mislukt: {', '.join(failed) or 'geen resultaat van alle shards'}")
+        return 1
+    return 0
 
 
 def main():
@@ -19,35 +226,58 @@ def main():
     parser.add_argument('--sources', type=str, default='pararius')
     parser.add_argument('--cities', type=str, default=None)
     parser.add_argument('--max', type=int, default=0)
+    parser.add_argument('--max-per-city', type=int, default=int(os.getenv('SCRAPER_MAX_PER_CITY', '0') or 0),
+                        help="Maximaal aantal items per stad (per source); --max blijft het totaal")
+    parser.add_argument('--mode', choices=['auto', 'full', 'incremental', 'discovery'], default='auto',
+                        help="auto: volgens 'discovery' en 'incremental' blok in de source config")
+    parser.add_argument('--parser', choices=['bs4', 'lxml', 'parsel'], default=None,
+                        help="HTML parser backend voor alle sources (standaard: 'parser' in de source config of SCRAPER_PARSER)")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('SCRAPER_WORKERS', '1')),
+                        help="Aantal processen; (source, stad) werk wordt over de workers verdeeld")
+    parser.add_argument('--record', metavar='DIR', default=None,
+                        help="Alle responses opnemen in een lokaal archief (zie rentbird_scraper/replay.py)")
+    parser.add_argument('--replay', metavar='DIR', default=None,
+                        help="Responses uit het archief afspelen, zonder netwerk en zonder delays")
+    parser.add_argument('--replay-collection', default='properties_replay',
+                        help="Mongo collectie voor --replay (niet de echte properties)")
+    parser.add_argument('--sink', choices=['mongo', 'file'], default=None,
+                        help="file: items naar lokale bestanden (SCRAPER_SINK_DIR), later laden met load_sink.py")
+    parser.add_argument('--items', metavar='FILE', default=None,
+                        help="Items ook als JSON lines wegschrijven (per source met %%(source)s)")
+    parser.add_argument('--memory-bounded', action='store_true',
+                        help="Geheugen begrenzen: minder responses in-flight, request queue naar schijf (rentbird_scraper/memory.py)")
     args = parser.parse_args()
 
     sources = [s.strip() for s in args.sources.split(',') if s.strip()]
+    if args.record and args.replay:
+        parser.error('--record en --replay gaan niet samen')
+    if args.sink:
+        # Via de omgeving, zodat ook shard processen en settings.py het zien
+        os.environ['SCRAPER_SINK'] = args.sink
+    if args.memory_bounded:
+        os.environ['SCRAPER_MEMORY_MODE'] = '1'
+    if args.replay:
+        # Replay raakt de echte state en collectie niet (geldt ook voor shard processen)
+        os.environ['SCRAPER_STATE_DIR'] = replay_state_dir(args.replay)
+        os.environ['SCRAPER_COLLECTION'] = args.replay_collection
+        # Geen change events voor de matcher uit een replay
+        os.environ['SCRAPER_OUTBOX'] = '0'
+        # Reproduceerbaar: geen state of listings van een vorige replay, altijd een volledige crawl
+        reset_replay(args.replay, args.replay_collection)
+        if args.mode == 'auto':
+            args.mode = 'full'
 
-    # Ensure Scrapy loads our project settings (pipelines, UA, delays)
-    os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'rentbird_scraper.settings')
-    settings = get_project_settings()
-    process = CrawlerProcess(settings)
-
-    def load_custom_spider(source_name: str):
-        try:
-            mod = importlib.import_module(f"rentbird_scraper.sources.{source_name}.spider")
-        except ModuleNotFoundError:
-            return None
-        # Prefer attribute 'Spider', else try <Source>Spider
-        spider_cls = getattr(mod, 'Spider', None)
-        if spider_cls is None:
-            alt_name = f"{source_name.capitalize()}Spider"
-            spider_cls = getattr(mod, alt_name, None)
-        return spider_cls
+    if args.workers > 1:
+        sys.exit(run_sharded(args, sources, args.workers))
 
+    settings = archive_settings(project_settings(), vars(args), sources)
+    init_reactor(settings)
+    process = CrawlerProcess(settings)
     for s in sources:
-        spider_cls = load_custom_spider(s)
-        if spider_cls:
-            process.crawl(spider_cls, cities=args.cities, max_items=args.max)
-        else:
-            process.crawl(ConfigSpider, source=s, cities=args.cities, max_items=args.max)
+        crawl_source(process, settings, s, args.cities, args.max, args.mode, args.parser, args.max_per_city)
 
     process.start()
+    shutdown_pool()
 
 
 if __name__ == '__main__':
@@ -3,6 +3,8 @@
  Standalone scraper scheduler (no external npm deps).
  Reads scraper/.env (and process.env), then runs run_sources.py every N minutes
  for the configured sources. Designed to run via `npm start` in scraper/.
+ With SCRAPER_DAEMON=1 it starts one long-running run_daemon.py instead (same
+ interval, restarted if it exits) and only reports the metrics.
 */
 const { spawn } = require('child_process');
 const fs = require('fs');
@@ -41,6 +43,9 @@ const DELAY = process.env.SCRAPER_DELAY || '0.75';
 const CONCURRENCY = process.env.SCRAPER_CONCURRENCY || '6';
 const LOG = process.env.SCRAPER_LOG || 'INFO';
 const OBEY = (process.env.SCRAPER_OBEY == null) ? '1' : process.env.SCRAPER_OBEY;
+const DAEMON = process.env.SCRAPER_DAEMON === '1';
+const METRICS_DIR = process.env.SCRAPER_METRICS_DIR
+  || path.join(process.env.SCRAPER_STATE_DIR || path.join(HERE, '.state'), 'metrics');
 
 function pythonPath() {
   const venvUnix = path.join(HERE, '.venv', 'bin', 'python');
@@ -75,12 +80,8 @@ async function ensureVenv() {
   });
 }
 
-async function runOnce() {
-  const py = pythonPath() || 'python3';
-  const script = path.join(HERE, 'run_sources.py');
-  const args = ['--sources', SOURCES.join(',')];
-  if (MAX_PER_CITY && MAX_PER_CITY > 0) { args.push('--max', String(MAX_PER_CITY)); }
-  const env = {
+function scraperEnv() {
+  return {
     ...process.env,
     SCRAPER_DELAY: String(DELAY),
     SCRAPER_CONCURRENCY: String(CONCURRENCY),
@@ -88,12 +89,92 @@ async function runOnce() {
     SCRAPER_OBEY: OBEY,
     SCRAPY_SETTINGS_MODULE: 'rentbird_scraper.settings'
   };
+}
+
+async function runOnce() {
+  const py = pythonPath() || 'python3';
+  const script = path.join(HERE, 'run_sources.py');
+  const args = ['--sources', SOURCES.join(',')];
+  if (MAX_PER_CITY && MAX_PER_CITY > 0) { args.push('--max-per-city', String(MAX_PER_CITY)); }
+  const env = scraperEnv();
   console.log(`[scheduler] ➜ scrape start: sources=${SOURCES.join(',')} every=${EVERY_MINUTES}min max=${MAX_PER_CITY}`);
   await new Promise((resolve) => {
     const child = spawn(py, [script, ...args], { cwd: HERE, env, stdio: 'inherit' });
     child.on('close', () => resolve());
   });
   console.log(`[scheduler] ⇦ scrape done`);
+  reportMetrics();
+}
+
+// Eén langlopend run_daemon.py proces; het plant zelf de cycles per source (zonder overlap)
+function runDaemon() {
+  const py = pythonPath() || 'python3';
+  const args = [path.join(HERE, 'run_daemon.py'), '--sources', SOURCES.join(','), '--every', String(EVERY_MINUTES)];
+  if (MAX_PER_CITY && MAX_PER_CITY > 0) { args.push('--max-per-city', String(MAX_PER_CITY)); }
+  console.log(`[scheduler] ➜ daemon start: sources=${SOURCES.join(',')} every=${EVERY_MINUTES}min max=${MAX_PER_CITY}`);
+  const child = spawn(py, args, { cwd: HERE, env: scraperEnv(), stdio: 'inherit' });
+  const forward = (sig) => () => { child.kill(sig); process.exit(0); };
+  process.once('SIGTERM', forward('SIGTERM'));
+  process.once('SIGINT', forward('SIGINT'));
+  child.on('close', (code) => {
+    console.error(`[scheduler] daemon gestopt (code ${code}), herstart over 30s`);
+    process.removeAllListeners('SIGTERM');
+    process.removeAllListeners('SIGINT');
+    setTimeout(runDaemon, 30 * 1000);
+  });
+}
+
+// Samenvattingen van CrawlMetrics (<source>.json of <source>.shard-N.json) per run
+// vergelijken met de vorige run en als één regel per source in history.jsonl zetten.
+const previous = {};
+
+function readSummaries(source) {
+  let names = [];
+  try { names = fs.readdirSync(METRICS_DIR); } catch { return []; }
+  const shard = `${source}.shard-`;
+  const mine = (n) => n === `${source}.json`
+    || (n.startsWith(shard) && /^\d+\.json$/.test(n.slice(shard.length)));
+  return names.filter(mine).map((n) => {
+    try { return JSON.parse(fs.readFileSync(path.join(METRICS_DIR, n), 'utf-8')); } catch { return null; }
+  }).filter(Boolean);
+}
+
+function reportMetrics() {
+  for (const source of SOURCES) {
+    const parts = readSummaries(source);
+    if (!parts.length) continue;
+    const elapsed = Math.max(...parts.map((p) => p.elapsedSeconds || 0));
+    const items = parts.reduce((n, p) => n + (p.items || 0), 0);
+    const p95 = Math.max(0, ...parts.flatMap((p) => Object.values(p.download || {}).map((d) => d.p95 || 0)));
+    // Discovery latency van nieuwe listings; shards niet samen te voegen, dus de slechtste shard
+    const fresh = parts.map((p) => (p.discoveryLatency || {}).new).filter(Boolean);
+    const run = {
+      source,
+      finishedAt: parts.map((p) => p.finishedAt).sort().pop(),
+      items,
+      itemsPerSecond: elapsed > 0 ? +(items / elapsed).toFixed(3) : 0,
+      downloadP95: p95,
+      newListings: fresh.reduce((n, l) => n + (l.count || 0), 0),
+      newLatencyP50: fresh.length ? Math.max(...fresh.map((l) => l.p50 || 0)) : null,
+      newLatencyP95: fresh.length ? Math.max(...fresh.map((l) => l.p95 || 0)) : null,
+      finishReasons: [...new Set(parts.map((p) => p.finishReason))],
+    };
+    const prev = previous[source];
+    if (prev && prev.finishedAt === run.finishedAt) continue; // geen nieuwe run voor deze source
+    const trend = prev && prev.itemsPerSecond
+      ? ` (${run.itemsPerSecond >= prev.itemsPerSecond ? '+' : ''}${Math.round((run.itemsPerSecond / prev.itemsPerSecond - 1) * 100)}% t.o.v. vorige run)`
+      : '';
+    const latency = run.newListings
+      ? `, ${run.newListings} nieuw (p50 ${Math.round(run.newLatencyP50)}s, p95 ${Math.round(run.newLatencyP95)}s na start)`
+      : '';
+    console.log(`[scheduler] ${source}: ${items} items, ${run.itemsPerSecond}/s${trend}, download p95 ${p95}s${latency}, ${run.finishReasons.join(',')}`);
+    previous[source] = run;
+    try {
+      fs.appendFileSync(path.join(METRICS_DIR, 'history.jsonl'), JSON.stringify(run) + '\n');
+    } catch (e) {
+      console.error('[scheduler] history.jsonl niet geschreven:', e.message);
+    }
+  }
 }
 
 (async () => {
@@ -103,6 +184,12 @@ async function runOnce() {
     console.error('[scheduler] venv setup failed:', e.message);
   }
   console.log(`[scheduler] planning every ${EVERY_MINUTES} minutes (times/day=${Math.round(1440/EVERY_MINUTES)})`);
+  if (DAEMON) {
+    runDaemon();
+    // De daemon schrijft <source>.json na elke cycle; reportMetrics slaat ongewijzigde runs over
+    setInterval(reportMetrics, 60 * 1000);
+    return;
+  }
   // initial run
   runOnce().catch(e => console.error('[scheduler] run error:', e.message));
   // schedule
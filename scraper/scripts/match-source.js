@@ -26,22 +26,74 @@ const Property = require('../../server/models/Property');
 const matchingService = require('../../server/services/matchingService');
 
 function parseArgs(argv) {
-  const args = { minutes: 120, limit: 200 };
+  const args = { minutes: 120, limit: 200, outbox: false, consumer: 'match-source' };
   for (let i=2;i<argv.length;i++){
     const a = argv[i];
     if (a === '--source' && argv[i+1]) { args.sources = [argv[++i]]; }
     else if (a === '--sources' && argv[i+1]) { args.sources = argv[++i].split(',').map(s=>s.trim()).filter(Boolean); }
     else if (a === '--minutes' && argv[i+1]) { args.minutes = parseInt(argv[++i],10)||120; }
     else if (a === '--limit' && argv[i+1]) { args.limit = parseInt(argv[++i],10)||200; }
+    else if (a === '--outbox') { args.outbox = true; }
+    else if (a === '--consumer' && argv[i+1]) { args.consumer = argv[++i]; }
     else if (a === '--help' || a === '-h') { args.help = true; }
   }
   return args;
 }
 
+async function matchProperty(prop){
+  await matchingService.findMatchesForProperty(prop);
+  await Property.updateOne({ _id: prop._id }, { $set: { matchingCheckedAt: new Date() } });
+}
+
+// Tail de change-event outbox van de scraper (property_events) vanaf het checkpoint
+// in matcher_checkpoints. Een gat in seq (batch van een andere scraper nog niet
+// ingevoegd) wacht tot OUTBOX_GAP_SECONDS oud; daarna wordt het overgeslagen.
+async function runOutbox({ limit, sources, consumer }){
+  const db = mongoose.connection.db;
+  const events = db.collection(process.env.SCRAPER_OUTBOX_COLLECTION || 'property_events');
+  const checkpoints = db.collection('matcher_checkpoints');
+  const id = sources && sources.length ? `${consumer}:${[...sources].sort().join(',')}` : consumer;
+  const gapMs = (parseInt(process.env.OUTBOX_GAP_SECONDS || '60', 10) || 0) * 1000;
+  const cp = await checkpoints.findOne({ _id: id });
+  let last = cp ? cp.seq : 0;
+  const batch = await events.find({ seq: { $gt: last } }).sort({ seq: 1 }).limit(limit).toArray();
+  const todo = new Map();
+  let skipped = 0;
+  for (const ev of batch) {
+    if (ev.seq !== last + 1 && Date.now() - new Date(ev.at).getTime() < gapMs) {
+      console.log(`⏳ Gap after seq ${last} (next ${ev.seq}), waiting for next run`);
+      break;
+    }
+    last = ev.seq;
+    if (sources && sources.length && !sources.includes(ev.source)) continue;
+    const key = `${ev.source}:${ev.sourceId}`;
+    // Laatste event per listing telt; delisted hoeft niet gematcht te worden
+    todo.delete(key);
+    if (ev.type === 'delisted') { skipped++; continue; }
+    todo.set(key, ev);
+  }
+  console.log(`🔎 Outbox ${id}: ${todo.size} to match (events ${cp ? cp.seq : 0}..${last}, delisted ${skipped})`);
+  let ok=0, fail=0;
+  for (const ev of todo.values()) {
+    const prop = await Property.findOne({ source: ev.source, sourceId: ev.sourceId, price: { $gt: 0 } });
+    if (!prop || prop.isStillAvailable === false) continue;
+    try {
+      await matchProperty(prop);
+      ok++;
+    } catch (e) {
+      // Blijft zonder matchingCheckedAt, dus de scan-modus pakt hem nog op
+      console.error(`   ❌ Match error ${prop._id}:`, e.message);
+      fail++;
+    }
+  }
+  await checkpoints.updateOne({ _id: id }, { $set: { seq: last, updatedAt: new Date() } }, { upsert: true });
+  console.log(`✅ Done. Matched ${ok}, errors ${fail}, checkpoint ${last}.`);
+}
+
 async function main(){
-  const { minutes, limit, sources, help } = parseArgs(process.argv);
+  const { minutes, limit, sources, help, outbox, consumer } = parseArgs(process.argv);
   if (help){
-    console.log('Usage: npm run match -- --source <src>|--sources a,b [--minutes 120] [--limit 200]');
+    console.log('Usage: npm run match -- --source <src>|--sources a,b [--minutes 120] [--limit 200] [--outbox [--consumer name]]');
     process.exit(0);
   }
   const uri = process.env.MONGODB_URI;
@@ -49,6 +101,7 @@ async function main(){
   await mongoose.connect(uri);
   console.log('✅ Connected to MongoDB');
   try {
+    if (outbox) { await runOutbox({ limit, sources, consumer }); return; }
     const since = new Date(Date.now() - minutes * 60 * 1000);
     const query = {
       scrapedAt: { $gte: since },
@@ -65,8 +118,7 @@ async function main(){
     let ok=0, fail=0;
     for (const prop of props) {
       try {
-        await matchingService.findMatchesForProperty(prop);
-        await Property.updateOne({ _id: prop._id }, { $set: { matchingCheckedAt: new Date() } });
+        await matchProperty(prop);
         ok++;
       } catch (e) {
         console.error(`   ❌ Match error ${prop._id}:`, e.message);
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import mongomock
+import pytest
+from twisted.internet import defer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """mongomock database; capped collections (outbox) worden gewone collecties."""
+    create = mongomock.database.Database.create_collection
+    monkeypatch.setattr(mongomock.database.Database, 'create_collection',
+                        lambda self, name, **kwargs: create(self, name))
+    return mongomock.MongoClient().get_database('fyxed')
+
+
+@pytest.fixture
+def inline_threads(monkeypatch):
+    """deferToThread in BulkWriter synchroon uitvoeren (geen draaiende reactor nodig)."""
+    from rentbird_scraper.utils import bulk
+    monkeypatch.setattr(bulk.threads, 'deferToThread', lambda f, *a, **kw: defer.maybeDeferred(f, *a, **kw))
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('SCRAPER_STATE_DIR', str(tmp_path / 'state'))
+    return tmp_path / 'state'
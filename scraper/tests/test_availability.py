@@ -0,0 +1,57 @@
+import datetime as dt
+
+from rentbird_scraper.utils.availability import ALL_CITIES, sweep
+from rentbird_scraper.utils.outbox import Outbox
+
+NOW = dt.datetime(2026, 10, 1, 12, 0)
+
+
+def seed(db, city, ids, **kw):
+    db.props.insert_many([{'source': 'pararius', 'sourceId': sid, 'address': {'city': city},
+                           'isStillAvailable': True, **kw} for sid in ids])
+
+
+def doc(db, sid):
+    return db.props.find_one({'sourceId': sid})
+
+
+def test_missing_listing_archived_after_required_misses(db):
+    seed(db, 'Utrecht', ['1', '2', '3'])
+    counts = sweep(db.props, 'pararius', {'1', '2'}, ['utrecht'], misses_required=2, now=NOW)
+    assert counts['missing'] == 1 and counts['marked_unavailable'] == 0
+    assert doc(db, '3')['missedRuns'] == 1 and doc(db, '3')['isStillAvailable'] is True
+
+    counts = sweep(db.props, 'pararius', {'1', '2'}, ['utrecht'], misses_required=2, now=NOW)
+    assert counts['marked_unavailable'] == 1
+    assert doc(db, '3')['isStillAvailable'] is False
+    assert doc(db, '3')['unavailableAt'] == NOW
+
+
+def test_only_clean_cities_are_swept(db):
+    seed(db, 'Utrecht', ['u1'])
+    seed(db, 'Amsterdam', ['a1'])
+    sweep(db.props, 'pararius', set(), ['utrecht'], misses_required=1, now=NOW)
+    assert doc(db, 'u1')['isStillAvailable'] is False
+    assert doc(db, 'a1')['isStillAvailable'] is True
+
+    sweep(db.props, 'pararius', set(), [ALL_CITIES], misses_required=1, now=NOW)
+    assert doc(db, 'a1')['isStillAvailable'] is False
+
+
+def test_suspicious_city_is_skipped(db):
+    seed(db, 'Utrecht', [str(i) for i in range(10)])
+    counts = sweep(db.props, 'pararius', {'0', '1', '2'}, ['utrecht'], misses_required=1, now=NOW)
+    assert counts['skipped_suspicious'] == 1
+    assert db.props.count_documents({'isStillAvailable': False}) == 0
+
+
+def test_seen_listing_is_reactivated_with_event(db):
+    seed(db, 'Utrecht', ['1'], missedRuns=2)
+    db.props.update_one({'sourceId': '1'}, {'$set': {'isStillAvailable': False, 'unavailableAt': NOW}})
+    outbox = Outbox(db)
+    counts = sweep(db.props, 'pararius', {'1'}, [], now=NOW, outbox=outbox)
+    assert counts['events'] == 1
+    assert doc(db, '1')['isStillAvailable'] is True
+    assert doc(db, '1')['missedRuns'] == 0 and 'unavailableAt' not in doc(db, '1')
+    event = db.property_events.find_one()
+    assert (event['type'], event['sourceId'], event['city']) == ('reactivated', '1', 'Utrecht')
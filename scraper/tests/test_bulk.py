@@ -0,0 +1,99 @@
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from rentbird_scraper.utils.bulk import BulkWriter
+
+
+def upsert(sid, price):
+    return UpdateOne({'sourceId': sid}, {'$set': {'price': price}}, upsert=True)
+
+
+def test_flush_at_batch_size_and_merge_per_key(db, inline_threads):
+    results = []
+    writer = BulkWriter(db.props, batch_size=3, flush_interval=0,
+                        on_result=lambda entries, upserted: results.append((entries, upserted)))
+    writer.add('a', upsert('a', 1), 'a1')
+    writer.add('a', upsert('a', 2), 'a2')  # zelfde key: laatste wint
+    writer.add('b', upsert('b', 1), 'b1')
+    assert len(writer) == 2 and not results
+    writer.add('c', upsert('c', 1), 'c1')
+    assert results == [(['a2', 'b1', 'c1'], {0, 1, 2})]
+    assert db.props.find_one({'sourceId': 'a'})['price'] == 2
+    writer.close()
+    assert db.props.count_documents({}) == 3
+
+
+def test_write_errors_reported_per_entry(db, inline_threads, monkeypatch):
+    errors, results = [], []
+
+    def bulk_write(ops, ordered):
+        raise BulkWriteError({'writeErrors': [{'index': 1, 'errmsg': 'dup'}], 'upserted': [{'index': 0}]})
+
+    monkeypatch.setattr(db.props, 'bulk_write', bulk_write)
+    writer = BulkWriter(db.props, batch_size=10, flush_interval=0,
+                        on_error=lambda entry, err: errors.append((entry, err['errmsg'])),
+                        on_result=lambda entries, upserted: results.append(upserted))
+    writer.add('a', upsert('a', 1), 'a')
+    writer.add('b', upsert('b', 1), 'b')
+    writer.close()
+    assert errors == [('b', 'dup')]
+    assert results == [{0}]
+
+
+def test_prepare_skips_none_and_maps_indexes(db, inline_threads):
+    after = []
+    writer = BulkWriter(db.props, batch_size=10, flush_interval=0,
+                        prepare=lambda entries: [None if e == 'skip' else upsert(e, 1) for e in entries],
+                        after_write=lambda entries, failed, upserted: after.append((failed, upserted)))
+    for e in ('skip', 'x', 'y'):
+        writer.add(e, None, e)
+    writer.close()
+    # Indexen in `entries`, niet in de verstuurde operaties
+    assert after == [(set(), {1, 2})]
+
+
+def test_any_batch_failure_reports_every_entry(db, inline_threads):
+    errors = []
+
+    def prepare(entries):
+        raise ValueError('kapot')
+
+    writer = BulkWriter(db.props, batch_size=10, flush_interval=0, prepare=prepare,
+                        on_error=lambda entry, err: errors.append((entry, err['errmsg'])))
+    writer.add('a', None, 'a')
+    writer.add('b', None, 'b')
+    writer.close()
+    assert errors == [('a', 'kapot'), ('b', 'kapot')]
+
+
+def test_error_in_callback_is_not_reported_as_failed_write(db, inline_threads):
+    errors = []
+
+    def on_result(entries, upserted):
+        raise RuntimeError('bug in de callback')
+
+    writer = BulkWriter(db.props, batch_size=10, flush_interval=0, on_result=on_result,
+                        on_error=lambda entry, err: errors.append(entry))
+    writer.add('a', upsert('a', 1), 'a')
+    writer.close()
+    assert errors == []
+    assert db.props.count_documents({}) == 1
+
+
+def test_backpressure_waits_for_pending_flush(db, monkeypatch):
+    from twisted.internet import defer
+    from rentbird_scraper.utils import bulk
+    pending = []
+
+    def defer_to_thread(f, *args):
+        d = defer.Deferred()
+        pending.append((d, f, args))
+        return d
+
+    monkeypatch.setattr(bulk.threads, 'deferToThread', defer_to_thread)
+    writer = BulkWriter(db.props, batch_size=1, flush_interval=0, max_pending=1)
+    waiter = writer.add('a', upsert('a', 1), 'a')
+    assert waiter is not None and not waiter.called
+    d, f, args = pending.pop()
+    d.callback(f(*args))
+    assert waiter.called
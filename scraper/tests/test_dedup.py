@@ -0,0 +1,60 @@
+from rentbird_scraper.utils.dedup import DedupIndex
+
+
+def listing(source, sid, **kw):
+    item = {'source': source, 'sourceId': sid, 'title': 'Appartement Oudegracht', 'price': 1500, 'size': 60,
+            'rooms': 3.0, 'address': {'city': 'Utrecht', 'street': 'Oudegracht 12'},
+            'images': [f'https://cdn.example.nl/{sid}/woonkamer-abc123.jpg']}
+    item.update(kw)
+    return item
+
+
+def test_same_home_on_two_sources_shares_canonical():
+    index = DedupIndex()
+    a = listing('pararius', '1')
+    b = listing('funda', '9', price=1520)
+    assert index.assign(a) is None
+    assert index.assign(b) == 'pararius:1'
+    # Kleinste key wint; het eerder opgenomen lid komt in `relabelled`
+    assert b['canonicalId'] == 'funda:9'
+    assert index.canonical('utrecht', 'pararius:1') == 'funda:9'
+    assert index.relabelled == [('pararius:1', 'funda:9')]
+
+
+def test_order_independent_canonical():
+    index = DedupIndex()
+    b = listing('funda', '9')
+    a = listing('pararius', '1')
+    index.assign(b)
+    assert index.assign(a) == 'funda:9'
+    assert a['canonicalId'] == 'funda:9' and index.relabelled == []
+
+
+def test_different_house_number_or_same_source_is_not_a_duplicate():
+    index = DedupIndex()
+    index.assign(listing('pararius', '1'))
+    other = listing('funda', '9', address={'city': 'Utrecht', 'street': 'Oudegracht 14'})
+    assert index.assign(other) is None and other['canonicalId'] == 'funda:9'
+    same_source = listing('pararius', '2')
+    assert index.assign(same_source) is None
+
+
+def test_other_city_is_a_separate_index():
+    index = DedupIndex()
+    index.assign(listing('pararius', '1'))
+    elsewhere = listing('funda', '9', address={'city': 'Amsterdam', 'street': 'Oudegracht 12'})
+    assert index.assign(elsewhere) is None
+    assert index.loaded('utrecht') and index.loaded('amsterdam')
+
+
+def test_load_rebuilds_index_from_stored_bands(db):
+    first = DedupIndex()
+    stored = listing('pararius', '1')
+    first.assign(stored)
+    db.props.insert_one(dict(stored, isStillAvailable=True))
+    db.props.insert_one(dict(listing('pararius', '2'), isStillAvailable=False, dedup=stored['dedup']))
+
+    index = DedupIndex()
+    assert index.load(db.props, 'utrecht') == 1
+    assert index.assign(listing('funda', '9')) == 'pararius:1'
+    assert index.canonical('utrecht', 'pararius:1') == 'funda:9'
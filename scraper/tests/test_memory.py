@@ -0,0 +1,51 @@
+import os
+
+from scrapy import Request, Spider
+from scrapy.utils.test import get_crawler
+
+from rentbird_scraper.memory import SCHEDULER, SpillingScheduler
+
+
+class _Spider(Spider):
+    name = 'test'
+    source = 'pararius'
+
+    def parse(self, response):
+        pass
+
+
+def open_scheduler(spill_after):
+    crawler = get_crawler(_Spider, {'SCHEDULER': SCHEDULER, 'SCHEDULER_SPILL_AFTER': spill_after})
+    crawler.spider = crawler._create_spider()
+    scheduler = SpillingScheduler.from_crawler(crawler)
+    scheduler.open(crawler.spider)
+    return crawler, scheduler
+
+
+def test_spills_above_threshold_and_cleans_up(state_dir):
+    crawler, scheduler = open_scheduler(2)
+    assert scheduler.spill_dir.startswith(str(state_dir / 'spill' / 'pararius-'))
+    for i in range(5):
+        scheduler.enqueue_request(Request(f'https://example.nl/{i}', dont_filter=True))
+    assert len(scheduler.mqs) == 2 and len(scheduler.dqs) == 3
+    assert crawler.stats.get_value('scheduler/spilled') == 3
+
+    urls = []
+    while (request := scheduler.next_request()) is not None:
+        urls.append(request.url)
+    assert sorted(urls) == [f'https://example.nl/{i}' for i in range(5)]
+    assert crawler.stats.get_value('scheduler/dequeued/disk') == 3
+
+    spill_dir = scheduler.spill_dir
+    scheduler.close('finished')
+    assert not os.path.exists(spill_dir)
+
+
+def test_spilled_high_priority_request_comes_first(state_dir):
+    _, scheduler = open_scheduler(1)
+    scheduler.enqueue_request(Request('https://example.nl/lijst', dont_filter=True))
+    scheduler.enqueue_request(Request('https://example.nl/detail', priority=10, dont_filter=True))
+    assert len(scheduler.dqs) == 1
+    assert scheduler.next_request().url == 'https://example.nl/detail'
+    assert scheduler.next_request().url == 'https://example.nl/lijst'
+    scheduler.close('finished')
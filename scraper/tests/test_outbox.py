@@ -0,0 +1,29 @@
+import datetime as dt
+
+from rentbird_scraper.utils.outbox import Outbox
+
+NOW = dt.datetime(2026, 10, 1, 12, 0)
+
+
+def test_reserve_hands_out_contiguous_blocks(db):
+    outbox = Outbox(db)
+    assert outbox.reserve(3) == 1
+    assert outbox.reserve(2) == 4
+    assert Outbox(db).reserve(1) == 6  # teller staat in Mongo, niet in het object
+
+
+def test_append_numbers_events_in_order(db):
+    outbox = Outbox(db)
+    assert outbox.append([{'sourceId': 'a'}, None, {'sourceId': 'b'}], NOW) == 2
+    assert outbox.append([{'sourceId': 'c'}], NOW) == 1
+    assert outbox.append([]) == 0
+    docs = list(db.property_events.find({}, {'_id': 0}).sort('seq', 1))
+    assert [(d['seq'], d['sourceId']) for d in docs] == [(1, 'a'), (2, 'b'), (3, 'c')]
+    assert all(d['at'] == NOW for d in docs)
+
+
+def test_collection_name_from_env(db, monkeypatch):
+    monkeypatch.setenv('SCRAPER_OUTBOX_COLLECTION', 'events_test')
+    Outbox(db).append([{'sourceId': 'a'}])
+    assert db.events_test.count_documents({}) == 1
+    assert db.counters.find_one({'_id': 'events_test'})['seq'] == 1
@@ -0,0 +1,72 @@
+import datetime as dt
+import os
+
+from pymongo.errors import BulkWriteError
+
+from load_sink import load_file
+from rentbird_scraper.utils.outbox import Outbox
+from rentbird_scraper.utils.sink import SinkWriter, iter_file, sink_files, write_retry
+
+NOW = dt.datetime(2026, 10, 1, 12, 0, 30)
+
+
+def item(sid, price=1500, **kw):
+    return {'source': 'pararius', 'sourceId': sid, 'title': 'Woning', 'price': price, 'size': 60,
+            'address': {'city': 'Utrecht', 'street': 'Oudegracht 1'}, 'scrapedAt': NOW, **kw}
+
+
+def write(directory, items, rotate_items=2):
+    writer = SinkWriter('pararius', str(directory), rotate_items=rotate_items)
+    for i in items:
+        writer.write(i)
+    writer.close()
+    return writer
+
+
+def test_round_trip_rotates_and_decodes_times(tmp_path):
+    writer = write(tmp_path, [item('1'), item('2'), item('3', _touch=True, _checkedAt=NOW)])
+    assert len(writer.files) == 2 and writer.items == 3
+    assert sink_files(str(tmp_path)) == writer.files
+    assert sink_files(str(tmp_path), ['funda']) == []
+    assert not [n for n in os.listdir(writer.directory) if n.endswith('.part')]
+
+    items = [i for path in writer.files for i in iter_file(path)]
+    assert [i['sourceId'] for i in items] == ['1', '2', '3']
+    assert items[0] == item('1')
+    assert items[2]['_checkedAt'] == NOW and items[2]['_touch'] is True
+
+
+def test_load_file_upserts_with_events(tmp_path, db):
+    writer = write(tmp_path, [item('1'), item('2'), item('1', price=1400)], rotate_items=10)
+    outbox = Outbox(db)
+    counts, retry = load_file(db.props, writer.files[0], 100, False, outbox)
+    assert retry is None
+    assert counts['new'] == 2 and counts['changed'] == 1 and counts['events'] == 3
+    assert db.props.count_documents({}) == 2
+    assert db.props.find_one({'sourceId': '1'})['price'] == 1400
+
+    counts, _ = load_file(db.props, writer.files[0], 100, False, outbox)
+    # '1' wisselt binnen het bestand van prijs, dus twee keer changed
+    assert counts['unchanged'] == 1 and counts['changed'] == 2
+
+
+def test_failed_writes_go_to_retry_file(tmp_path, db, monkeypatch):
+    writer = write(tmp_path, [item('1'), item('2')], rotate_items=10)
+    path = writer.files[0]
+
+    def bulk_write(ops, ordered):
+        raise BulkWriteError({'writeErrors': [{'index': 1, 'errmsg': 'timeout'}], 'upserted': [{'index': 0}]})
+
+    monkeypatch.setattr(db.props, 'bulk_write', bulk_write)
+    counts, retry = load_file(db.props, path, 100, False)
+    assert counts['write_errors'] == 1 and counts['retry'] == 1
+    assert os.path.basename(retry).startswith(os.path.basename(path).split('.')[0].rsplit('-', 2)[0])
+    assert '-' + str(os.getpid()) + 'r-' in os.path.basename(retry)
+    assert [i['sourceId'] for i in iter_file(retry)] == ['2']
+    # Na het origineel geladen, en een retry van een retry overschrijft hetzelfde bestand
+    assert sink_files(str(tmp_path)) == [path, retry]
+    assert write_retry(retry, [item('2')]) == retry
+
+    monkeypatch.undo()
+    counts, again = load_file(db.props, retry, 100, False)
+    assert again is None and counts['new'] == 1
@@ -0,0 +1,45 @@
+import datetime as dt
+
+from rentbird_scraper.pipelines import build_upsert
+from rentbird_scraper.utils.fingerprint import content_hash
+
+NOW = dt.datetime(2026, 10, 1, 12, 0)
+
+
+def item(**kw):
+    base = {'source': 'pararius', 'sourceId': '123', 'title': 'Woning', 'price': 1500, 'size': 60, 'rooms': 3.0,
+            'address': {'city': 'Utrecht', 'street': 'Oudegracht 1'}, 'isStillAvailable': True, 'scrapedAt': NOW}
+    base.update(kw)
+    return base
+
+
+def test_new_listing_is_full_upsert():
+    op, kind = build_upsert(item(), None, NOW)
+    assert kind == 'new'
+    assert op._upsert is True
+    assert op._doc['$set']['contentHash'] == content_hash(item())
+    assert op._doc['$setOnInsert'] == {'createdAt': NOW}
+
+
+def test_unchanged_listing_only_touches_last_checked():
+    doc = dict(item(), contentHash=content_hash(item()))
+    op, kind = build_upsert(item(), doc, NOW)
+    assert kind == 'unchanged'
+    assert op._doc == {'$set': {'lastCheckedAt': NOW}}
+
+
+def test_changed_listing_sets_only_changed_fields():
+    doc = dict(item(), contentHash=content_hash(item()))
+    op, kind = build_upsert(item(price=1400), doc, NOW)
+    assert kind == 'changed'
+    changed = op._doc['$set']
+    assert changed['price'] == 1400
+    assert 'title' not in changed and 'size' not in changed
+    assert changed['contentHash'] == content_hash(item(price=1400))
+
+
+def test_unchanged_listing_is_relisted_after_sweep():
+    doc = dict(item(), contentHash=content_hash(item()), isStillAvailable=False, missedRuns=2)
+    op, kind = build_upsert(item(), doc, NOW)
+    assert kind == 'unchanged'
+    assert op._doc['$set'] == {'lastCheckedAt': NOW, 'isStillAvailable': True, 'missedRuns': 0}
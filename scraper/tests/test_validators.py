@@ -0,0 +1,52 @@
+from rentbird_scraper.utils.validators import Validators, ValidatorStore
+
+
+def test_put_is_visible_after_close(tmp_path):
+    path = str(tmp_path / 'validators.sqlite')
+    store = ValidatorStore(path)
+    store.put('https://example.nl/a', '"abc"', 'Wed, 01 Oct 2026 10:00:00 GMT', 1234, b'<html>lijst</html>')
+    store.put('https://example.nl/b', None, None, 10)
+    store.close()
+
+    store = ValidatorStore(path)
+    assert store.get('https://example.nl/a') == Validators('"abc"', 'Wed, 01 Oct 2026 10:00:00 GMT', 1234,
+                                                           b'<html>lijst</html>')
+    assert store.get('https://example.nl/b') == Validators(None, None, 10, None)
+    assert store.get('https://example.nl/c') is None
+    assert len(store) == 2
+    store.close()
+
+
+def test_put_overwrites_and_delete_removes(tmp_path):
+    path = str(tmp_path / 'validators.sqlite')
+    store = ValidatorStore(path)
+    store.put('https://example.nl/a', '"v1"', None, 1)
+    store.put('https://example.nl/a', '"v2"', None, 2)
+    store.put('https://example.nl/b', '"v1"', None, 1)
+    store.delete('https://example.nl/b')
+    store.close()
+
+    store = ValidatorStore(path)
+    assert store.get('https://example.nl/a').etag == '"v2"'
+    assert store.get('https://example.nl/b') is None
+    store.close()
+
+
+def test_evicts_least_recently_used_to_ninety_percent(tmp_path):
+    path = str(tmp_path / 'validators.sqlite')
+    store = ValidatorStore(path, max_entries=100)
+    for i in range(100):
+        store.put(f'https://example.nl/oud/{i}', None, None, i)
+    store.close()
+
+    store = ValidatorStore(path, max_entries=100)
+    for i in range(20):
+        store.put(f'https://example.nl/nieuw/{i}', None, None, i)
+    store.close()
+
+    store = ValidatorStore(path, max_entries=100)
+    assert len(store) == 90
+    assert all(store.get(f'https://example.nl/nieuw/{i}') is not None for i in range(20))
+    assert store.get('https://example.nl/oud/0') is None
+    assert store.get('https://example.nl/oud/99') is not None
+    store.close()